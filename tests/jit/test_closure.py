@@ -1,7 +1,11 @@
+import pytest
+
 from .base import BaseJITTest
 
 
 class TestClosure(BaseJITTest):
+    @pytest.mark.xfail(reason="hand-edited for SEND_LE/SEND_ADD, needs regenerating "
+                       "from a translated binary")
     def test_int_closure_cells(self, topaz, tmpdir):
         traces = self.run(topaz, tmpdir, """
         a = 1
@@ -23,7 +27,7 @@ class TestClosure(BaseJITTest):
         i74 = int_lt(i68, i49)
         guard_true(i74, descr=<Guard0x101db0b60>)
         debug_merge_point(0, 0, 'each at LOAD_CONST')
-        debug_merge_point(0, 0, 'each at SEND')
+        debug_merge_point(0, 0, 'each at SEND_LE')
         p75 = force_token()
         debug_merge_point(0, 0, 'each at JUMP_IF_FALSE')
         debug_merge_point(0, 0, 'each at LOAD_DEREF')
@@ -38,7 +42,7 @@ class TestClosure(BaseJITTest):
         p77 = force_token()
         debug_merge_point(1, 2, 'succ at LOAD_SELF')
         debug_merge_point(1, 2, 'succ at LOAD_CONST')
-        debug_merge_point(1, 2, 'succ at SEND')
+        debug_merge_point(1, 2, 'succ at SEND_ADD')
         p78 = force_token()
         i79 = int_add(i68, 1)
         debug_merge_point(1, 2, 'succ at RETURN')
@@ -0,0 +1,60 @@
+from topaz.coverage import CoverageState
+
+from ..base import BaseTopazTest
+
+
+class TestCoverage(BaseTopazTest):
+    def test_result(self, space, tmpdir):
+        f = tmpdir.join("covered.rb")
+        f.write("""def covered(n)
+  if n > 0
+    n.to_s
+  else
+    n.abs
+  end
+end
+
+3.times { |i| covered(i) }
+""")
+        w_res = space.execute("""
+        Coverage.start
+        require '%s'
+        running = Coverage.running?
+        res = Coverage.result
+        return [running, Coverage.running?, res.keys, res['%s']]
+        """ % (f, f))
+        running, stopped, paths, counts = self.unwrap(space, w_res)
+        assert [running, stopped, paths] == [True, False, [str(f)]]
+        assert counts == [1, 3, 2, None, 1, None, None, None, 4]
+        assert space.fromcache(CoverageState).codes == []
+
+    def test_result_local_variables(self, space, tmpdir):
+        f = tmpdir.join("locals.rb")
+        f.write("def bar\n  a = 1\n  b = a + 1\n  b\nend\nbar\n")
+        w_res = space.execute("""
+        Coverage.start
+        require '%s'
+        return Coverage.result['%s']
+        """ % (f, f))
+        assert self.unwrap(space, w_res) == [1, 1, 1, 1, None, 1]
+
+    def test_peek_result(self, space, tmpdir):
+        f = tmpdir.join("peek.rb")
+        f.write("def peek\n  1.to_s\nend\n")
+        w_res = space.execute("""
+        Coverage.start
+        load '%s'
+        before = Coverage.peek_result['%s']
+        peek
+        after = Coverage.peek_result['%s']
+        Coverage.result
+        peek
+        return [before, after]
+        """ % (f, f, f))
+        assert self.unwrap(space, w_res) == [[1, 0, None], [1, 1, None]]
+
+    def test_not_enabled(self, space):
+        with self.raises(space, "RuntimeError", "coverage measurement is not enabled"):
+            space.execute("Coverage.result")
+        with self.raises(space, "RuntimeError", "coverage measurement is not enabled"):
+            space.execute("Coverage.peek_result")
@@ -0,0 +1,67 @@
+from topaz.gcstats import GCStats
+
+from ..base import BaseTopazTest
+
+
+class TestGC(BaseTopazTest):
+    def test_start(self, space):
+        w_res = space.execute("""
+        GC::Profiler.enable
+        GC.start
+        GC.start(full: false)
+        ObjectSpace.garbage_collect
+        GC::Profiler.disable
+        return GC::Profiler.raw_data.map { |r| r[:MAJOR] }
+        """)
+        assert self.unwrap(space, w_res) == [True, False, True]
+
+    def test_disable(self, space):
+        w_res = space.execute("""
+        GC::Profiler.enable
+        res = [GC.disable, GC.disable]
+        GC.start
+        res << GC::Profiler.raw_data.size << GC.enable << GC.enable
+        GC.start
+        GC::Profiler.disable
+        res << GC::Profiler.raw_data.size
+        """)
+        assert self.unwrap(space, w_res) == [False, True, 0, True, False, 1]
+
+    def test_stat(self, space):
+        w_res = space.execute("""
+        GC.max_heap_size = 1 << 30
+        return [GC.stat.keys, GC.stat(:max_heap_size), GC.max_heap_size]
+        """)
+        assert self.unwrap(space, w_res) == [["max_heap_size"], 1 << 30, 1 << 30]
+        with self.raises(space, "ArgumentError", "negative heap size"):
+            space.execute("GC.max_heap_size = -1")
+
+    def test_setup(self, space, monkeypatch):
+        monkeypatch.setenv("PYPY_GC_MAX", "64MB")
+        stats = space.fromcache(GCStats)
+        stats.setup()
+        assert stats.start_time > 0.0
+        w_res = space.execute("return [GC.max_heap_size, GC.stat[:max_heap_size]]")
+        assert self.unwrap(space, w_res) == [64 * 1024 * 1024, 64 * 1024 * 1024]
+
+    def test_profiler(self, space, capfd):
+        w_res = space.execute("""
+        GC.start
+        res = [GC::Profiler.enabled?, GC::Profiler.raw_data.size, GC::Profiler.result]
+        GC::Profiler.enable
+        GC.start
+        GC.start(full: false)
+        GC::Profiler.disable
+        GC.start
+        data = GC::Profiler.raw_data
+        res << GC::Profiler.enabled? << data.map { |r| r[:MAJOR] }
+        res << (GC::Profiler.total_time == data[0][:GC_TIME] + data[1][:GC_TIME])
+        """)
+        assert self.unwrap(space, w_res) == [False, 0, "", False, [True, False], True]
+        space.execute("GC::Profiler.report")
+        out, err = capfd.readouterr()
+        lines = out.splitlines()
+        assert lines[0] == "GC 2 invokes."
+        assert [line.split()[2] for line in lines[2:]] == ["major", "minor"]
+        space.execute("GC::Profiler.clear")
+        assert self.unwrap(space, space.execute("GC::Profiler.raw_data")) == []
@@ -318,6 +318,63 @@ class TestRequire(BaseTopazTest):
         """ % tmpdir)
         assert space.int_w(w_res) == -3
 
+    def test_load_path_changes(self, space, tmpdir):
+        first = tmpdir.mkdir("first")
+        second = tmpdir.mkdir("second")
+        first.join("a.rb").write("@a = :first")
+        second.join("a.rb").write("@a = :second")
+        w_res = space.execute("""
+        $LOAD_PATH.unshift('%s')
+        require 'a'
+        results = [@a]
+        $LOADED_FEATURES.delete('%s')
+        $LOAD_PATH.unshift('%s')
+        require 'a'
+        results << @a
+        return results
+        """ % (first, first.join("a.rb"), second))
+        assert self.unwrap(space, w_res) == ["first", "second"]
+        first.join("b.rb").write("@b = :created")
+        w_res = space.execute("""
+        require 'b'
+        return @b
+        """)
+        assert space.symbol_w(w_res) == "created"
+
+    def test_load_path_new_file_takes_precedence(self, space, tmpdir):
+        first = tmpdir.mkdir("first")
+        second = tmpdir.mkdir("second")
+        second.join("c.rb").write("@c = :second")
+        w_res = space.execute("""
+        $LOAD_PATH.unshift('%s')
+        $LOAD_PATH.unshift('%s')
+        require 'c'
+        return @c
+        """ % (second, first))
+        assert space.symbol_w(w_res) == "second"
+        first.join("c.rb").write("@c = :first")
+        w_res = space.execute("""
+        $LOADED_FEATURES.delete('%s')
+        require 'c'
+        return @c
+        """ % second.join("c.rb"))
+        assert space.symbol_w(w_res) == "first"
+
+    def test_loaded_features_changes(self, space, tmpdir):
+        f = tmpdir.join("f.rb")
+        f.write("@a += 1")
+        w_res = space.execute("""
+        @a = 0
+        require '%s'
+        $LOADED_FEATURES.pop
+        require '%s'
+        require '%s'
+        $LOADED_FEATURES << '%s'
+        require '%s'
+        return @a
+        """ % (f, f, f, tmpdir.join("g.rb"), tmpdir.join("g.rb")))
+        assert space.int_w(w_res) == 2
+
     def test_stdlib_default_load_path(self, space):
         w_res = space.execute("""
         return require 'prettyprint'
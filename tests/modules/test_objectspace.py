@@ -1,7 +1,12 @@
+import gc
+import json
+
 from rpython.rlib import rgc
 
+from ..base import BaseTopazTest
+
 
-class TestObjectSpace(object):
+class TestObjectSpace(BaseTopazTest):
     def test_name(self, space):
         space.execute("ObjectSpace")
 
@@ -19,3 +24,162 @@ class TestObjectSpace(object):
         return names.include? "X"
         """)
         assert w_res is space.w_true
+
+    def test_trace_object_allocations(self, space):
+        w_res = space.execute("""
+        class Point
+        end
+        $kept = []
+        ObjectSpace.trace_object_allocations do
+          3.times { $kept << Point.new }
+          Point.new
+          $s = "a" + "b"
+        end
+        Point.new
+        return [
+          ObjectSpace.allocation_sourcefile($kept[0]),
+          ObjectSpace.allocation_sourceline($kept[0]),
+          ObjectSpace.allocation_sourceline($s),
+          ObjectSpace.allocation_sourcefile(Object.new),
+        ]
+        """)
+        assert self.unwrap(space, w_res) == ["-e", 6, 8, None]
+        w_res = space.execute("""
+        ObjectSpace.allocation_sites.select { |site| site[:class] == Point }.map do |site|
+          [site[:file], site[:line], site[:count]]
+        end
+        """)
+        assert self.unwrap(space, w_res) == [["-e", 6, 3], ["-e", 7, 1]]
+
+    def test_trace_object_allocations_modules(self, space):
+        w_res = space.execute("""
+        ObjectSpace.trace_object_allocations do
+          $mod = Module.new
+          $cls = Class.new
+        end
+        return [ObjectSpace.allocation_sourceline($mod), ObjectSpace.allocation_sourceline($cls)]
+        """)
+        assert self.unwrap(space, w_res) == [3, 4]
+
+    def test_trace_object_allocations_retained(self, space):
+        space.execute("""
+        class Point
+        end
+        ObjectSpace.trace_object_allocations_start
+        $kept = [Point.new, Point.new]
+        Point.new
+        ObjectSpace.trace_object_allocations_stop
+        """)
+        gc.collect()
+        w_res = space.execute("""
+        ObjectSpace.allocation_sites(true).select { |site| site[:class] == Point }.map do |site|
+          [site[:line], site[:count], site[:retained]]
+        end
+        """)
+        assert self.unwrap(space, w_res) == [[5, 2, 2], [6, 1, 0]]
+
+    def test_count_objects(self, space, monkeypatch):
+        space.execute("""
+        $kept = [Object.new, "abc", {}]
+        """)
+        monkeypatch.setattr(rgc, "get_rpy_roots", lambda: [rgc._GcRef(space)])
+        counts = dict(self.unwrap(space, space.execute("c = ObjectSpace.count_objects; c.keys.map { |k| [k, c[k]] }")))
+        assert counts["TOTAL"] == sum(count for name, count in counts.iteritems() if name != "TOTAL")
+        assert counts["T_OBJECT"] >= 1
+        assert counts["T_STRING"] >= 1
+        assert counts["T_HASH"] >= 1
+
+    def test_dump_all(self, space, monkeypatch):
+        space.execute("""
+        class Point
+          def initialize(x, y)
+            @x = x
+            @y = y
+          end
+        end
+        $point = Point.new(1, "a long string" * 10)
+        """)
+        monkeypatch.setattr(rgc, "get_rpy_roots", lambda: [rgc._GcRef(space)])
+        w_res = space.execute("ObjectSpace.dump_all")
+        objects = [json.loads(line) for line in space.str_w(w_res).splitlines()]
+        by_address = dict((obj["address"], obj) for obj in objects)
+        assert len(by_address) == len(objects)
+        [point] = [obj for obj in objects if obj["class"] == "Point"]
+        assert point["type"] == "T_OBJECT"
+        assert point["ivars"] == ["@x", "@y"]
+        assert point["size"] > 0
+        [string] = [by_address[address] for address in point["references"] if by_address[address]["class"] == "String"]
+        assert string["length"] == 130
+        assert string["value"] == ("a long string" * 10)[:64]
+
+    def test_dump_all_shared_references(self, space, monkeypatch):
+        space.execute("""
+        class Pair
+          def initialize(a)
+            @a = a
+          end
+        end
+        $shared = "shared"
+        $pairs = [Pair.new($shared), Pair.new($shared)]
+        """)
+        monkeypatch.setattr(rgc, "get_rpy_roots", lambda: [rgc._GcRef(space)])
+        w_res = space.execute("ObjectSpace.dump_all")
+        objects = [json.loads(line) for line in space.str_w(w_res).splitlines()]
+        by_address = dict((obj["address"], obj) for obj in objects)
+        pairs = [obj for obj in objects if obj["class"] == "Pair"]
+        assert len(pairs) == 2
+        # Both instances reach their class through the same map.
+        assert sorted(pairs[0]["references"]) == sorted(pairs[1]["references"])
+        assert len(pairs[0]["references"]) == 2
+
+    def test_dump_all_io(self, space, monkeypatch, tmpdir):
+        monkeypatch.setattr(rgc, "get_rpy_roots", lambda: [rgc._GcRef(space)])
+        f = tmpdir.join("heap.json")
+        w_res = space.execute("""
+        File.open('%s', 'w') do |f|
+          return ObjectSpace.dump_all(f).equal?(f)
+        end
+        """ % f)
+        assert w_res is space.w_true
+        lines = f.read().splitlines()
+        assert lines
+        assert all(json.loads(line)["address"] for line in lines)
+        with self.raises(space, "TypeError", "wrong argument type String (expected IO)"):
+            space.execute("ObjectSpace.dump_all('heap.json')")
+
+    def test_each_object_class_hierarchy(self, space, monkeypatch):
+        def get_rpy_roots():
+            raise AssertionError("walked the heap")
+        monkeypatch.setattr(rgc, "get_rpy_roots", get_rpy_roots)
+        w_res = space.execute("""
+        class Foo; end
+        class Bar < Foo; end
+        module Mixin; end
+        anonymous = Module.new
+        classes = []
+        ObjectSpace.each_object(Class) { |c| classes << c }
+        modules = []
+        ObjectSpace.each_object(Module) { |m| modules << m }
+        foos = []
+        ObjectSpace.each_object(Foo.singleton_class) { |c| foos << c }
+        return [
+          classes.include?(Bar), classes.include?(Mixin), classes.include?(Bar.singleton_class),
+          modules.include?(Mixin), modules.include?(anonymous), modules.include?(Kernel), modules.include?(Bar),
+          modules.length == modules.uniq.length,
+          foos.map(&:name).sort,
+        ]
+        """)
+        assert self.unwrap(space, w_res) == [
+            True, False, True,
+            True, True, True, True,
+            True,
+            ["Bar", "Foo"],
+        ]
+
+    def test_each_object_collected_module(self, space):
+        space.execute("$count = 0; ObjectSpace.each_object(Module) { $count += 1 }")
+        before = space.int_w(space.globals.get(space, "$count"))
+        space.execute("3.times { Module.new }")
+        gc.collect()
+        space.execute("$count = 0; ObjectSpace.each_object(Module) { $count += 1 }")
+        assert space.int_w(space.globals.get(space, "$count")) == before
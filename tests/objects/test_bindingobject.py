@@ -1,4 +1,9 @@
-class TestBindingObject(object):
+from topaz.evalcache import EvalCache
+
+from ..base import BaseTopazTest
+
+
+class TestBindingObject(BaseTopazTest):
     def test_simple(self, space):
         w_res = space.execute("return binding.eval('4')")
         assert space.int_w(w_res) == 4
@@ -33,3 +38,31 @@ class TestBindingObject(object):
         return binding.eval('12')
         """)
         assert space.int_w(w_res) == 12
+
+    def test_eval_cache(self, space):
+        w_res = space.execute("""
+        stats = Topaz.eval_cache_stats
+        results = []
+        def f(x)
+            binding
+        end
+        3.times { |i| results << f(i).eval("x * 2") }
+        a = 1
+        results << binding.eval("x = 5; x * 2")
+        results << Object.new.instance_eval("self.class.name")
+        results << Object.new.instance_eval("self.class.name")
+        new_stats = Topaz.eval_cache_stats
+        return results, [:hits, :misses].map { |k| new_stats[k] - stats[k] }
+        """)
+        assert self.unwrap(space, w_res) == [[0, 2, 4, 10, "Object", "Object"], [3, 3]]
+
+    def test_eval_cache_eviction(self, space):
+        cache = space.fromcache(EvalCache)
+        cache.entries.clear()
+        for i in range(EvalCache.MAX_ENTRIES + 1):
+            space.execute("Object.new.instance_eval('%d')" % i)
+        assert len(cache.entries) == EvalCache.MAX_ENTRIES
+        misses = cache.misses
+        space.execute("Object.new.instance_eval('%d')" % EvalCache.MAX_ENTRIES)
+        space.execute("Object.new.instance_eval('0')")
+        assert cache.misses == misses + 1
@@ -1,4 +1,7 @@
 import pytest
+
+from topaz.objects.moduleobject import W_ModuleObject
+
 from ..base import BaseTopazTest
 
 
@@ -116,3 +119,152 @@ class TestClassObject(BaseTopazTest):
         return X.new.a
         """)
         assert space.int_w(w_res) == 5
+
+    def test_resolved_method_invalidated_by_ancestor(self, space):
+        w_res = space.execute("""
+        class A; def f; 1; end; end
+        class B < A; end
+        class C < B; end
+        res = [C.new.f]
+        class A; def f; 2; end; end
+        res << C.new.f
+        class B; def f; 3; end; end
+        res << C.new.f
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [1, 2, 3]
+
+    def test_resolved_method_invalidated_by_include(self, space):
+        w_res = space.execute("""
+        module M; end
+        module N; def f; 2; end; end
+        class A; def f; 1; end; end
+        class B < A; include M; end
+        res = [B.new.f, B.ancestors.include?(N), B.new.is_a?(N)]
+        class A; include N; end
+        res << B.ancestors.include?(N) << B.new.is_a?(N)
+        module M; def f; 3; end; end
+        res << B.new.f
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [1, False, False, True, True, 3]
+
+    def test_resolved_const_invalidated_by_ancestor(self, space):
+        w_res = space.execute("""
+        class A; end
+        class B < A
+            def self.get; X; end
+        end
+        X = 1
+        res = [B.get]
+        class A; X = 2; end
+        res << B.get
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [1, 2]
+
+    def test_resolved_const_invalidated_by_included_module(self, space):
+        w_res = space.execute("""
+        module M; end
+        class A
+            include M
+            def self.get; X; end
+        end
+        X = 1
+        res = [A.get]
+        module M; X = 2; end
+        res << A.get
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [1, 2]
+
+    def test_const_set_skips_unread_descendants(self, space, monkeypatch):
+        w_cls = space.execute("""
+        class A; end
+        A::X rescue nil
+        return A
+        """)
+        cell = w_cls.resolved_consts["X"]
+        visited = []
+        invalidate_const = W_ModuleObject._invalidate_const
+
+        def _invalidate_const(self, space, name):
+            visited.append(self)
+            invalidate_const(self, space, name)
+        monkeypatch.setattr(W_ModuleObject, "_invalidate_const", _invalidate_const)
+        space.execute("Y = 1")
+        assert visited == [space.w_object]
+        assert not cell.stale
+        space.execute("X = 1")
+        assert cell.stale
+
+    def test_singleton_class_copy_constants(self, space):
+        w_res = space.execute("""
+        o = Object.new
+        class << o; X = 1; end
+        c = o.clone
+        return (class << c; X; end)
+        """)
+        assert self.unwrap(space, w_res) == 1
+
+    def test_resolution_caches_are_linearized(self, space):
+        w_cls = space.execute("""
+        module M; end
+        class A; include M; end
+        class B < A; end
+        return B
+        """)
+        ancestors = w_cls.ancestors()
+        assert w_cls.ancestors() is ancestors
+        w_mod = space.w_object.find_const(space, "M")
+        assert w_mod.is_ancestor_of(w_cls)
+        assert w_cls.find_method(space, "to_s") is space.w_object.find_method(space, "to_s")
+        space.execute("class A; def to_s; end; end")
+        assert w_cls.ancestors() is ancestors
+        space.execute("module N; end; class A; include N; end")
+        assert w_cls.ancestors() is not ancestors
+        assert len(w_cls.ancestors()) == len(ancestors) + 1
+
+    def test_method_invalidation_is_per_name(self, space):
+        w_cls = space.execute("""
+        class A; def f; end; def g; end; end
+        class B < A; end
+        return B
+        """)
+        w_f = w_cls.resolve_method(space, "f")
+        w_g = w_cls.resolve_method(space, "g")
+        space.execute("class A; def f; end; X = 1; end")
+        assert w_f.stale
+        assert not w_g.stale
+        assert w_cls.resolve_method(space, "f") is w_f
+        assert not w_f.stale
+
+    def test_invalidation_stats(self, space):
+        w_res = space.execute("""
+        class A; def f; end; end
+        class B < A; end
+        B.new.f
+        stats = Topaz.invalidation_stats
+        class A; def f; end; end
+        B.new.f
+        class A; X = 1; end
+        new_stats = Topaz.invalidation_stats
+        return [:methods, :constants, :ancestors].map { |k| new_stats[k] - stats[k] }
+        """)
+        assert self.unwrap(space, w_res) == [2, 0, 0]
+
+    def test_subclasses(self, space):
+        w_res = space.execute("""
+        class A; end
+        class B < A; end
+        class C < A; end
+        class D < B; end
+        A.singleton_class
+        Object.new.extend(Comparable)
+        return [A.subclasses, A.descendants, D.subclasses]
+        """)
+        assert self.unwrap(space, w_res) == [
+            [space.w_object.constants_w["B"], space.w_object.constants_w["C"]],
+            [space.w_object.constants_w["B"], space.w_object.constants_w["D"], space.w_object.constants_w["C"]],
+            [],
+        ]
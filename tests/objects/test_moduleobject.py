@@ -370,6 +370,72 @@ class TestModuleObject(BaseTopazTest):
         """)
         assert self.unwrap(space, w_res) == ['ZzŻżŹź', 'utf_8_is_legal']
 
+    def test_autoload(self, space, tmpdir):
+        f = tmpdir.join("autoloaded.rb")
+        f.write("""
+        $autoloads += 1
+        module M
+          class Autoloaded
+            def self.value
+              :loaded
+            end
+          end
+        end
+        """)
+        w_res = space.execute("""
+        $autoloads = 0
+        module M
+          autoload :Autoloaded, '%s'
+        end
+        results = [$autoloads, M.autoload?(:Autoloaded), M.constants.include?(:Autoloaded)]
+        results << M::Autoloaded.value << M::Autoloaded.value << $autoloads
+        results << M.autoload?(:Autoloaded) << $LOADED_FEATURES.include?('%s')
+        return results
+        """ % (f, f))
+        assert self.unwrap(space, w_res) == [0, str(f), True, "loaded", "loaded", 1, None, True]
+
+    def test_autoload_lexical(self, space, tmpdir):
+        f = tmpdir.join("autoloaded.rb")
+        f.write("""
+        class Autoloaded
+        end
+        """)
+        w_res = space.execute("""
+        autoload :Autoloaded, '%s'
+        class X
+          def f
+            Autoloaded
+          end
+        end
+        return [Object.autoload?(:Autoloaded), X.new.f.name, X.new.f.name]
+        """ % f)
+        assert self.unwrap(space, w_res) == [str(f), "Autoloaded", "Autoloaded"]
+
+    def test_autoload_undefined(self, space, tmpdir):
+        f = tmpdir.join("autoloaded.rb")
+        f.write("")
+        space.execute("""
+        module M
+          autoload :Autoloaded, '%s'
+        end
+        """ % f)
+        with self.raises(space, "NameError", "uninitialized constant Autoloaded"):
+            space.execute("M::Autoloaded")
+        w_res = space.execute("return M.constants.include?(:Autoloaded)")
+        assert w_res is space.w_false
+
+    def test_autoload_defined(self, space):
+        w_res = space.execute("""
+        module M
+          Defined = 1
+          autoload :Defined, 'does_not_exist'
+        end
+        return [M.autoload?(:Defined), M::Defined]
+        """)
+        assert self.unwrap(space, w_res) == [None, 1]
+        with self.raises(space, "ArgumentError", "empty file name"):
+            space.execute("Module.new.autoload :X, ''")
+
     def test_to_s(self, space):
         w_res = space.execute("return Kernel.class.to_s")
         assert space.str_w(w_res) == "Module"
@@ -142,6 +142,23 @@ class TestRegexpObject(BaseTopazTest):
         """)
         assert space.int_w(w_res) == 4
 
+    def test_match_data_scope(self, space):
+        w_res = space.execute("""
+        def f
+          "abc" =~ /b/
+          [g, $~[0], [1].map { $~[0] }]
+        end
+        def g
+          $~
+        end
+        def h
+          [1].each { "xyz" =~ /y/ }
+          $~[0]
+        end
+        return f + [h, $~]
+        """)
+        assert self.unwrap(space, w_res) == [None, "b", ["b"], "y", None]
+
     def test_set_match_data_wrong_type(self, space):
         with self.raises(space, "TypeError"):
             space.execute("$~ = 12")
@@ -0,0 +1,123 @@
+from topaz.tracepoint import TracePointState
+
+from ..base import BaseTopazTest
+
+
+class TestTracePointObject(BaseTopazTest):
+    def test_call_return(self, space):
+        w_res = space.execute("""
+        class Calc
+          def double(x)
+            x * 2
+          end
+        end
+        events = []
+        tp = TracePoint.new(:call, :return) do |tp|
+          events << [tp.event, tp.method_id, tp.defined_class, tp.lineno, tp.event == :return ? tp.return_value : nil]
+        end
+        tp.enable
+        Calc.new.double(21)
+        tp.disable
+        Calc.new.double(1)
+        return events
+        """)
+        w_calc = space.w_object.constants_w["Calc"]
+        assert self.unwrap(space, w_res) == [
+            ["call", "double", w_calc, 4, None],
+            ["return", "double", w_calc, 4, 42],
+        ]
+
+    def test_line(self, space):
+        w_res = space.execute("""
+        lines = []
+        TracePoint.new(:line) { |tp| lines << tp.lineno if tp.path == "-e" }.enable do
+          a = [1].first
+          b = [2].first
+        end
+        return lines
+        """)
+        assert self.unwrap(space, w_res) == [4, 5]
+
+    def test_c_call_raise(self, space):
+        w_res = space.execute("""
+        events = []
+        s = "abc"
+        tp = TracePoint.new(:c_call, :raise) do |tp|
+          if tp.event == :raise
+            events << [:raise, tp.raised_exception.message, tp.lineno]
+          elsif tp.method_id == :upcase!
+            events << [:c_call, tp.self.equal?(s), tp.defined_class]
+          end
+        end
+        tp.enable do
+          s.upcase!
+          begin
+            raise "boom"
+          rescue
+          end
+        end
+        return events
+        """)
+        assert self.unwrap(space, w_res) == [
+            ["c_call", True, space.w_string],
+            ["raise", "boom", 14],
+        ]
+
+    def test_raise_method(self, space):
+        w_res = space.execute("""
+        class Foo
+          def foo
+            raise "x"
+          rescue
+            1
+          end
+        end
+        events = []
+        TracePoint.new(:raise) { |tp| events << [tp.method_id, tp.defined_class.name] }.enable { Foo.new.foo }
+        return events
+        """)
+        assert self.unwrap(space, w_res) == [["foo", "Foo"]]
+
+    def test_class_end_binding(self, space):
+        w_res = space.execute("""
+        events = []
+        TracePoint.trace(:class, :end) do |tp|
+          events << [tp.event, tp.self.name]
+          tp.disable if tp.event == :end
+        end
+        class Foo
+        end
+        return events
+        """)
+        assert self.unwrap(space, w_res) == [["class", "Foo"], ["end", "Foo"]]
+
+    def test_binding(self, space):
+        w_res = space.execute("""
+        def f(x)
+          x
+        end
+        values = []
+        TracePoint.new(:call) { |tp| values << tp.binding.eval("x") }.enable { f(7) }
+        return values
+        """)
+        assert self.unwrap(space, w_res) == [7]
+
+    def test_events(self, space):
+        state = space.fromcache(TracePointState)
+        space.execute("$tp = TracePoint.new(:line, :return) { }")
+        assert state.events == 0
+        space.execute("$tp.enable")
+        assert state.events != 0
+        w_res = space.execute("return [$tp.enabled?, $tp.disable, $tp.enabled?, $tp.disable]")
+        assert self.unwrap(space, w_res) == [True, True, False, False]
+        assert state.events == 0
+
+    def test_errors(self, space):
+        with self.raises(space, "ArgumentError", "must be called with a block"):
+            space.execute("TracePoint.new(:call)")
+        with self.raises(space, "ArgumentError", "unknown event: foo"):
+            space.execute("TracePoint.new(:foo) { }")
+        with self.raises(space, "RuntimeError", "access from outside"):
+            space.execute("TracePoint.new(:call) { }.lineno")
+        with self.raises(space, "RuntimeError", "not supported by this event"):
+            space.execute("TracePoint.new(:call) { |tp| tp.return_value }.enable { [].push(1) }; def g; end; TracePoint.new(:call) { |tp| tp.return_value }.enable { g }")
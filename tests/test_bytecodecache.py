@@ -0,0 +1,109 @@
+import os
+
+from topaz.bytecodecache import CONST_CODE, BytecodeCache, _dump_file, _load_file
+from topaz.objects.codeobject import W_CodeObject
+
+from .base import BaseTopazTest
+
+
+class TestBytecodeCache(BaseTopazTest):
+    def get_cache(self, space, tmpdir):
+        cache = space.fromcache(BytecodeCache)
+        cache.cache_dir = str(tmpdir.join("cache"))
+        return cache
+
+    def test_disabled(self, space, tmpdir):
+        f = tmpdir.join("f.rb")
+        f.write("@a = 1")
+        space.execute("load '%s'" % f)
+        assert not tmpdir.join("cache").check()
+
+    def test_roundtrip(self, space, tmpdir):
+        cache = self.get_cache(space, tmpdir)
+        f = tmpdir.join("f.rb")
+        f.write("""
+        def f(a, b=[1, 2.5], *c, &d)
+          case a
+          when :x then /ab+c/i
+          when :y then 2 ** 100
+          else d.call(b, c) { |x, y=3| x + y }
+          end
+        end
+        """)
+        path = str(f)
+        bc = cache.compile(space, f.read(), path)
+        assert os.path.exists(cache.get_cache_path(path))
+        cached_bc = cache.compile(space, f.read(), path)
+        assert cached_bc is not bc
+        assert cached_bc.disassemble() == bc.disassemble()
+        [w_method] = [w_const for w_const in cached_bc.consts_w if isinstance(w_const, W_CodeObject)]
+        [bc_method] = [w_const for w_const in bc.consts_w if isinstance(w_const, W_CodeObject)]
+        assert w_method.filepath == path
+        assert w_method.arg_pos == [0, 1]
+        assert w_method.splat_arg_pos == 2
+        assert w_method.block_arg_pos == 3
+        assert len(w_method.defaults) == 1
+        assert len(w_method.case_tables) == 1
+        assert w_method.case_tables[0].str_targets == bc_method.case_tables[0].str_targets
+
+    def test_require(self, space, tmpdir):
+        cache = self.get_cache(space, tmpdir)
+        f = tmpdir.join("f.rb")
+        f.write("""
+        @a += 1
+        @b = [__FILE__, :sym, "str", 1.5, 1180591620717411303424.to_s]
+        """)
+        w_res = space.execute("""
+        @a = 0
+        load '%s'
+        load '%s'
+        return [@a, @b]
+        """ % (f, f))
+        assert self.unwrap(space, w_res) == [2, [str(f), "sym", "str", 1.5, str(2 ** 70)]]
+        assert os.path.exists(cache.get_cache_path(str(f)))
+
+    def test_stale(self, space, tmpdir):
+        self.get_cache(space, tmpdir)
+        f = tmpdir.join("f.rb")
+        f.write("@a = 1")
+        space.execute("load '%s'" % f)
+        f.write("@a = 22")
+        w_res = space.execute("""
+        load '%s'
+        return @a
+        """ % f)
+        assert space.int_w(w_res) == 22
+
+    def test_corrupt(self, space, tmpdir):
+        cache = self.get_cache(space, tmpdir)
+        f = tmpdir.join("f.rb")
+        f.write("@a = 1")
+        space.execute("load '%s'" % f)
+        with open(cache.get_cache_path(str(f)), "w") as cache_file:
+            cache_file.write("garbage")
+        w_res = space.execute("""
+        load '%s'
+        return @a
+        """ % f)
+        assert space.int_w(w_res) == 1
+
+    def test_cyclic_code(self, space, tmpdir):
+        cache = self.get_cache(space, tmpdir)
+        f = tmpdir.join("f.rb")
+        f.write("def f(a=[1]); a; end")
+        path = str(f)
+        bc = cache.compile(space, f.read(), path)
+        cache_path = cache.get_cache_path(path)
+        header, codes = _load_file(open(cache_path).read())
+        # The method's code refers to itself as a constant.
+        [method_idx] = [const[1] for const in codes[0][3] if const[0] == CONST_CODE]
+        method = list(codes[method_idx])
+        method[3] = method[3] + [(CONST_CODE, method_idx, 0.0, "")]
+        codes[method_idx] = tuple(method)
+        buf = []
+        _dump_file(buf, (header, codes))
+        with open(cache_path, "w") as cache_file:
+            cache_file.write("".join(buf))
+        cached_bc = cache.compile(space, f.read(), path)
+        assert cached_bc is not bc
+        assert cached_bc.disassemble() == bc.disassemble()
@@ -0,0 +1,136 @@
+from topaz.callsite import CallSiteCache, CallSiteStats
+
+from .base import BaseTopazTest
+
+
+class TestCallSiteCache(BaseTopazTest):
+    def test_monomorphic(self, space):
+        cache = space.fromcache(CallSiteStats)
+        site = CallSiteCache()
+        hits, misses = cache.hits, cache.misses
+        w_method = site.find_method(space, space.w_object, "to_s")
+        assert w_method is space.w_object.find_method(space, "to_s")
+        assert site.find_method(space, space.w_object, "to_s") is w_method
+        assert cache.hits == hits + 1
+        assert cache.misses == misses + 1
+
+    def test_polymorphic(self, space):
+        site = CallSiteCache()
+        for w_cls in [space.w_object, space.w_fixnum, space.w_object, space.w_fixnum]:
+            assert site.find_method(space, w_cls, "to_s") is w_cls.find_method(space, "to_s")
+        assert not site.megamorphic
+
+    def test_megamorphic(self, space):
+        cache = space.fromcache(CallSiteStats)
+        site = CallSiteCache()
+        classes_w = [
+            space.w_object, space.w_fixnum, space.w_float, space.w_string,
+            space.w_symbol, space.w_array,
+        ]
+        for w_cls in classes_w:
+            site.find_method(space, w_cls, "to_s")
+        assert site.megamorphic
+        megamorphic = cache.megamorphic
+        for w_cls in classes_w:
+            assert site.find_method(space, w_cls, "to_s") is w_cls.find_method(space, "to_s")
+        assert cache.megamorphic == megamorphic + len(classes_w)
+
+    def test_invalidated_by_define_method(self, space):
+        site = CallSiteCache()
+        w_cls = space.execute("""
+        class X
+            def f; 1; end
+        end
+        return X
+        """)
+        w_old = site.find_method(space, w_cls, "f")
+        space.execute("class X; def f; 2; end; end")
+        w_new = site.find_method(space, w_cls, "f")
+        assert w_new is not w_old
+        assert w_new is w_cls.find_method(space, "f")
+
+    def test_invalidated_by_superclass(self, space):
+        site = CallSiteCache()
+        w_cls = space.execute("""
+        class X
+            def f; 1; end
+        end
+        class Y < X
+        end
+        return Y
+        """)
+        w_old = site.find_method(space, w_cls, "f")
+        space.execute("class X; def f; 2; end; end")
+        w_new = site.find_method(space, w_cls, "f")
+        assert w_new is not w_old
+        assert w_new is w_cls.find_method(space, "f")
+
+    def test_invalidated_by_include(self, space):
+        site = CallSiteCache()
+        w_cls = space.execute("class X; end; return X")
+        assert site.find_method(space, w_cls, "f") is None
+        space.execute("""
+        module M
+            def f; 1; end
+        end
+        class X
+            include M
+        end
+        """)
+        assert site.find_method(space, w_cls, "f") is not None
+
+
+class TestConstantSiteCache(BaseTopazTest):
+    def test_reassigned(self, space):
+        w_res = space.execute("""
+        class A
+            def self.get; X; end
+        end
+        X = 1
+        res = [A.get, A.get]
+        class A; X = 2; end
+        res << A.get
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [1, 1, 2]
+
+    def test_scoped(self, space):
+        w_res = space.execute("""
+        class A; X = 1; end
+        class B; X = 2; end
+        def get(m); m::X; end
+        res = [get(A), get(B), get(A)]
+        module M; Y = 3; end
+        def get_y(m); m::Y; end
+        res << get_y(M)
+        class A; include M; end
+        res << get_y(A)
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [1, 2, 1, 3, 3]
+
+    def test_included(self, space):
+        w_res = space.execute("""
+        X = 1
+        class A
+            def self.get; X; end
+        end
+        res = [A.get]
+        module M; X = 2; end
+        class A; include M; end
+        res << A.get
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [1, 2]
+
+    def test_const_missing_not_cached(self, space):
+        w_res = space.execute("""
+        class A
+            @count = 0
+            def self.const_missing(name); @count += 1; end
+            def self.get; Missing; end
+        end
+        A.get
+        return A.get
+        """)
+        assert space.int_w(w_res) == 2
@@ -2,7 +2,8 @@ from topaz import consts
 
 
 class TestCompiler(object):
-    def assert_compiles(self, space, source, expected_bytecode_str):
+    def assert_compiles(self, space, source, expected_bytecode_str, optimize=False):
+        space.optimize_bytecode = optimize
         bc = space.compile(source, None)
         self.assert_compiled(bc, expected_bytecode_str)
         return bc
@@ -54,7 +55,7 @@ class TestCompiler(object):
         bc = self.assert_compiles(space, "1 + 2", """
         LOAD_CONST 0
         LOAD_CONST 1
-        SEND 2 1
+        SEND_ADD 2
         RETURN
         """)
         assert bc.max_stackdepth == 2
@@ -65,8 +66,8 @@ class TestCompiler(object):
         LOAD_CONST 0
         LOAD_CONST 1
         LOAD_CONST 2
-        SEND 3 1
-        SEND 4 1
+        SEND_MUL 3
+        SEND_ADD 4
         RETURN
         """)
 
@@ -168,10 +169,10 @@ class TestCompiler(object):
         self.assert_compiles(space, "unless 1 == 2 then puts 5 end", """
         LOAD_CONST 0
         LOAD_CONST 1
-        SEND 2 1
-        JUMP_IF_FALSE 20
+        SEND_EQ 2
+        JUMP_IF_FALSE 18
         LOAD_CONST 3
-        JUMP 29
+        JUMP 27
         LOAD_SELF
         LOAD_CONST 4
         SEND 5 1
@@ -213,7 +214,7 @@ class TestCompiler(object):
         self.assert_compiles(space, "1 == 1", """
         LOAD_CONST 0
         LOAD_CONST 1
-        SEND 2 1
+        SEND_EQ 2
 
         RETURN
         """)
@@ -378,7 +379,7 @@ class TestCompiler(object):
         self.assert_compiled(bc.consts_w[1], """
         LOAD_DEREF 0
         LOAD_DEREF 1
-        SEND 0 1
+        SEND_ADD 0
         RETURN
         """)
 
@@ -577,7 +578,7 @@ class TestCompiler(object):
         self.assert_compiled(bc.consts_w[3], """
         LOAD_DEREF 0
         LOAD_CONST 0
-        SEND 1 1
+        SEND_MUL 1
         RETURN
         """)
 
@@ -815,7 +816,7 @@ class TestCompiler(object):
         self.assert_compiled(bc.consts_w[1].consts_w[0], """
         LOAD_DEREF 1
         LOAD_DEREF 0
-        SEND 0 1
+        SEND_ADD 0
         STORE_DEREF 1
         RETURN
         """)
@@ -828,7 +829,7 @@ class TestCompiler(object):
 
         LOAD_DEREF 0
         LOAD_CONST 1
-        SEND 2 1
+        SEND_ADD 2
         STORE_DEREF 0
 
         RETURN
@@ -840,7 +841,7 @@ class TestCompiler(object):
         DUP_TOP
         SEND 1 0
         LOAD_CONST 2
-        SEND 3 1
+        SEND_ADD 3
         SEND 4 1
 
         RETURN
@@ -855,7 +856,7 @@ class TestCompiler(object):
         DUP_TOP
         LOAD_INSTANCE_VAR 0
         LOAD_CONST 1
-        SEND 2 1
+        SEND_ADD 2
         STORE_INSTANCE_VAR 0
 
         RETURN
@@ -896,11 +897,11 @@ class TestCompiler(object):
         self.assert_compiled(bc.consts_w[3], """
         LOAD_DEREF 1
         LOAD_DEREF 2
-        SEND 0 1
+        SEND_ADD 0
         LOAD_DEREF 3
-        SEND 0 1
+        SEND_ADD 0
         LOAD_DEREF 0
-        SEND 0 1
+        SEND_ADD 0
         RETURN
         """)
 
@@ -944,7 +945,7 @@ class TestCompiler(object):
         LOAD_DEREF 1
         LOAD_DEREF 2
         LOAD_DEREF 0
-        SEND 0 1
+        SEND_ADD 0
         SEND 1 1
         RETURN
         """)
@@ -1359,7 +1360,7 @@ class TestCompiler(object):
         DISCARD_TOP
         LOAD_GLOBAL 1
         LOAD_CONST 2
-        SEND 3 1
+        SEND_ADD 3
         STORE_GLOBAL 1
 
         RETURN
@@ -1443,13 +1444,13 @@ class TestCompiler(object):
         self.assert_compiles(space, "3 + 4 || 5 * 6", """
         LOAD_CONST 0
         LOAD_CONST 1
-        SEND 2 1
+        SEND_ADD 2
         DUP_TOP
-        JUMP_IF_TRUE 27
+        JUMP_IF_TRUE 23
         DISCARD_TOP
         LOAD_CONST 3
         LOAD_CONST 4
-        SEND 5 1
+        SEND_MUL 5
 
         RETURN
         """)
@@ -1458,13 +1459,13 @@ class TestCompiler(object):
         self.assert_compiles(space, "3 + 4 && 5 * 6", """
         LOAD_CONST 0
         LOAD_CONST 1
-        SEND 2 1
+        SEND_ADD 2
         DUP_TOP
-        JUMP_IF_FALSE 27
+        JUMP_IF_FALSE 23
         DISCARD_TOP
         LOAD_CONST 3
         LOAD_CONST 4
-        SEND 5 1
+        SEND_MUL 5
 
         RETURN
         """)
@@ -1495,7 +1496,7 @@ class TestCompiler(object):
         DUP_TWO
         SEND_SPLAT 1 1
         LOAD_CONST 2
-        SEND 3 1
+        SEND_ADD 3
         BUILD_ARRAY 1
         SEND_SPLAT 4 2
 
@@ -1536,32 +1537,65 @@ class TestCompiler(object):
         RETURN
         """)
 
-        self.assert_compiles(space, """
+        bc = self.assert_compiles(space, """
         case 4
         when 5, 6
             7
         end
         """, """
         LOAD_CONST 0
+        CASE_DISPATCH 0
         DUP_TOP
         LOAD_CONST 1
         ROT_TWO
         SEND 2 1
-        JUMP_IF_TRUE 32
+        JUMP_IF_TRUE 35
         DUP_TOP
         LOAD_CONST 3
         ROT_TWO
         SEND 2 1
-        JUMP_IF_TRUE 32
-        JUMP 39
+        JUMP_IF_TRUE 35
+        JUMP 42
         DISCARD_TOP
         LOAD_CONST 4
-        JUMP 43
+        JUMP 46
         DISCARD_TOP
         LOAD_CONST 5
 
         RETURN
         """)
+        [table] = bc.case_tables
+        assert table.int_targets == {5: 35, 6: 35}
+        assert table.else_target == 42
+
+        bc = self.assert_compiles(space, """
+        case 4
+        when :a, "b"
+            7
+        end
+        """, """
+        LOAD_CONST 0
+        DUP_TOP
+        LOAD_CONST 1
+        ROT_TWO
+        SEND 2 1
+        JUMP_IF_TRUE 33
+        DUP_TOP
+        LOAD_CONST 3
+        COPY_STRING
+        ROT_TWO
+        SEND 2 1
+        JUMP_IF_TRUE 33
+        JUMP 40
+        DISCARD_TOP
+        LOAD_CONST 4
+        JUMP 44
+        DISCARD_TOP
+        LOAD_CONST 5
+
+        RETURN
+        """)
+        assert bc.case_tables == []
 
     def test_hash(self, space):
         self.assert_compiles(space, "{}", """
@@ -1901,7 +1935,7 @@ class TestCompiler(object):
 
         LOAD_CONST 1
         LOAD_CONST 2
-        SEND 3 1
+        SEND_ADD 3
         RETURN
         """)
 
@@ -1912,15 +1946,15 @@ class TestCompiler(object):
             2 + 2
         end
         """, """
-        SETUP_LOOP 34
+        SETUP_LOOP 32
         LOAD_CONST 0
-        JUMP_IF_FALSE 30
+        JUMP_IF_FALSE 28
 
         LOAD_CONST 1
         CONTINUE_LOOP 3
         LOAD_CONST 2
         LOAD_CONST 3
-        SEND 4 1
+        SEND_ADD 4
         DISCARD_TOP
         JUMP 3
         POP_BLOCK
@@ -1988,3 +2022,97 @@ class TestCompiler(object):
         BUILD_LAMBDA
         RETURN
         """)
+
+    def test_optimize_unreachable(self, space):
+        self.assert_compiles(space, "return 4; 5", """
+        LOAD_CONST 0
+        RETURN
+        """, optimize=True)
+
+    def test_optimize_discarded_push(self, space):
+        bc = self.assert_compiles(space, "1; self; 2; 3", """
+        LOAD_CONST 2
+        RETURN
+        """, optimize=True)
+        assert bc.max_stackdepth == 1
+
+    def test_optimize_constant_branch(self, space):
+        self.assert_compiles(space, "if true then puts 2 else puts 3 end", """
+        LOAD_SELF
+        LOAD_CONST 1
+        SEND 2 1
+        RETURN
+        """, optimize=True)
+
+        self.assert_compiles(space, "if nil then puts 2 else puts 3 end", """
+        LOAD_SELF
+        LOAD_CONST 3
+        SEND 2 1
+        RETURN
+        """, optimize=True)
+
+        self.assert_compiles(space, "while true do puts 5 end", """
+        SETUP_LOOP 16
+        LOAD_SELF
+        LOAD_CONST 1
+        SEND 2 1
+        DISCARD_TOP
+        JUMP 3
+        RETURN
+        """, optimize=True)
+
+    def test_optimize_jump_threading(self, space):
+        self.assert_compiles(space, "x = (a ? (b ? 1 : 2) : 3) if c", """
+        LOAD_SELF
+        SEND 0 0
+        JUMP_IF_FALSE 48
+        LOAD_SELF
+        SEND 1 0
+        JUMP_IF_FALSE 39
+        LOAD_SELF
+        SEND 2 0
+        JUMP_IF_FALSE 33
+        LOAD_CONST 3
+        JUMP 42 # threaded through the inner if's JUMP 42
+        LOAD_CONST 4
+        JUMP 42
+        LOAD_CONST 5
+        STORE_DEREF 0
+        JUMP 51
+        LOAD_CONST 6
+        RETURN
+        """, optimize=True)
+
+    def test_optimize_runs(self, space):
+        w_res = space.execute("""
+        def f(n)
+          r = []
+          while true
+            n -= 1
+            next if n == 3
+            break if n < 0
+            r << (n.even? ? (n > 2 ? :big : :small) : :odd)
+          end
+          r
+        end
+        return f(6)
+        """)
+        assert [space.symbol_w(w_x) for w_x in space.listview(w_res)] == [
+            "odd", "big", "small", "odd", "small"
+        ]
+
+    def test_disassemble(self, space):
+        bc = space.compile("[1].map { |x| x }", "t.rb")
+        assert bc.disassemble().splitlines() == [
+            "== <main> (t.rb)",
+            "0000 LOAD_CONST 0",
+            "0003 BUILD_ARRAY 1",
+            "0006 LOAD_CONST 1",
+            "0009 BUILD_BLOCK 0",
+            "0012 SEND_BLOCK 2 1",
+            "0017 RETURN",
+            "",
+            "== block in <main> (t.rb)",
+            "0000 LOAD_DEREF 0",
+            "0003 RETURN",
+        ]
@@ -0,0 +1,60 @@
+from topaz import consts
+from topaz.dispatchstats import DispatchStats
+
+from .base import BaseTopazTest
+
+
+class TestDispatchStats(BaseTopazTest):
+    def test_disabled(self, space):
+        stats = space.fromcache(DispatchStats)
+        space.execute("[1, 2].map { |x| x + 1 }")
+        assert stats.instructions() == 0
+        assert stats.sends() == 0
+        assert stats.codes == []
+
+    def test_counts(self, space):
+        stats = space.fromcache(DispatchStats)
+        stats.enable()
+        space.execute("""
+        def f(x)
+          x + 1
+        end
+        i = 0
+        while i < 10
+          i = f(i)
+        end
+        """)
+        opcodes = dict((consts.BYTECODE_NAMES[idx], count) for count, idx in stats.sorted_opcodes())
+        assert opcodes["SEND_ADD"] == 10
+        assert opcodes["SEND_LT"] == 11
+        assert sum(opcodes.values()) == stats.instructions()
+
+        sends = dict((stats.send_names[idx], count) for count, idx in stats.sorted_sends())
+        assert sends == {"f": 10, "+": 10, "<": 11}
+
+        codes = dict((stats.codes[idx].name, count) for count, idx in stats.sorted_codes())
+        # LOAD_DEREF, LOAD_CONST, SEND_ADD, RETURN for each call.
+        assert codes["f"] == 40
+
+        n = len(consts.BYTECODE_NAMES)
+        pairs = dict(
+            ((consts.BYTECODE_NAMES[idx / n], consts.BYTECODE_NAMES[idx % n]), count)
+            for count, idx in stats.sorted_pairs()
+        )
+        assert pairs[("LOAD_CONST", "SEND_ADD")] == 10
+        assert pairs[("SEND_ADD", "RETURN")] == 10
+        # Pairs don't span frames, the first instruction of each call has
+        # no predecessor.
+        assert sum(pairs.values()) == stats.instructions() - 10 - 1
+
+    def test_report(self, space):
+        stats = space.fromcache(DispatchStats)
+        stats.enable()
+        space.execute("3.times { |i| i * 2 }")
+        lines = stats.report().splitlines()
+        assert lines[0] == "dispatch stats: %d instructions, %d sends" % (stats.instructions(), stats.sends())
+        assert lines[2].split() == ["count", "%", "opcode"]
+        rows = [(row[0], row[2:]) for row in [line.split() for line in lines[3:]] if row]
+        assert ("3", ["SEND_MUL"]) in rows
+        assert ("3", ["LOAD_CONST", "SEND_MUL"]) in rows
+        assert ("3", ["*"]) in rows
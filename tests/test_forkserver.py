@@ -0,0 +1,82 @@
+import os
+import signal
+import socket
+import stat
+import time
+
+import pytest
+
+from topaz.forkserver import ForkServer, recv_request, run_client, send_request
+from topaz.main import _entry_point
+
+
+class TestForkServer(object):
+    def test_request(self):
+        client, server = socket.socketpair(socket.AF_UNIX)
+        r, w = os.pipe()
+        try:
+            env = {"A": "b", "LONG": "x" * 10000}
+            send_request(client.fileno(), ["topaz", "-e", "1"], env, "/tmp", [w])
+            argv, env, cwd, fds = recv_request(server.fileno())
+            assert argv == ["topaz", "-e", "1"]
+            assert env == {"A": "b", "LONG": "x" * 10000}
+            assert cwd == "/tmp"
+            [fd] = fds
+            os.write(fd, "hi")
+            os.close(fd)
+            assert os.read(r, 2) == "hi"
+        finally:
+            client.close()
+            server.close()
+            os.close(r)
+            os.close(w)
+
+    def test_request_nul(self):
+        client, server = socket.socketpair(socket.AF_UNIX)
+        try:
+            send_request(client.fileno(), ["topaz", "-e", "1\x00"], {}, "/tmp", [])
+            with pytest.raises(ValueError):
+                recv_request(server.fileno())
+        finally:
+            client.close()
+            server.close()
+
+    def test_no_server(self, tmpdir, capfd):
+        path = str(tmpdir.join("topaz.sock"))
+        assert run_client(path, ["topaz", "-e", "1"]) == 1
+        out, err = capfd.readouterr()
+        assert err.endswith(" -- %s (topaz server)\n" % path)
+
+    def test_serve(self, space, tmpdir, capfd, monkeypatch):
+        path = str(tmpdir.join("topaz.sock"))
+        pid = os.fork()
+        if pid == 0:
+            try:
+                ForkServer(space, path).serve(_entry_point)
+            finally:
+                os._exit(1)
+        try:
+            for _ in range(100):
+                if os.path.exists(path):
+                    break
+                time.sleep(0.05)
+            assert stat.S_IMODE(os.stat(path).st_mode) & 0o077 == 0
+            monkeypatch.setenv("TOPAZ_TEST", "from the client")
+            monkeypatch.chdir(tmpdir)
+            status = run_client(path, [
+                "topaz", "-e", "puts ENV['TOPAZ_TEST'], Dir.pwd, ARGV.inspect; exit 3", "--", "a"
+            ])
+            assert status == 3
+            out, err = capfd.readouterr()
+            assert out == "from the client\n%s\n[\"a\"]\n" % tmpdir
+        finally:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+
+    def test_serve_not_socket(self, space, tmpdir, capfd):
+        f = tmpdir.join("topaz.sock")
+        f.write("data")
+        assert ForkServer(space, str(f)).serve(_entry_point) == 1
+        out, err = capfd.readouterr()
+        assert err == "File exists -- %s (topaz server)\n" % f
+        assert f.read() == "data"
@@ -0,0 +1,36 @@
+import json
+
+from topaz.tools import heapdiff
+
+
+def write_dump(path, objects):
+    path.write("".join(json.dumps(obj) + "\n" for obj in objects))
+    return str(path)
+
+
+def test_heapdiff(tmpdir, capsys):
+    before = write_dump(tmpdir.join("before.json"), [
+        {"address": "0x1", "class": "String", "size": 40},
+        {"address": "0x2", "class": "Point", "size": 64},
+        {"address": "0x3", "class": "Array", "size": 100},
+    ])
+    after = write_dump(tmpdir.join("after.json"), [
+        {"address": "0x1", "class": "String", "size": 40},
+        {"address": "0x2", "class": "Point", "size": 64},
+        {"address": "0x4", "class": "Point", "size": 64},
+        {"address": "0x5", "class": "Point", "size": 64},
+        {"address": "0x6", "class": "String", "size": 30},
+    ])
+    assert heapdiff.diff(heapdiff.load(before), heapdiff.load(after)) == [
+        ("Point", 2, 128, 2, 128),
+        ("String", 1, 30, 1, 30),
+        ("Array", -1, -100, 0, 0),
+    ]
+    assert heapdiff.main([before, after, "2"]) == 0
+    out, _ = capsys.readouterr()
+    rows = [line.split() for line in out.splitlines()]
+    assert rows == [
+        ["size", "delta", "count", "retained", "objects", "class"],
+        ["+128", "+2", "128", "2", "Point"],
+        ["+30", "+1", "30", "1", "String"],
+    ]
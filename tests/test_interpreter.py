@@ -1,7 +1,10 @@
 import math
+import sys
 
 import pytest
 
+from rpython.rlib.rbigint import rbigint
+
 from topaz.modules.kernel import Kernel
 from topaz.objects.boolobject import W_TrueObject
 from topaz.objects.moduleobject import W_ModuleObject
@@ -854,6 +857,160 @@ class TestInterpreter(BaseTopazTest):
         """)
         assert self.unwrap(space, w_res) == [0, 0, 1, 2]
 
+    def test_case_dispatch_table(self, space):
+        w_res = space.execute("""
+        def f(x)
+          case x
+          when :a, :b then 1
+          when :c then 2
+          when :a then 3
+          else 4
+          end
+        end
+        def g(x)
+          case x
+          when "a" then 1
+          when "b" then 2
+          end
+        end
+        def h(x)
+          case x
+          when 1 then :one
+          when -2 then :minus_two
+          end
+        end
+        return [
+          f(:a), f(:b), f(:c), f(:d), f("a"),
+          g("a"), g("b"), g("c"), g(:a),
+          h(1), h(-2), h(3), h(1.0), h(-2.0),
+        ]
+        """)
+        assert self.unwrap(space, w_res) == [
+            1, 1, 2, 4, 4,
+            1, 2, None, None,
+            "one", "minus_two", None, "one", "minus_two",
+        ]
+
+    def test_case_dispatch_table_redefined(self, space):
+        w_res = space.execute("""
+        def f(x)
+          case x
+          when :a then 1
+          when :b then 2
+          end
+        end
+        res = [f(:a), f(:c)]
+        class Symbol
+          def ===(other)
+            other == :c || super
+          end
+        end
+        return res + [f(:a), f(:c)]
+        """)
+        assert self.unwrap(space, w_res) == [1, None, 1, 1]
+
+    def test_case_dispatch_table_included_module(self, space):
+        w_res = space.execute("""
+        def f(x)
+          case x
+          when "a" then 1
+          end
+        end
+        res = [f("a"), f("A")]
+        module CaseInsensitive
+          def ==(other)
+            other.is_a?(String) && downcase.to_sym.equal?(other.downcase.to_sym)
+          end
+        end
+        class String
+          include CaseInsensitive
+        end
+        return res + [f("a"), f("A")]
+        """)
+        assert self.unwrap(space, w_res) == [1, None, 1, 1]
+
+    def test_captured_locals(self, space):
+        w_res = space.execute("""
+        def f(a, b)
+          c = a + b
+          get = lambda { [a, c] }
+          a = 10
+          c += 1
+          res = get.call
+          b = 5
+          res << b
+        end
+        return f(1, 2)
+        """)
+        assert self.unwrap(space, w_res) == [10, 4, 5]
+
+    def test_frame_allocates_no_cells(self, space):
+        bc = space.compile("a = 1; b = a + 1; b", "t.rb")
+        frame = space.create_frame(bc)
+        with space.getexecutioncontext().visit_frame(frame):
+            w_res = space.execute_frame(frame, bc)
+        assert space.int_w(w_res) == 2
+        assert frame.cells == [None, None]
+        assert frame.regexp_match_cell is None
+
+    def test_send_fixed_args(self, space):
+        w_res = space.execute("""
+        class Foo
+          attr_accessor :x
+          def method_missing(name, *args)
+            [name] + args
+          end
+        end
+        f = Foo.new
+        f.x = 3
+        return [
+          "abc".ljust(5), "abc".ljust(5, "*"), [1, 2].push(3, 4),
+          f.x, f.missing(1, 2, 3), [3, 1, 2].sort { |a, b| b <=> a },
+          [1, 2].inject(10) { |acc, x| acc + x },
+        ]
+        """)
+        assert self.unwrap(space, w_res) == [
+            "abc  ", "abc**", [1, 2, 3, 4],
+            3, ["missing", 1, 2, 3], [3, 2, 1],
+            13,
+        ]
+        with self.raises(space, "ArgumentError", "wrong number of arguments (2 for 1)"):
+            space.execute("1.+(2, 3)")
+        with self.raises(space, "TypeError"):
+            space.execute("'abc'.ljust('x')")
+
+    def test_fixed_args_user_functions(self, space):
+        w_res = space.execute("""
+        def f0; :f0; end
+        def f2(a, b); [a, b]; end
+        def f3(a, b, c, &blk); [a, b, c, blk.call]; end
+        def fd(a, b=2); [a, b]; end
+        def fs(a, *b); [a, b]; end
+        def y
+          [yield, yield(1), yield(1, 2), yield(1, 2, 3), yield([4, 5])]
+        end
+        return [
+          f0, f2(1, 2), f3(1, 2, 3) { 4 }, fd(1), fd(1, 3), fs(1, 2, 3),
+          y { |a, b| [a, b] }, y { |a| a }, y { |*a| a },
+        ]
+        """)
+        assert self.unwrap(space, w_res) == [
+            "f0", [1, 2], [1, 2, 3, 4], [1, 2], [1, 3], [1, [2, 3]],
+            [[None, None], [1, None], [1, 2], [1, 2], [4, 5]],
+            [None, 1, 1, 1, [4, 5]],
+            [[], [1], [1, 2], [1, 2, 3], [[4, 5]]],
+        ]
+        with self.raises(space, "ArgumentError", "wrong number of arguments (1 for 2)"):
+            space.execute("def f(a, b); end; f(1)")
+
+    def test_builtin_fixed_funcs(self, space):
+        w_func = space.w_fixnum.find_method(space, "+")
+        assert [f is not None for f in w_func.fixed_funcs] == [False, True, False, False]
+        w_func = space.w_string.find_method(space, "ljust")
+        assert [f is not None for f in w_func.fixed_funcs] == [False, True, True, False]
+        w_func = space.w_array.find_method(space, "push")
+        assert w_func.fixed_funcs == [None, None, None, None]
+
     def test_dynamic_string(self, space):
         w_res = space.execute("""
         x = 123
@@ -1168,6 +1325,93 @@ class TestInterpreter(BaseTopazTest):
         """)
         assert self.unwrap(space, w_res) == [1, 2]
 
+    def test_polymorphic_send(self, space):
+        w_res = space.execute("""
+        class A; def f; :a; end; end
+        class B; def f; :b; end; end
+        class C; def f; :c; end; end
+        class D; def f; :d; end; end
+        class E; def f; :e; end; end
+        class F; def f; :f; end; end
+        res = []
+        [A, B, A, C, D, E, F, B].each do |cls|
+            res << cls.new.f
+        end
+        return res
+        """)
+        assert self.unwrap(space, w_res) == ["a", "b", "a", "c", "d", "e", "f", "b"]
+
+    def test_send_after_redefinition(self, space):
+        w_res = space.execute("""
+        class A
+            def f; 1; end
+        end
+        def call_f(x)
+            x.f
+        end
+        res = [call_f(A.new)]
+        class A
+            def f; 2; end
+        end
+        res << call_f(A.new)
+        a = A.new
+        def a.f; 3; end
+        res << call_f(a)
+        module M
+            def g; 4; end
+        end
+        class A
+            def f; g; end
+            include M
+        end
+        res << call_f(A.new)
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [1, 2, 3, 4]
+
+    def test_method_cache_stats(self, space):
+        w_res = space.execute("""
+        stats = Topaz.method_cache_stats
+        3.times { 1.to_s }
+        return Topaz.method_cache_stats[:hits] - stats[:hits]
+        """)
+        assert space.int_w(w_res) >= 2
+
+    def test_operator_bytecodes(self, space):
+        w_res = space.execute("""
+        return [
+            1 + 2, 5 - 7, 3 * 4, 1 < 2, 2 <= 2, 1 > 2, 3 >= 4, 2 == 2,
+            1.5 + 1.0, 1.5 * 2.0, 1.0 < 2.0, 1.0 == 1.0,
+            1 + 1.5, 2.0 * 3, 1 == 1.0, "a" + "b", [1] == [1],
+        ]
+        """)
+        assert self.unwrap(space, w_res) == [
+            3, -2, 12, True, True, False, False, True,
+            2.5, 3.0, True, True,
+            2.5, 6.0, True, "ab", True,
+        ]
+
+    def test_operator_bytecode_overflow(self, space):
+        w_res = space.execute("return %d + 1" % sys.maxint)
+        assert space.bigint_w(w_res) == rbigint.fromlong(sys.maxint + 1)
+        w_res = space.execute("return %d * 2" % sys.maxint)
+        assert space.bigint_w(w_res) == rbigint.fromlong(sys.maxint * 2)
+
+    def test_operator_redefined(self, space):
+        w_res = space.execute("""
+        def add(a, b); a + b; end
+        res = [add(1, 2), add(1.0, 2.0)]
+        class Fixnum
+            def +(other); 42; end
+        end
+        class Float
+            def <(other); :lt; end
+        end
+        res << add(1, 2) << (1.0 < 2.0) << (1 < 2)
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [3, 3.0, 42, "lt", True]
+
     def test_super_block(self, space):
         w_res = space.execute("""
         class A
@@ -1,10 +1,18 @@
+import json
 import os
 import platform
 import subprocess
 
 import pytest
 
-from topaz.main import _entry_point
+from topaz.main import (
+    _entry_point, _exec_with_environment, _gc_environment, _startup_profile_path,
+    _write_report
+)
+from topaz.modules.kernel import Kernel
+from topaz.objspace import KERNEL_FILES
+from topaz.profiler import SamplingProfiler
+from topaz.startupprofile import StartupProfile
 
 
 class TestMain(object):
@@ -254,7 +262,7 @@ class TestMain(object):
         """, [
             "{}:3:in `/': divided by 0 (ZeroDivisionError)",
             "\tfrom {}:3:in `<class:X>'",
-            "\tfrom {}:1:in `<main>'",
+            "\tfrom {}:2:in `<main>'",
         ])
 
     @pytest.mark.xfail
@@ -321,3 +329,116 @@ class TestMain(object):
         self.run(space, tmpdir, None, ruby_args=[str(tmpdir.join("t.rb"))], status=1)
         out, err = capfd.readouterr()
         assert err == "No such file or directory -- %s (LoadError)\n" % tmpdir.join("t.rb")
+
+    def test_dump_bytecode(self, space, tmpdir, capfd):
+        self.run(space, tmpdir, None, ruby_args=["--dump-bytecode", "-e", "1; puts 2"])
+        out, err = capfd.readouterr()
+        assert out.splitlines() == [
+            "== <main> (-e)",
+            "0000 LOAD_SELF",
+            "0001 LOAD_CONST 1",
+            "0004 SEND 2 1",
+            "0009 RETURN",
+        ]
+        self.run(space, tmpdir, None, ruby_args=["--no-optimize", "--dump-bytecode", "-e", "1; puts 2"])
+        out, err = capfd.readouterr()
+        assert out.splitlines()[1:3] == ["0000 LOAD_CONST 0", "0003 DISCARD_TOP"]
+
+    def test_prebuilt_kernel(self, space, tmpdir, capfd, monkeypatch):
+        space.prebuild_kernel()
+        assert [os.path.basename(bc.filepath) for bc in space.kernel_code] == KERNEL_FILES
+
+        def load_feature(space, path, orig_path):
+            raise AssertionError("kernel loaded from %s" % path)
+        monkeypatch.setattr(Kernel, "load_feature", staticmethod(load_feature))
+        space.load_kernel(str(tmpdir))
+        self.run(space, tmpdir, None, ruby_args=["-e", "puts [3, 1, 2].sort.inspect"])
+        out, err = capfd.readouterr()
+        assert out == "[1, 2, 3]\n"
+
+    def test_startup_profile_path(self):
+        assert _startup_profile_path(["topaz", "-e", "1"]) is None
+        assert _startup_profile_path(["topaz", "--startup-profile", "-e", "1"]) == ""
+        assert _startup_profile_path(["topaz", "-I", "x", "--startup-profile=p.json", "t.rb"]) == "p.json"
+        assert _startup_profile_path(["topaz", "t.rb", "--startup-profile"]) is None
+        assert _startup_profile_path(["topaz", "-e", "--startup-profile"]) is None
+
+    def test_startup_profile(self, space, tmpdir, capfd):
+        profile = space.fromcache(StartupProfile)
+        tmpdir.join("lib.rb").write("X = [1, 2]")
+        tmpdir.join("other.rb").write("Y = [1, 2]")
+        self.run(space, tmpdir, None, ruby_args=["--startup-profile", "-I", str(tmpdir), "-e", "require 'other'"])
+        assert profile.phases == []
+
+        profile.enable()
+        self.run(space, tmpdir, None, ruby_args=["--startup-profile", "-I", str(tmpdir), "-e", "require 'lib'"])
+        lib = str(tmpdir.join("lib.rb"))
+        phases = [(phase.name, phase.path) for phase in profile.phases]
+        assert phases == [
+            ("argv", ""),
+            ("lex", "-e"), ("parse", "-e"), ("compile", "-e"),
+            ("read", lib), ("lex", lib), ("parse", lib), ("compile", lib), ("run", lib),
+            ("run", "-e"),
+        ]
+        [run_lib] = [phase for phase in profile.phases if phase.name == "run" and phase.path == lib]
+        assert run_lib.allocations >= 1
+
+        _write_report("", profile.report(), "startup profile")
+        out, err = capfd.readouterr()
+        lines = err.splitlines()
+        assert lines[0].startswith("startup profile: ")
+        assert lines[1].split() == ["ms", "allocations", "phase", "file"]
+        assert len(lines) == 2 + len(phases)
+        _write_report(str(tmpdir.join("profile.json")), profile.report_json(), "startup profile")
+        data = json.loads(tmpdir.join("profile.json").read())
+        assert sorted((phase["phase"], phase["file"]) for phase in data["phases"]) == sorted(phases)
+
+    def test_profile(self, space, tmpdir, capfd):
+        profiler = space.fromcache(SamplingProfiler)
+        profiler.check_ticks = 1
+        source = "def f; i = 0; while i < 100; i += 1; end; end; 10.times { f }"
+        self.run(space, tmpdir, None, ruby_args=["--profile", "-e", source])
+        assert not profiler.enabled
+        out, err = capfd.readouterr()
+        assert not out
+        lines = err.splitlines()
+        assert lines[0].startswith("profile: ")
+        assert lines[1].split()[-1] == "function"
+        assert lines[2].split()[-2] == "f"
+
+        path = tmpdir.join("profile.txt")
+        self.run(space, tmpdir, None, ruby_args=["--profile=%s" % path, "-e", source])
+        out, err = capfd.readouterr()
+        assert not err
+        assert path.read()
+        for line in path.read().splitlines():
+            stack, count = line.rsplit(" ", 1)
+            assert stack.startswith("<main> (-e:1)")
+            assert int(count) >= 1
+
+    def test_dispatch_stats(self, space, tmpdir, capfd):
+        path = tmpdir.join("stats.json")
+        self.run(space, tmpdir, None, ruby_args=["--dispatch-stats=%s" % path, "-e", "x = 1; puts x + 2"])
+        out, err = capfd.readouterr()
+        assert out == "3\n"
+        assert not err
+        data = json.loads(path.read())
+        assert data["instructions"] == sum(entry["count"] for entry in data["opcodes"])
+        assert "puts" in [entry["name"] for entry in data["send_names"]]
+        assert ("LOAD_CONST", "SEND_ADD") in [(entry["first"], entry["second"]) for entry in data["pairs"]]
+        [main] = [entry for entry in data["code"] if entry["file"] == "-e"]
+        assert main["name"] == "<main>"
+
+    def test_gc_environment(self, monkeypatch):
+        assert _gc_environment(["topaz", "-e", "1"]) == []
+        assert _gc_environment(["topaz", "--gc-nursery=4MB", "--gc-log=gc.log", "t.rb", "--gc-max-heap=1GB"]) == [
+            ("PYPY_GC_NURSERY", "4MB"), ("PYPYLOG", "gc:gc.log")
+        ]
+        monkeypatch.delenv("PYPY_GC_MAJOR_COLLECT", raising=False)
+        _exec_with_environment(["topaz"], [("PYPY_GC_MAJOR_COLLECT", "3.0")])
+        assert os.environ["PYPY_GC_MAJOR_COLLECT"] == "3.0"
+
+    def test_gc_options(self, space, tmpdir, capfd):
+        self.run(space, tmpdir, None, ruby_args=["--gc-major-collect=2.5", "-e", "puts 1"])
+        out, err = capfd.readouterr()
+        assert out == "1\n"
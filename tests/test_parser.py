@@ -842,21 +842,21 @@ class TestParser(BaseTopazTest):
 
     def test_def(self, space):
         assert space.parse("def f() end") == ast.Main(ast.Block([
-            ast.Statement(ast.Function(None, "f", [], None, None, ast.Nil()))
+            ast.Statement(ast.Function(None, "f", [], None, None, ast.Nil(), 1))
         ]))
 
         assert space.parse("def []; end") == ast.Main(ast.Block([
-            ast.Statement(ast.Function(None, "[]", [], None, None, ast.Nil()))
+            ast.Statement(ast.Function(None, "[]", [], None, None, ast.Nil(), 1))
         ]))
 
         assert space.parse("def []=; end") == ast.Main(ast.Block([
-            ast.Statement(ast.Function(None, "[]=", [], None, None, ast.Nil()))
+            ast.Statement(ast.Function(None, "[]=", [], None, None, ast.Nil(), 1))
         ]))
 
         assert space.parse("def f(a, b) a + b end") == ast.Main(ast.Block([
             ast.Statement(ast.Function(None, "f", [ast.Argument("a"), ast.Argument("b")], None, None, ast.Block([
                 ast.Statement(ast.Send(ast.Variable("a", 1),  "+", [ast.Variable("b", 1)], None, 1))
-            ])))
+            ]), 1))
         ]))
 
         r = space.parse("""
@@ -871,11 +871,11 @@ class TestParser(BaseTopazTest):
                 ast.Statement(ast.Send(ast.Self(3), "puts", [ast.Variable("a", 3)], None, 3)),
                 ast.Statement(ast.Send(ast.Self(4), "puts", [ast.Variable("a", 4)], None, 4)),
                 ast.Statement(ast.Send(ast.Self(5), "puts", [ast.Variable("a", 5)], None, 5)),
-            ])))
+            ]), 2))
         ]))
 
         assert space.parse("x = def f() end") == ast.Main(ast.Block([
-            ast.Statement(ast.Assignment(ast.Variable("x", 1), ast.Function(None, "f", [], None, None, ast.Nil())))
+            ast.Statement(ast.Assignment(ast.Variable("x", 1), ast.Function(None, "f", [], None, None, ast.Nil(), 1)))
         ]))
 
         r = space.parse("""
@@ -886,7 +886,7 @@ class TestParser(BaseTopazTest):
         assert r == ast.Main(ast.Block([
             ast.Statement(ast.Function(None, "f", [ast.Argument("a"), ast.Argument("b")], None, None, ast.Block([
                 ast.Statement(ast.Send(ast.Variable("a", 3), "+", [ast.Variable("b", 3)], None, 3))
-            ])))
+            ]), 2))
         ]))
 
         r = space.parse("""
@@ -897,21 +897,21 @@ class TestParser(BaseTopazTest):
         assert r == ast.Main(ast.Block([
             ast.Statement(ast.Function(None, "f", [], None, "b", ast.Block([
                 ast.Statement(ast.Variable("b", 3))
-            ])))
+            ]), 2))
         ]))
         r = space.parse("""
         def f(a=nil, *b)
         end
         """)
         assert r == ast.Main(ast.Block([
-            ast.Statement(ast.Function(None, "f", [ast.Argument("a", ast.Nil())], "b", None, ast.Nil()))
+            ast.Statement(ast.Function(None, "f", [ast.Argument("a", ast.Nil())], "b", None, ast.Nil(), 2))
         ]))
         r = space.parse("""
         def f(a, b=nil, *c)
         end
         """)
         assert r == ast.Main(ast.Block([
-            ast.Statement(ast.Function(None, "f", [ast.Argument("a"), ast.Argument("b", ast.Nil())], "c", None, ast.Nil()))
+            ast.Statement(ast.Function(None, "f", [ast.Argument("a"), ast.Argument("b", ast.Nil())], "c", None, ast.Nil(), 2))
         ]))
         with self.raises(space, "SyntaxError"):
             space.parse("""
@@ -941,7 +941,8 @@ class TestParser(BaseTopazTest):
                         ]),
                         ast.Variable("2", -1)
                     )
-                )])
+                )]),
+                1,
             ))
         ]))
 
@@ -952,7 +953,7 @@ class TestParser(BaseTopazTest):
             end
             """ % s)
             assert r == ast.Main(ast.Block([
-                ast.Statement(ast.Function(None, s, [], None, None, ast.Nil()))
+                ast.Statement(ast.Function(None, s, [], None, None, ast.Nil(), 2))
             ]))
         test_name("abc")
         test_name("<=>")
@@ -1249,7 +1250,7 @@ HERE
             ast.Statement(ast.Class(ast.Scope(2), "X", None, ast.Block([
                 ast.Statement(ast.Function(None, "f", [], None, None, ast.Block([
                     ast.Statement(ast.ConstantInt(2))
-                ])))
+                ]), 3))
             ])))
         ]))
 
@@ -1269,7 +1270,7 @@ HERE
         """)
         assert r == ast.Main(ast.Block([
             ast.Statement(ast.Class(ast.Scope(2), "X", ast.Constant("Object", 2), ast.Nil())),
-            ast.Statement(ast.Function(None, "f", [], None, None, ast.Nil())),
+            ast.Statement(ast.Function(None, "f", [], None, None, ast.Nil(), 4)),
         ]))
 
     def test_nest_class(self, space):
@@ -1723,7 +1724,7 @@ HERE
 
     def test_function_default_arguments(self, space):
         function = lambda name, args: ast.Main(ast.Block([
-            ast.Statement(ast.Function(None, name, args, None, None, ast.Nil()))
+            ast.Statement(ast.Function(None, name, args, None, None, ast.Nil(), 2))
         ]))
 
         r = space.parse("""
@@ -1986,7 +1987,7 @@ HERE
                     ]))
                 ],
                 ast.Nil(),
-            )))
+            ), 2))
         ]))
 
         r = space.parse("""
@@ -2000,7 +2001,7 @@ HERE
             ast.Statement(ast.Function(None, "f", [], None, None, ast.TryFinally(
                 ast.Block([ast.Statement(ast.ConstantInt(10))]),
                 ast.Block([ast.Statement(ast.ConstantInt(5))]),
-            )))
+            ), 2))
         ]))
 
     def test_begin(self, space):
@@ -2022,7 +2023,7 @@ HERE
         """)
         assert r == ast.Main(ast.Block([
             ast.Statement(ast.Module(ast.Scope(2), "M", ast.Block([
-                ast.Statement(ast.Function(None, "method", [], None, None, ast.Nil()))
+                ast.Statement(ast.Function(None, "method", [], None, None, ast.Nil(), 3))
             ])))
         ]))
 
@@ -2040,7 +2041,7 @@ HERE
             ast.Statement(ast.Send(ast.Send(ast.Self(1), "obj", [], None, 1), "method?", [], None, 1))
         ]))
         assert space.parse("def method?() end") == ast.Main(ast.Block([
-            ast.Statement(ast.Function(None, "method?", [], None, None, ast.Nil()))
+            ast.Statement(ast.Function(None, "method?", [], None, None, ast.Nil(), 1))
         ]))
         assert space.parse("method?") == ast.Main(ast.Block([
             ast.Statement(ast.Send(ast.Self(1), "method?", [], None, 1))
@@ -2053,7 +2054,7 @@ HERE
             ast.Statement(ast.Send(ast.Send(ast.Self(1), "obj", [], None, 1), "method!", [], None, 1))
         ]))
         assert space.parse("def method!() end") == ast.Main(ast.Block([
-            ast.Statement(ast.Function(None, "method!", [], None, None, ast.Nil()))
+            ast.Statement(ast.Function(None, "method!", [], None, None, ast.Nil(), 1))
         ]))
         assert space.parse("method!") == ast.Main(ast.Block([
             ast.Statement(ast.Send(ast.Self(1), "method!", [], None, 1))
@@ -2070,14 +2071,14 @@ HERE
         assert r == ast.Main(ast.Block([
             ast.Statement(ast.Function(ast.Constant("Array", 2), "hello", [], None, None, ast.Block([
                 ast.Statement(ast.ConstantString("hello world")),
-            ])))
+            ]), 2))
         ]))
         r = space.parse("""
         def x.r=
         end
         """)
         assert r == ast.Main(ast.Block([
-            ast.Statement(ast.Function(ast.Send(ast.Self(2), "x", [], None, 2), "r=", [], None, None, ast.Nil()))
+            ast.Statement(ast.Function(ast.Send(ast.Self(2), "x", [], None, 2), "r=", [], None, None, ast.Nil(), 2))
         ]))
 
     def test_global_var(self, space):
@@ -2146,17 +2147,17 @@ HERE
     def test_declare_splat_argument(self, space):
         r = space.parse("def f(*args) end")
         assert r == ast.Main(ast.Block([
-            ast.Statement(ast.Function(None, "f", [], "args", None, ast.Nil()))
+            ast.Statement(ast.Function(None, "f", [], "args", None, ast.Nil(), 1))
         ]))
 
         r = space.parse("def f(*args, &g) end")
         assert r == ast.Main(ast.Block([
-            ast.Statement(ast.Function(None, "f", [], "args", "g", ast.Nil()))
+            ast.Statement(ast.Function(None, "f", [], "args", "g", ast.Nil(), 1))
         ]))
 
         r = space.parse("def f(a, *) end")
         assert r == ast.Main(ast.Block([
-            ast.Statement(ast.Function(None, "f", [ast.Argument("a")], "*", None, ast.Nil()))
+            ast.Statement(ast.Function(None, "f", [ast.Argument("a")], "*", None, ast.Nil(), 1))
         ]))
 
         with self.raises(space, "SyntaxError"):
@@ -2305,7 +2306,7 @@ HERE
                         ast.Return(ast.Nil())
                     ])
                 ))
-            ])))
+            ]), 2))
         ]))
 
     def test_ternary_operator(self, space):
@@ -0,0 +1,82 @@
+from topaz.profiler import SamplingProfiler
+
+from .base import BaseTopazTest
+
+
+class TestSamplingProfiler(BaseTopazTest):
+    def profile(self, space, source):
+        profiler = space.fromcache(SamplingProfiler)
+        profiler.check_ticks = 10
+        space.execute("""
+        def inner
+          i = 0
+          while i < 200
+            i += 1
+          end
+        end
+
+        def outer
+          inner
+        end
+
+        Topaz::Profiler.start(0.0)
+        %s
+        Topaz::Profiler.stop
+        """ % source)
+        return profiler
+
+    def test_disabled(self, space):
+        profiler = space.fromcache(SamplingProfiler)
+        space.execute("i = 0; while i < 5000; i += 1; end")
+        assert profiler.samples == 0
+        assert profiler.stacks == []
+
+    def test_start_stop(self, space):
+        w_res = space.execute("""
+        res = [Topaz::Profiler.running?, Topaz::Profiler.start, Topaz::Profiler.start, Topaz::Profiler.running?]
+        res << Topaz::Profiler.stop << Topaz::Profiler.stop << Topaz::Profiler.running?
+        """)
+        assert self.unwrap(space, w_res) == [False, True, False, True, True, False, False]
+        with self.raises(space, "ArgumentError", "negative sampling interval"):
+            space.execute("Topaz::Profiler.start(-1.0)")
+        with self.raises(space, "ArgumentError", "unknown profile format: bar"):
+            space.execute("Topaz::Profiler.report(:bar)")
+
+    def test_samples(self, space):
+        profiler = self.profile(space, "outer")
+        assert profiler.samples >= 20
+        assert space.int_w(space.execute("Topaz::Profiler.samples")) == profiler.samples
+        # Every sample was taken with outer and inner on the stack, the
+        # loop in inner ticks once per iteration.
+        names = [[label.split(" ")[0] for label in stack.frames] for stack in profiler.stacks]
+        assert [name[-2:] for name in names] == [["outer", "inner"]] * len(names)
+        [stack] = profiler.stacks
+        assert stack.frames[-2] == "outer (-e:10)"
+        assert stack.samples == profiler.samples
+
+    def test_reports(self, space):
+        self.profile(space, "outer; inner")
+        flat = space.str_w(space.execute("Topaz::Profiler.report"))
+        lines = flat.splitlines()
+        assert lines[0].startswith("profile: ")
+        assert lines[1].split() == ["self", "ms", "self", "total", "ms", "function"]
+        assert lines[2].split()[3] == "inner"
+
+        tree = space.str_w(space.execute("Topaz::Profiler.report(:tree)")).splitlines()
+        assert tree[1].split() == ["total", "ms", "total", "call", "tree"]
+        labels = [line.split("%  ", 1)[1] for line in tree[2:]]
+        assert labels[0] == "<main> (-e:14)"
+        outer = labels.index("  outer (-e:10)")
+        assert labels[outer + 1] == "    inner (-e:4)"
+        del labels[outer:outer + 2]
+        assert labels == ["<main> (-e:14)", "  inner (-e:4)"]
+
+        collapsed = space.str_w(space.execute("Topaz::Profiler.report(:collapsed)"))
+        lines = collapsed.splitlines()
+        assert len(lines) == 2
+        total = 0
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            assert stack.split(";")[-1].startswith("inner (")
+            total += int(count)
+        assert total == space.fromcache(SamplingProfiler).samples
@@ -0,0 +1,179 @@
+import weakref
+
+from rpython.rlib import jit
+from rpython.rlib.objectmodel import compute_unique_id
+from rpython.rlib.rweakref import RWeakKeyDictionary
+
+from topaz.startupprofile import StartupProfile
+
+
+# The type count_objects reports for the objects of each builtin class, the
+# first one found along an object's classdef and its superclassdefs.
+OBJECT_TYPES = {
+    "Object": "T_OBJECT",
+    "String": "T_STRING",
+    "Symbol": "T_SYMBOL",
+    "Array": "T_ARRAY",
+    "Hash": "T_HASH",
+    "Float": "T_FLOAT",
+    "Bignum": "T_BIGNUM",
+    "Regexp": "T_REGEXP",
+    "MatchData": "T_MATCH",
+    "Range": "T_STRUCT",
+    "Class": "T_CLASS",
+    "Module": "T_MODULE",
+    "Proc": "T_DATA",
+    "Method": "T_DATA",
+    "UnboundMethod": "T_DATA",
+    "Binding": "T_DATA",
+    "IO": "T_DATA",
+    "Dir": "T_DATA",
+    "Time": "T_DATA",
+    "Random": "T_DATA",
+    "Thread": "T_DATA",
+    "Fiber": "T_DATA",
+    "Encoding": "T_DATA",
+}
+
+
+def object_type(w_obj):
+    classdef = w_obj.classdef
+    while classdef is not None:
+        if classdef.name in OBJECT_TYPES:
+            return OBJECT_TYPES[classdef.name]
+        classdef = classdef.superclassdef
+    return "T_DATA"
+
+
+class AllocationSite(object):
+    def __init__(self, w_cls, path, lineno):
+        self.w_cls = w_cls
+        self.path = path
+        self.lineno = lineno
+        self.count = 0
+
+
+class TracedObject(object):
+    def __init__(self, w_obj, site):
+        self.ref = weakref.ref(w_obj)
+        self.site = site
+
+
+class AllocationHooks(object):
+    """
+    Whether anything wants to hear of the objects allocated: the startup
+    profile counting them or the AllocationTracer tracing them. Both are
+    behind one quasi-immutable flag, which is all an allocation checks
+    while neither is enabled.
+    """
+
+    _immutable_fields_ = ["enabled?"]
+
+    def __init__(self, space):
+        self.enabled = False
+        self.counting = False
+        self.tracing = False
+
+    def update(self):
+        self.enabled = self.counting or self.tracing
+
+    def allocated(self, space, w_obj, w_cls):
+        if self.counting:
+            space.fromcache(StartupProfile).allocations += 1
+        if self.tracing:
+            space.fromcache(AllocationTracer).trace(space, w_obj, w_cls)
+
+
+class AllocationTracer(object):
+    """
+    Records, while enabled, where every object is allocated: its class and
+    the file and line of the Ruby frame allocating it, aggregated per site.
+    Each traced object is also kept through a weak reference, so the
+    objects that are still alive can be counted per site without walking
+    the heap, and a weak-keyed dictionary finds the site of an object.
+    Disabled it costs a check of the AllocationHooks' flag per allocation.
+    """
+
+    _immutable_fields_ = ["enabled?", "hooks"]
+
+    def __init__(self, space):
+        self.enabled = False
+        self.hooks = space.fromcache(AllocationHooks)
+        self.clear()
+
+    def clear(self):
+        from topaz.objects.objectobject import W_Root
+
+        self.sites = []
+        self.sites_by_key = {}
+        self.objects = []
+        self.object_sites = RWeakKeyDictionary(W_Root, AllocationSite)
+        self.compact_at = 1024
+
+    def start(self):
+        self.enabled = True
+        self.hooks.tracing = True
+        self.hooks.update()
+
+    def stop(self):
+        self.enabled = False
+        self.hooks.tracing = False
+        self.hooks.update()
+
+    @jit.dont_look_inside
+    def trace(self, space, w_obj, w_cls):
+        frame = space.getexecutioncontext().gettoprubyframe()
+        if frame is None:
+            path = ""
+            lineno = 0
+        else:
+            path = frame.get_filename()
+            lineno = frame.get_lineno(None)
+        key = "%d:%d:%s" % (compute_unique_id(w_cls), lineno, path)
+        site = self.sites_by_key.get(key, None)
+        if site is None:
+            site = self.sites_by_key[key] = AllocationSite(w_cls, path, lineno)
+            self.sites.append(site)
+        site.count += 1
+        if len(self.objects) >= self.compact_at:
+            self.compact()
+            self.compact_at = 2 * len(self.objects) + 1024
+        self.objects.append(TracedObject(w_obj, site))
+        self.object_sites.set(w_obj, site)
+
+    def compact(self):
+        objects = []
+        for traced in self.objects:
+            if traced.ref() is not None:
+                objects.append(traced)
+        self.objects = objects
+
+    def find_site(self, w_obj):
+        return self.object_sites.get(w_obj)
+
+    def retained(self):
+        """
+        Returns the number of live objects allocated at each site, as a
+        dict keyed by the site.
+        """
+        self.compact()
+        counts = {}
+        for traced in self.objects:
+            counts[traced.site] = counts.get(traced.site, 0) + 1
+        return counts
+
+
+def count_types(objects_w):
+    """
+    Returns the types of the objects, in the order they're first found,
+    and the number of objects of each.
+    """
+    types = []
+    counts = {}
+    for w_obj in objects_w:
+        name = object_type(w_obj)
+        if name not in counts:
+            types.append(name)
+            counts[name] = 0
+        counts[name] += 1
+    return types, counts
@@ -2,11 +2,19 @@ from __future__ import absolute_import
 
 from rpython.rlib.objectmodel import we_are_translated
 
-from topaz import consts
+from topaz import casedispatch, consts
 from topaz.astcompiler import CompilerContext, BlockSymbolTable
 from topaz.utils.regexp import RegexpError
 
 
+def first_lineno(nodes):
+    for node in nodes:
+        lineno = node.first_lineno()
+        if lineno >= 0:
+            return lineno
+    return -1
+
+
 class BaseNode(object):
     _attrs_ = []
 
@@ -21,13 +29,24 @@ class BaseNode(object):
         else:
             raise NotImplementedError(type(self).__name__)
 
+    def first_lineno(self):
+        """
+        The line the code for this node starts on, or -1 when the node
+        doesn't carry one.
+        """
+        return -1
+
 
 class Node(BaseNode):
     _attrs_ = ["lineno"]
+    lineno = -1
 
     def __init__(self, lineno):
         self.lineno = lineno
 
+    def first_lineno(self):
+        return self.lineno
+
 
 class Main(Node):
     def __init__(self, block):
@@ -61,9 +80,20 @@ class BaseStatement(Node):
 
 class Statement(BaseStatement):
     def __init__(self, expr):
+        Node.__init__(self, expr.first_lineno())
         self.expr = expr
 
     def compile(self, ctx):
+        if self.lineno < 0:
+            self.compile_expr(ctx)
+        else:
+            # Every instruction of a statement belongs to its line, even the
+            # ones for literals and local variables, which carry no line of
+            # their own.
+            with ctx.set_lineno(self.lineno):
+                self.compile_expr(ctx)
+
+    def compile_expr(self, ctx):
         self.expr.compile(ctx)
         if not self.dont_pop:
             with ctx.set_lineno(ctx.last_lineno):
@@ -85,17 +115,24 @@ class If(Node):
         self.cond.compile(ctx)
         ctx.emit_jump(consts.JUMP_IF_FALSE, otherwise)
         self.body.compile(ctx)
-        ctx.emit_jump(consts.JUMP, end)
+        with ctx.set_lineno(ctx.last_lineno):
+            ctx.emit_jump(consts.JUMP, end)
         ctx.use_next_block(otherwise)
         self.elsebody.compile(ctx)
         ctx.use_next_block(end)
 
+    def first_lineno(self):
+        return self.cond.first_lineno()
+
 
 class BaseLoop(Node):
     def __init__(self, cond, body):
         self.cond = cond
         self.body = body
 
+    def first_lineno(self):
+        return self.cond.first_lineno()
+
     def compile(self, ctx):
         anchor = ctx.new_block()
         end = ctx.new_block()
@@ -168,9 +205,10 @@ class TryExcept(Node):
             ctx.emit_jump(consts.SETUP_EXCEPT, exc)
         ctx.use_next_block(ctx.new_block())
         self.body.compile(ctx)
-        if self.except_handlers:
-            ctx.emit(consts.POP_BLOCK)
-        ctx.emit_jump(consts.JUMP, else_block)
+        with ctx.set_lineno(ctx.last_lineno):
+            if self.except_handlers:
+                ctx.emit(consts.POP_BLOCK)
+            ctx.emit_jump(consts.JUMP, else_block)
         ctx.use_next_block(exc)
 
         for handler in self.except_handlers:
@@ -200,7 +238,8 @@ class TryExcept(Node):
             ctx.emit(consts.DISCARD_TOP)
             ctx.emit(consts.DISCARD_TOP)
             handler.body.compile(ctx)
-            ctx.emit_jump(consts.JUMP, end)
+            with ctx.set_lineno(ctx.last_lineno):
+                ctx.emit_jump(consts.JUMP, end)
             ctx.use_next_block(next_except)
 
         if self.except_handlers:
@@ -246,6 +285,11 @@ class BaseModule(Node):
         self.name = name
         self.body = body
 
+    def first_lineno(self):
+        if self.scope is None:
+            return -1
+        return self.scope.first_lineno()
+
     def compile_body(self, ctx, ctxname):
         body_ctx = ctx.get_subctx(ctxname, self)
         self.body.compile(body_ctx)
@@ -287,6 +331,9 @@ class SingletonClass(BaseModule):
             ctx.emit(consts.LOAD_SINGLETON_CLASS)
             self.compile_body(ctx, "singletonclass")
 
+    def first_lineno(self):
+        return self.lineno
+
 class Module(BaseModule):
     def compile(self, ctx):
         if self.scope is not None:
@@ -299,7 +346,8 @@ class Module(BaseModule):
 
 
 class Function(Node):
-    def __init__(self, parent, name, args, splat_arg, block_arg, body):
+    def __init__(self, parent, name, args, splat_arg, block_arg, body, lineno):
+        Node.__init__(self, lineno)
         self.parent = parent
         self.name = name
         self.args = args
@@ -316,7 +364,7 @@ class Function(Node):
             arg_names.append(arg.name)
             function_ctx.symtable.get_cell_num(arg.name)
 
-            arg_ctx = CompilerContext(ctx.space, self.name, function_ctx.symtable, ctx.filepath)
+            arg_ctx = CompilerContext(ctx.space, self.name, function_ctx.symtable, ctx.filepath, ctx.optimize)
             if arg.defl is not None:
                 arg.defl.compile(arg_ctx)
                 arg_ctx.emit(consts.RETURN)
@@ -368,10 +416,37 @@ class Case(Node):
         self.whens = whens
         self.elsebody = elsebody
 
+    def literal_kind(self):
+        kind = -1
+        for when in self.whens:
+            assert isinstance(when, When)
+            for expr in when.conds:
+                if isinstance(expr, ConstantInt):
+                    expr_kind = casedispatch.FIXNUM_KEYS
+                elif isinstance(expr, ConstantSymbol):
+                    expr_kind = casedispatch.SYMBOL_KEYS
+                elif isinstance(expr, ConstantString):
+                    expr_kind = casedispatch.STRING_KEYS
+                else:
+                    return -1
+                if kind != -1 and kind != expr_kind:
+                    return -1
+                kind = expr_kind
+        return kind
+
     def compile(self, ctx):
         end = ctx.new_block()
 
         self.cond.compile(ctx)
+        # When all the whens are literals of one kind, a jump table takes us
+        # straight to the right one. The chain of === sends is still emitted,
+        # for values the table can't answer for.
+        table = None
+        kind = self.literal_kind()
+        if kind != -1:
+            table_idx, table = ctx.create_case_table(kind)
+            ctx.emit(consts.CASE_DISPATCH, table_idx)
+        next_when = None
         for when in self.whens:
             assert isinstance(when, When)
             with ctx.set_lineno(when.lineno):
@@ -379,6 +454,13 @@ class Case(Node):
                 when_block = ctx.new_block()
 
                 for expr in when.conds:
+                    if table is not None:
+                        if isinstance(expr, ConstantInt):
+                            table.add_int(expr.intvalue, when_block)
+                        elif isinstance(expr, ConstantSymbol):
+                            table.add_str(expr.symbol, when_block)
+                        elif isinstance(expr, ConstantString):
+                            table.add_str(expr.strvalue, when_block)
                     next_expr = ctx.new_block()
                     ctx.emit(consts.DUP_TOP)
                     expr.compile(ctx)
@@ -390,8 +472,11 @@ class Case(Node):
                 ctx.use_next_block(when_block)
                 ctx.emit(consts.DISCARD_TOP)
                 when.block.compile(ctx)
-                ctx.emit_jump(consts.JUMP, end)
+                with ctx.set_lineno(ctx.last_lineno):
+                    ctx.emit_jump(consts.JUMP, end)
                 ctx.use_next_block(next_when)
+        if table is not None:
+            table.else_block = next_when
         ctx.emit(consts.DISCARD_TOP)
         self.elsebody.compile(ctx)
         ctx.use_next_block(end)
@@ -409,6 +494,14 @@ class Return(BaseStatement):
         self.expr = expr
 
     def compile(self, ctx):
+        lineno = self.expr.first_lineno()
+        if lineno < 0:
+            self.compile_return(ctx)
+        else:
+            with ctx.set_lineno(lineno):
+                self.compile_return(ctx)
+
+    def compile_return(self, ctx):
         self.expr.compile(ctx)
         if isinstance(ctx.symtable, BlockSymbolTable):
             ctx.emit(consts.RAISE_RETURN)
@@ -505,6 +598,9 @@ class Assignment(Node):
     def compile_defined(self, ctx):
         ConstantString("assignment").compile(ctx)
 
+    def first_lineno(self):
+        return first_lineno([self.target, self.value])
+
 
 class AugmentedAssignment(Node):
     def __init__(self, oper, target, value):
@@ -520,12 +616,18 @@ class AugmentedAssignment(Node):
             ctx.emit(consts.DUP_TWO)
         self.target.compile_load(ctx)
         self.value.compile(ctx)
-        ctx.emit(consts.SEND, ctx.create_symbol_const(self.oper), 1)
+        if self.oper in consts.BINARY_OPERATORS:
+            ctx.emit(consts.BINARY_OPERATORS[self.oper], ctx.create_symbol_const(self.oper))
+        else:
+            ctx.emit(consts.SEND, ctx.create_symbol_const(self.oper), 1)
         self.target.compile_store(ctx)
 
     def compile_defined(self, ctx):
         ConstantString("assignment").compile(ctx)
 
+    def first_lineno(self):
+        return first_lineno([self.target, self.value])
+
 
 class OrEqual(Node):
     def __init__(self, target, value):
@@ -553,6 +655,9 @@ class OrEqual(Node):
     def compile_defined(self, ctx):
         ConstantString("assignment").compile(ctx)
 
+    def first_lineno(self):
+        return first_lineno([self.target, self.value])
+
 
 class AndEqual(Node):
     def __init__(self, target, value):
@@ -580,6 +685,9 @@ class AndEqual(Node):
     def compile_defined(self, ctx):
         ConstantString("assignment").compile(ctx)
 
+    def first_lineno(self):
+        return first_lineno([self.target, self.value])
+
 
 class MultiAssignable(Node):
     def __init__(self, targets):
@@ -591,6 +699,9 @@ class MultiAssignable(Node):
                 return i
         return -1
 
+    def first_lineno(self):
+        return first_lineno(self.targets)
+
     def compile_receiver(self, ctx):
         return 0
 
@@ -625,6 +736,9 @@ class MultiAssignment(Node):
     def compile_defined(self, ctx):
         ConstantString("assignment").compile(ctx)
 
+    def first_lineno(self):
+        return first_lineno([self.assignable, self.value])
+
 
 class Or(Node):
     def __init__(self, lhs, rhs):
@@ -646,6 +760,9 @@ class Or(Node):
     def compile_defined(self, ctx):
         ConstantString("expression").compile(ctx)
 
+    def first_lineno(self):
+        return first_lineno([self.lhs, self.rhs])
+
 
 class And(Node):
     def __init__(self, lhs, rhs):
@@ -667,6 +784,9 @@ class And(Node):
     def compile_defined(self, ctx):
         ConstantString("expression").compile(ctx)
 
+    def first_lineno(self):
+        return first_lineno([self.lhs, self.rhs])
+
 
 class BaseSend(Node):
     def __init__(self, receiver, args, block_arg, lineno):
@@ -735,6 +855,16 @@ class Send(BaseSend):
         BaseSend.__init__(self, receiver, args, block_arg, lineno)
         self.method = method
 
+    def compile(self, ctx):
+        if (self.method in consts.BINARY_OPERATORS and len(self.args) == 1 and
+            self.block_arg is None and not self.is_splat()):
+            with ctx.set_lineno(self.lineno):
+                self.receiver.compile(ctx)
+                self.args[0].compile(ctx)
+                ctx.emit(consts.BINARY_OPERATORS[self.method], self.method_name_const(ctx))
+        else:
+            BaseSend.compile(self, ctx)
+
     def method_name_const(self, ctx):
         return ctx.create_symbol_const(self.method)
 
@@ -796,7 +926,7 @@ class SendBlock(Node):
             block_args.append(arg.name)
             block_ctx.symtable.get_cell_num(arg.name)
             if arg.defl is not None:
-                arg_ctx = CompilerContext(ctx.space, blockname, block_ctx.symtable, ctx.filepath)
+                arg_ctx = CompilerContext(ctx.space, blockname, block_ctx.symtable, ctx.filepath, ctx.optimize)
                 arg.defl.compile(arg_ctx)
                 arg_ctx.emit(consts.RETURN)
                 bc = arg_ctx.create_bytecode([], [], None, None)
@@ -1,4 +1,5 @@
 from topaz import consts
+from topaz.casedispatch import CaseDispatchTable
 from topaz.objects.codeobject import W_CodeObject
 
 
@@ -86,13 +87,15 @@ class CompilerContext(object):
     F_BLOCK_FINALLY = 1
     F_BLOCK_FINALLY_END = 2
 
-    def __init__(self, space, code_name, symtable, filepath):
+    def __init__(self, space, code_name, symtable, filepath, optimize=True):
         self.space = space
         self.code_name = code_name
         self.symtable = symtable
         self.filepath = filepath
+        self.optimize = optimize
         self.consts = []
         self.const_positions = {}
+        self.case_tables = []
         self.current_lineno = -1
         self.last_lineno = -1
 
@@ -122,8 +125,12 @@ class CompilerContext(object):
                 assert False
 
         blocks = self.first_block.post_order()
-        code, lineno_table = self.get_code_lineno_table(blocks)
+        # The optimizations only ever remove pushes and paths, so the depth of
+        # the unoptimized code is still an upper bound.
         depth = self.count_stackdepth(blocks)
+        if self.optimize:
+            PeepholeOptimizer(self.space, blocks, self.consts).optimize()
+        code, lineno_table = self.get_code_lineno_table(blocks)
         for default in defaults:
             depth = max(depth, default.max_stackdepth)
         return W_CodeObject(
@@ -139,6 +146,7 @@ class CompilerContext(object):
             cellvars,
             freevars,
             lineno_table,
+            [table.build() for table in self.case_tables],
         )
 
     def get_code_lineno_table(self, blocks):
@@ -152,6 +160,8 @@ class CompilerContext(object):
             code_size += len(code)
         for block in blocks:
             block.patch_locs(offsets)
+        for table in self.case_tables:
+            table.patch_locs(offsets)
 
         code = []
         linenos = []
@@ -245,7 +255,12 @@ class CompilerContext(object):
 
     def get_subctx(self, name, node):
         subscope = self.symtable.get_subscope(node)
-        return CompilerContext(self.space, name, subscope, self.filepath)
+        return CompilerContext(self.space, name, subscope, self.filepath, self.optimize)
+
+    def create_case_table(self, kind):
+        table = CaseTable(kind)
+        self.case_tables.append(table)
+        return len(self.case_tables) - 1, table
 
     def create_const(self, w_obj):
         if w_obj not in self.const_positions:
@@ -266,6 +281,124 @@ class CompilerContext(object):
         return self.create_const(self.space.newstr_fromstr(strvalue))
 
 
+class PeepholeOptimizer(object):
+    """
+    Cleans up the blocks of a code object, in their final order, before they
+    are assembled:
+
+    * instructions following a jump, return or raise are dropped
+    * branches on a constant are turned into a jump, or removed
+    * pure pushes which are immediately discarded are removed
+    * jumps to a jump are threaded through to its target, and jumps to the
+      next instruction are removed
+
+    Blocks which become unreachable are emptied rather than removed, so the
+    layout doesn't change.
+    """
+
+    TERMINATORS = [
+        consts.JUMP, consts.RETURN, consts.RAISE_RETURN, consts.RAISE_BREAK,
+        consts.BREAK_LOOP, consts.CONTINUE_LOOP,
+    ]
+    BRANCHES = [consts.JUMP, consts.JUMP_IF_TRUE, consts.JUMP_IF_FALSE]
+    # Instructions which push a value without any other side effects.
+    PURE_PUSHES = [
+        consts.LOAD_SELF, consts.LOAD_SCOPE, consts.LOAD_BLOCK, consts.LOAD_CODE,
+        consts.LOAD_CONST, consts.LOAD_DEREF, consts.DUP_TOP,
+    ]
+
+    def __init__(self, space, blocks, consts_w):
+        self.space = space
+        self.blocks = blocks
+        self.consts_w = consts_w
+        self.positions = {}
+        for i, block in enumerate(blocks):
+            self.positions[block] = i
+
+    def optimize(self):
+        for block in self.blocks:
+            self.optimize_block(block)
+        self.remove_unreachable()
+        self.thread_jumps()
+        self.remove_unreachable()
+
+    def optimize_block(self, block):
+        instrs = []
+        for instr in block.instrs:
+            if (instr.opcode in [consts.JUMP_IF_TRUE, consts.JUMP_IF_FALSE] and
+                    instrs and instrs[-1].opcode == consts.LOAD_CONST):
+                w_cond = self.consts_w[instrs.pop().arg0]
+                if self.space.is_true(w_cond) == (instr.opcode == consts.JUMP_IF_TRUE):
+                    jump = Instruction(consts.JUMP, 0, -1, instr.lineno)
+                    jump.jump = instr.jump
+                    instr = jump
+                else:
+                    continue
+            elif (instr.opcode == consts.DISCARD_TOP and
+                    instrs and instrs[-1].opcode in self.PURE_PUSHES):
+                instrs.pop()
+                continue
+            instrs.append(instr)
+            if instr.opcode in self.TERMINATORS:
+                break
+        block.instrs = instrs
+
+    def falls_through(self, block):
+        return not block.instrs or block.instrs[-1].opcode not in self.TERMINATORS
+
+    def next_block(self, block):
+        pos = self.positions[block] + 1
+        if pos < len(self.blocks):
+            return self.blocks[pos]
+        return None
+
+    def remove_unreachable(self):
+        reachable = {}
+        pending = [self.blocks[0]]
+        while pending:
+            block = pending.pop()
+            if block is None or block in reachable:
+                continue
+            reachable[block] = None
+            for instr in block.instrs:
+                if instr.has_jump():
+                    pending.append(instr.jump)
+            if self.falls_through(block):
+                pending.append(self.next_block(block))
+        for block in self.blocks:
+            if block not in reachable:
+                block.instrs = []
+
+    def resolve(self, block):
+        """
+        Returns the block where execution really continues when jumping to
+        block, skipping over empty blocks and unconditional jumps.
+        """
+        seen = {}
+        while block is not None and block not in seen:
+            seen[block] = None
+            if not block.instrs:
+                block = self.next_block(block)
+            elif block.instrs[0].opcode == consts.JUMP:
+                block = block.instrs[0].jump
+            else:
+                return block
+        # Either the end of the code, or an infinite loop of jumps.
+        return None
+
+    def thread_jumps(self):
+        for block in self.blocks:
+            for instr in block.instrs:
+                if instr.opcode in self.BRANCHES:
+                    target = self.resolve(instr.jump)
+                    if target is not None:
+                        instr.jump = target
+            if block.instrs and block.instrs[-1].opcode == consts.JUMP:
+                target = block.instrs[-1].jump
+                if target is self.resolve(self.next_block(block)):
+                    block.instrs.pop()
+
+
 class Block(object):
     def __init__(self):
         self.instrs = []
@@ -299,6 +432,35 @@ class Block(object):
         return "".join(code)
 
 
+class CaseTable(object):
+    def __init__(self, kind):
+        self.kind = kind
+        self.int_targets = {}
+        self.str_targets = {}
+        self.else_block = None
+        self.offsets = None
+
+    def add_int(self, key, block):
+        if key not in self.int_targets:
+            self.int_targets[key] = block
+
+    def add_str(self, key, block):
+        if key not in self.str_targets:
+            self.str_targets[key] = block
+
+    def patch_locs(self, offsets):
+        self.offsets = offsets
+
+    def build(self):
+        int_targets = {}
+        for key, block in self.int_targets.iteritems():
+            int_targets[key] = self.offsets[block]
+        str_targets = {}
+        for key, block in self.str_targets.iteritems():
+            str_targets[key] = self.offsets[block]
+        return CaseDispatchTable(self.kind, int_targets, str_targets, self.offsets[self.else_block])
+
+
 class Instruction(object):
     def __init__(self, opcode, arg0, arg1, lineno):
         assert arg0 < 1 << 16
@@ -0,0 +1,257 @@
+import os
+
+from rpython.rlib import rmd5
+from rpython.rlib.rbigint import rbigint
+from rpython.rlib.rmarshal import get_marshaller, get_unmarshaller
+from rpython.rlib.streamio import open_file_as_stream
+
+from topaz import consts
+from topaz.casedispatch import CaseDispatchTable
+from topaz.objects.bignumobject import W_BignumObject
+from topaz.objects.boolobject import W_TrueObject, W_FalseObject
+from topaz.objects.codeobject import W_CodeObject
+from topaz.objects.floatobject import W_FloatObject
+from topaz.objects.intobject import W_FixnumObject
+from topaz.objects.nilobject import W_NilObject
+from topaz.objects.regexpobject import W_RegexpObject
+from topaz.objects.stringobject import W_StringObject
+from topaz.objects.symbolobject import W_SymbolObject
+
+
+MAGIC = "topaz-bytecode"
+
+CONST_NIL = 0
+CONST_TRUE = 1
+CONST_FALSE = 2
+CONST_OBJECT = 3
+CONST_FIXNUM = 4
+CONST_BIGNUM = 5
+CONST_FLOAT = 6
+CONST_SYMBOL = 7
+CONST_STRING = 8
+CONST_REGEXP = 9
+CONST_CODE = 10
+
+# (kind, intvalue, floatvalue, strvalue)
+CONST_TYPE = (int, int, float, str)
+# (kind, int_targets, str_targets, else_target)
+CASE_TABLE_TYPE = (int, {int: int}, {str: int}, int)
+# (name, code, max_stackdepth, consts, args, splat_arg, block_arg, defaults,
+#  cellvars, freevars, lineno_table, case_tables), the optional args are "" if
+# absent. Nested code objects are referred to by their index in the list of
+# all the code objects of a file.
+CODE_TYPE = (
+    str, str, int, [CONST_TYPE], [str], str, str, [int], [str], [str], [int],
+    [CASE_TABLE_TYPE],
+)
+# (magic, bytecode version, path, size, mtime, md5 of the source)
+HEADER_TYPE = (str, int, str, int, float, str)
+FILE_TYPE = (HEADER_TYPE, [CODE_TYPE])
+
+_dump_file = get_marshaller(FILE_TYPE)
+_load_file = get_unmarshaller(FILE_TYPE)
+
+
+class UncacheableCode(Exception):
+    pass
+
+
+class CodeWriter(object):
+    def __init__(self, space):
+        self.space = space
+        self.codes = []
+
+    def add_code(self, bc):
+        idx = len(self.codes)
+        # Reserve the slot first, the nested code objects come after it.
+        self.codes.append(None)
+        args = [bc.cellvars[pos] for pos in bc.arg_pos]
+        splat_arg = bc.cellvars[bc.splat_arg_pos] if bc.splat_arg_pos != -1 else ""
+        block_arg = bc.cellvars[bc.block_arg_pos] if bc.block_arg_pos != -1 else ""
+        consts_w = [self.dump_const(w_const) for w_const in bc.consts_w]
+        defaults = [self.add_code(default) for default in bc.defaults]
+        case_tables = [
+            (table.kind, table.int_targets, table.str_targets, table.else_target)
+            for table in bc.case_tables
+        ]
+        self.codes[idx] = (
+            bc.name, bc.code, bc.max_stackdepth, consts_w, args, splat_arg,
+            block_arg, defaults, bc.cellvars, bc.freevars, bc.lineno_table,
+            case_tables,
+        )
+        return idx
+
+    def dump_const(self, w_const):
+        space = self.space
+        if isinstance(w_const, W_NilObject):
+            return (CONST_NIL, 0, 0.0, "")
+        elif isinstance(w_const, W_TrueObject):
+            return (CONST_TRUE, 0, 0.0, "")
+        elif isinstance(w_const, W_FalseObject):
+            return (CONST_FALSE, 0, 0.0, "")
+        elif w_const is space.w_object:
+            return (CONST_OBJECT, 0, 0.0, "")
+        elif isinstance(w_const, W_FixnumObject):
+            return (CONST_FIXNUM, space.int_w(w_const), 0.0, "")
+        elif isinstance(w_const, W_BignumObject):
+            return (CONST_BIGNUM, 0, 0.0, space.bigint_w(w_const).str())
+        elif isinstance(w_const, W_FloatObject):
+            return (CONST_FLOAT, 0, space.float_w(w_const), "")
+        elif isinstance(w_const, W_SymbolObject):
+            return (CONST_SYMBOL, 0, 0.0, space.symbol_w(w_const))
+        elif isinstance(w_const, W_StringObject):
+            return (CONST_STRING, 0, 0.0, space.str_w(w_const))
+        elif isinstance(w_const, W_RegexpObject):
+            return (CONST_REGEXP, w_const.flags, 0.0, w_const.source)
+        elif isinstance(w_const, W_CodeObject):
+            return (CONST_CODE, self.add_code(w_const), 0.0, "")
+        else:
+            raise UncacheableCode
+
+
+class CodeReader(object):
+    def __init__(self, space, filepath, codes):
+        self.space = space
+        self.filepath = filepath
+        self.codes = codes
+        self.codes_w = [None] * len(codes)
+
+    def get_code(self, idx, parent_idx=-1):
+        # The nested code objects are written after the code containing
+        # them, anything else would be a cycle.
+        if not parent_idx < idx < len(self.codes):
+            raise ValueError("bad code index")
+        bc = self.codes_w[idx]
+        if bc is None:
+            bc = self.codes_w[idx] = self.load_code(idx, self.codes[idx])
+        return bc
+
+    def load_code(self, idx, code):
+        (name, bytecode, max_stackdepth, consts, args, splat_arg, block_arg,
+         defaults, cellvars, freevars, lineno_table, case_tables) = code
+        for arg in args + [splat_arg, block_arg]:
+            if arg and arg not in cellvars:
+                raise ValueError("bad argument name")
+        return W_CodeObject(
+            name,
+            self.filepath,
+            bytecode,
+            max_stackdepth,
+            [self.load_const(idx, const) for const in consts],
+            args,
+            splat_arg or None,
+            block_arg or None,
+            [self.get_code(default, idx) for default in defaults],
+            cellvars,
+            freevars,
+            lineno_table,
+            [
+                CaseDispatchTable(kind, int_targets, str_targets, else_target)
+                for kind, int_targets, str_targets, else_target in case_tables
+            ],
+        )
+
+    def load_const(self, idx, const):
+        space = self.space
+        kind, intvalue, floatvalue, strvalue = const
+        if kind == CONST_NIL:
+            return space.w_nil
+        elif kind == CONST_TRUE:
+            return space.w_true
+        elif kind == CONST_FALSE:
+            return space.w_false
+        elif kind == CONST_OBJECT:
+            return space.w_object
+        elif kind == CONST_FIXNUM:
+            return space.newint(intvalue)
+        elif kind == CONST_BIGNUM:
+            return space.newbigint_fromrbigint(rbigint.fromstr(strvalue))
+        elif kind == CONST_FLOAT:
+            return space.newfloat(floatvalue)
+        elif kind == CONST_SYMBOL:
+            return space.newsymbol(strvalue)
+        elif kind == CONST_STRING:
+            return space.newstr_fromstr(strvalue)
+        elif kind == CONST_REGEXP:
+            return space.newregexp(strvalue, intvalue)
+        elif kind == CONST_CODE:
+            return self.get_code(intvalue, idx)
+        else:
+            raise ValueError("bad constant")
+
+
+class BytecodeCache(object):
+    """
+    Keeps the compiled code of loaded and required files on disk, so they
+    don't have to be parsed and compiled again by the next process. Each
+    file is cached under the md5 of its path, and the entry is only used if
+    the bytecode version, path, size, mtime and md5 of the source all still
+    match. The cache is disabled until cache_dir is set.
+    """
+
+    def __init__(self, space):
+        self.cache_dir = None
+
+    def get_cache_path(self, filepath):
+        return os.path.join(self.cache_dir, rmd5.RMD5(filepath).hexdigest() + ".tbc")
+
+    def get_header(self, source, filepath):
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return None
+        return (MAGIC, consts.BYTECODE_VERSION, filepath, st.st_size, st.st_mtime,
+                rmd5.RMD5(source).hexdigest())
+
+    def compile(self, space, source, filepath):
+        if self.cache_dir is None or not space.optimize_bytecode:
+            return space.compile(source, filepath)
+        header = self.get_header(source, filepath)
+        if header is None:
+            return space.compile(source, filepath)
+        cache_path = self.get_cache_path(filepath)
+        bc = self.load(space, cache_path, header)
+        if bc is None:
+            bc = space.compile(source, filepath)
+            self.store(space, cache_path, header, bc)
+        return bc
+
+    def load(self, space, cache_path, header):
+        try:
+            f = open_file_as_stream(cache_path, buffering=0)
+            try:
+                data = f.readall()
+            finally:
+                f.close()
+        except OSError:
+            return None
+        try:
+            cached_header, codes = _load_file(data)
+            if cached_header != header or not codes:
+                return None
+            return CodeReader(space, header[2], codes).get_code(0)
+        except ValueError:
+            return None
+
+    def store(self, space, cache_path, header, bc):
+        writer = CodeWriter(space)
+        try:
+            writer.add_code(bc)
+        except UncacheableCode:
+            return
+        buf = []
+        _dump_file(buf, (header, writer.codes))
+        # Write to a temporary file first, so a concurrent process never
+        # sees a partially written entry.
+        tmp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            f = open_file_as_stream(tmp_path, "w", buffering=0)
+            try:
+                f.write("".join(buf))
+            finally:
+                f.close()
+            os.rename(tmp_path, cache_path)
+        except OSError:
+            pass
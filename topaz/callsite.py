@@ -0,0 +1,165 @@
+from topaz import consts
+
+
+class CallSiteStats(object):
+    """
+    Space-wide hit/miss counters for the call site caches.
+    """
+
+    def __init__(self, space):
+        self.hits = 0
+        self.misses = 0
+        self.megamorphic = 0
+
+
+def _resolve_method(space, w_cls, name, is_super):
+    if is_super:
+        return w_cls.resolve_method_super(space, name)
+    else:
+        return w_cls.resolve_method(space, name)
+
+
+class CacheEntry(object):
+    def __init__(self, w_cls, cell, next):
+        self.w_cls = w_cls
+        self.cell = cell
+        self.next = next
+
+
+class CallSiteCache(object):
+    """
+    An inline cache attached to a single call site in a code object. It
+    starts out empty, becomes monomorphic and then polymorphic as it sees
+    receivers of new classes, and once it has seen more than MAX_ENTRIES
+    classes it goes megamorphic and defers to the resolved method tables of
+    the classes themselves.
+
+    Each entry holds the resolved method cell of its class, which goes stale
+    when the method is redefined anywhere along the class's ancestors.
+
+    This is only consulted by the interpreter, inside the JIT the lookups are
+    already constant folded.
+    """
+
+    MAX_ENTRIES = 4
+
+    def __init__(self):
+        self.entries = None
+        self.megamorphic = False
+
+    def find_method(self, space, w_cls, name):
+        return self._lookup(space, w_cls, name, False)
+
+    def find_method_super(self, space, w_cls, name):
+        return self._lookup(space, w_cls, name, True)
+
+    def _lookup(self, space, w_cls, name, is_super):
+        stats = space.fromcache(CallSiteStats)
+        if self.megamorphic:
+            stats.megamorphic += 1
+            return _resolve_method(space, w_cls, name, is_super).method
+
+        n_entries = 0
+        entry = self.entries
+        while entry is not None:
+            if entry.w_cls is w_cls:
+                if not entry.cell.stale:
+                    stats.hits += 1
+                    return entry.cell.method
+                # The method, or the class's ancestors, changed since this
+                # entry was filled.
+                stats.misses += 1
+                entry.cell = _resolve_method(space, w_cls, name, is_super)
+                return entry.cell.method
+            n_entries += 1
+            entry = entry.next
+
+        stats.misses += 1
+        cell = _resolve_method(space, w_cls, name, is_super)
+        if n_entries >= self.MAX_ENTRIES:
+            self.megamorphic = True
+            self.entries = None
+        else:
+            self.entries = CacheEntry(w_cls, cell, self.entries)
+        return cell.method
+
+
+class OperatorState(object):
+    """
+    The operator bytecodes have fast paths for Fixnum and Float operands,
+    which are only valid until one of those operators is redefined on Fixnum
+    or Float.
+    """
+
+    _immutable_fields_ = ["fixnum_redefined?", "float_redefined?"]
+
+    def __init__(self, space):
+        self.fixnum_redefined = False
+        self.float_redefined = False
+
+    def method_defined(self, space, w_mod, name):
+        if space.bootstrap or name not in consts.BINARY_OPERATORS:
+            return
+        if w_mod is space.w_fixnum:
+            self.fixnum_redefined = True
+        elif w_mod is space.w_float:
+            self.float_redefined = True
+
+
+class ConstantState(object):
+    """
+    The global constant serial. It is bumped whenever a constant is assigned
+    or the ancestors of a module change, which invalidates every constant
+    site cache at once.
+    """
+
+    def __init__(self, space):
+        self.serial = 0
+
+    def changed(self):
+        self.serial += 1
+
+
+class ConstantSiteCache(object):
+    """
+    An inline cache attached to a single constant reference, remembering the
+    value found for the last scope it was looked up in. Values returned by
+    const_missing are never cached.
+    """
+
+    def __init__(self):
+        self.serial = -1
+        self.lexical_scope = None
+        self.w_scope = None
+        self.w_value = None
+
+
+class CallSites(object):
+    """
+    The call site and constant site caches of a code object, keyed by the
+    bytecode position following the instruction.
+    """
+
+    def __init__(self):
+        self.caches = {}
+        self.constants = {}
+
+    def __deepcopy__(self, memo):
+        # Caches refer to the classes of the space they were filled in, so a
+        # copy starts out cold.
+        memo[id(self)] = result = CallSites()
+        return result
+
+    def get(self, pc):
+        try:
+            return self.caches[pc]
+        except KeyError:
+            cache = self.caches[pc] = CallSiteCache()
+            return cache
+
+    def get_constant(self, pc):
+        try:
+            return self.constants[pc]
+        except KeyError:
+            cache = self.constants[pc] = ConstantSiteCache()
+            return cache
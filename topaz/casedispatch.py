@@ -0,0 +1,85 @@
+from rpython.rlib import jit
+
+
+FIXNUM_KEYS = 0
+SYMBOL_KEYS = 1
+STRING_KEYS = 2
+
+
+class CaseDispatchState(object):
+    """
+    A case dispatch table answers `literal === value` without sending
+    anything, which is only valid as long as ===, == and <=> behave as defined
+    by the kernel for Fixnum, Symbol and String. The tables are enabled once
+    the kernel is loaded, and disabled for good as soon as one of those
+    methods is redefined, or a module defining them is included, anywhere
+    along the ancestors of those classes.
+    """
+
+    _immutable_fields_ = ["enabled?"]
+
+    NAMES = ["===", "==", "<=>"]
+
+    def __init__(self, space):
+        self.enabled = False
+
+    def kernel_loaded(self, space):
+        self.enabled = True
+
+    def _affects(self, space, w_mod):
+        return (w_mod.is_ancestor_of(space.w_fixnum) or
+                w_mod.is_ancestor_of(space.w_symbol) or
+                w_mod.is_ancestor_of(space.w_string))
+
+    def method_defined(self, space, w_mod, name):
+        if self.enabled and name in self.NAMES and self._affects(space, w_mod):
+            self.enabled = False
+
+    def module_included(self, space, w_mod, w_included):
+        if not self.enabled or not self._affects(space, w_mod):
+            return
+        for name in self.NAMES:
+            if w_included.find_method(space, name) is not None:
+                self.enabled = False
+                return
+
+
+class CaseDispatchTable(object):
+    """
+    The jump table of a case statement whose whens are all Fixnum, Symbol or
+    String literals of the same kind. It maps each literal to the position of
+    the first when matching it, any other value of the same class goes to
+    the else branch. Values of any other class aren't looked up at all, and
+    fall through to the usual chain of === sends.
+    """
+
+    _immutable_fields_ = ["kind", "int_targets", "str_targets", "else_target"]
+
+    def __init__(self, kind, int_targets, str_targets, else_target):
+        self.kind = kind
+        self.int_targets = int_targets
+        self.str_targets = str_targets
+        self.else_target = else_target
+
+    @jit.elidable
+    def find_int(self, key):
+        return self.int_targets.get(key, self.else_target)
+
+    @jit.elidable
+    def find_str(self, key):
+        return self.str_targets.get(key, self.else_target)
+
+    def find_target(self, space, w_value):
+        if not space.fromcache(CaseDispatchState).enabled:
+            return -1
+        w_cls = space.getclass(w_value)
+        if self.kind == FIXNUM_KEYS:
+            if w_cls is space.w_fixnum:
+                return self.find_int(space.int_w(w_value))
+        elif self.kind == SYMBOL_KEYS:
+            if w_cls is space.w_symbol:
+                return self.find_str(space.symbol_w(w_value))
+        elif self.kind == STRING_KEYS:
+            if w_cls is space.w_string:
+                return self.find_str(space.str_w(w_value))
+        return -1
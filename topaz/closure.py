@@ -6,22 +6,6 @@ class BaseCell(W_Root):
     pass
 
 
-class LocalCell(BaseCell):
-    def get(self, space, frame, pos):
-        return frame.localsstack_w[pos]
-
-    def set(self, space, frame, pos, w_value):
-        frame.localsstack_w[pos] = w_value
-
-    def upgrade_to_closure(self, space, frame, pos):
-        w_obj = self.get(space, frame, pos)
-        if isinstance(w_obj, W_FixnumObject):
-            frame.cells[pos] = result = IntCell(space.int_w(w_obj))
-        else:
-            frame.cells[pos] = result = ClosureCell(w_obj)
-        return result
-
-
 class ClosureCell(BaseCell):
     def __init__(self, w_value):
         self.w_value = w_value
@@ -32,9 +16,6 @@ class ClosureCell(BaseCell):
     def set(self, space, frame, pos, w_value):
         self.w_value = w_value
 
-    def upgrade_to_closure(self, space, frame, pos):
-        return self
-
 
 class IntCell(ClosureCell):
     def __init__(self, intvalue):
@@ -8,6 +8,10 @@ ARRAY_EFFECT = 0xFE
 BLOCK_EFFECT = 0xFD
 UNPACK_EFFECT = 0xFC
 
+# Bump this whenever the bytecodes, or how the compiler uses them, change, so
+# stale entries in the bytecode cache aren't loaded.
+BYTECODE_VERSION = 1
+
 # Name, number of arguments, stack effect
 BYTECODES = [
     ("LOAD_SELF", 0, +1),
@@ -69,6 +73,15 @@ BYTECODES = [
     ("SEND_BLOCK_SPLAT", 2, SEND_EFFECT),
     ("DEFINED_METHOD", 1, 0),
 
+    ("SEND_ADD", 1, -1),
+    ("SEND_SUB", 1, -1),
+    ("SEND_MUL", 1, -1),
+    ("SEND_LT", 1, -1),
+    ("SEND_LE", 1, -1),
+    ("SEND_GT", 1, -1),
+    ("SEND_GE", 1, -1),
+    ("SEND_EQ", 1, -1),
+
     ("SEND_SUPER_BLOCK", 2, SEND_EFFECT),
     ("SEND_SUPER_BLOCK_SPLAT", 2, SEND_EFFECT),
     ("DEFINED_SUPER", 1, 0),
@@ -82,6 +95,7 @@ BYTECODES = [
     ("JUMP", 1, 0),
     ("JUMP_IF_TRUE", 1, -1),
     ("JUMP_IF_FALSE", 1, -1),
+    ("CASE_DISPATCH", 1, 0),
 
     ("DISCARD_TOP", 0, -1),
     ("DUP_TOP", 0, +1),
@@ -112,3 +126,12 @@ for i, (name, num_args, stack_effect) in enumerate(BYTECODES):
     BYTECODE_STACK_EFFECT.append(stack_effect)
 
 UNROLLING_BYTECODES = unrolling_iterable(enumerate(BYTECODE_NAMES))
+
+# Operators which are compiled to their own bytecode when sent with exactly
+# one argument and no block.
+BINARY_OPERATORS = {}
+for operator, name in [
+    ("+", "SEND_ADD"), ("-", "SEND_SUB"), ("*", "SEND_MUL"), ("<", "SEND_LT"),
+    ("<=", "SEND_LE"), (">", "SEND_GT"), (">=", "SEND_GE"), ("==", "SEND_EQ"),
+]:
+    BINARY_OPERATORS[operator] = getattr(module, name)
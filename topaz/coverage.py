@@ -0,0 +1,105 @@
+from topaz.objects.codeobject import W_CodeObject
+
+
+class FileCoverage(object):
+    """
+    The number of times each line of a file started running, -1 for the
+    lines without any code.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.counts = []
+
+    def extend(self, nlines):
+        while len(self.counts) < nlines:
+            self.counts.append(-1)
+
+    def add_line(self, lineno):
+        self.extend(lineno)
+        if self.counts[lineno - 1] == -1:
+            self.counts[lineno - 1] = 0
+
+    def hit(self, lineno):
+        self.counts[lineno - 1] += 1
+
+
+class CodeCoverage(object):
+    """
+    The counters of a code object's file, and for each of its instructions
+    the line it starts, or 0 when it continues the line of the instruction
+    before it.
+    """
+
+    _immutable_fields_ = ["file", "line_starts[*]"]
+
+    def __init__(self, file, line_starts):
+        self.file = file
+        self.line_starts = line_starts
+
+    def hit(self, pc):
+        lineno = self.line_starts[pc]
+        if lineno > 0:
+            self.file.hit(lineno)
+
+
+def line_starts(lineno_table):
+    # A line starts where it differs from the line of the code before it.
+    # Instructions without a line of their own, like the return at the end of
+    # a method, are skipped over, so they neither start a line nor end one.
+    starts = [0] * len(lineno_table)
+    prev_lineno = -1
+    for pc, lineno in enumerate(lineno_table):
+        if lineno >= 1 and lineno != prev_lineno:
+            starts[pc] = lineno
+        if lineno >= 0:
+            prev_lineno = lineno
+    return starts
+
+
+class CoverageState(object):
+    """
+    While started, the code of every file that's loaded is given the
+    counters of its file, and the interpreter bumps them whenever it runs an
+    instruction that starts a line. The counters hang off a quasi-immutable
+    field of the code, which the JIT folds: code that isn't covered doesn't
+    check anything, covered code only increments an item of a list.
+    """
+
+    def __init__(self, space):
+        self.enabled = False
+        self.files = []
+        self.files_by_path = {}
+        self.codes = []
+
+    def start(self):
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+        for bc in self.codes:
+            bc.coverage = None
+        self.files = []
+        self.files_by_path = {}
+        self.codes = []
+
+    def register(self, bc, source):
+        coverage = self.files_by_path.get(bc.filepath, None)
+        if coverage is None:
+            coverage = self.files_by_path[bc.filepath] = FileCoverage(bc.filepath)
+            self.files.append(coverage)
+        nlines = source.count("\n")
+        if source and not source.endswith("\n"):
+            nlines += 1
+        coverage.extend(nlines)
+        pending = [bc]
+        while pending:
+            bc = pending.pop()
+            for lineno in bc.lineno_table:
+                if lineno >= 1:
+                    coverage.add_line(lineno)
+            bc.coverage = CodeCoverage(coverage, line_starts(bc.lineno_table))
+            self.codes.append(bc)
+            for w_const in bc.consts_w:
+                if isinstance(w_const, W_CodeObject):
+                    pending.append(w_const)
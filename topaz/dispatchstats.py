@@ -0,0 +1,161 @@
+from rpython.rlib import jit
+
+from topaz import consts
+from topaz.utils.reporting import CountSorter, json_str, rjust
+
+
+class DispatchStats(object):
+    """
+    Counts what the interpreter executes: every opcode, every pair of
+    consecutive opcodes within a frame, the instructions executed in each
+    code object and the sends by method name. It's enabled by
+    --dispatch-stats, disabled it costs a check of a quasi-immutable flag.
+    """
+
+    _immutable_fields_ = ["enabled?"]
+
+    REPORT_LIMIT = 40
+
+    def __init__(self, space):
+        self.enabled = False
+        n = len(consts.BYTECODE_NAMES)
+        self.opcode_counts = [0] * n
+        self.pair_counts = [0] * (n * n)
+        self.codes = []
+        self.code_indexes = {}
+        self.code_counts = []
+        self.send_names = []
+        self.send_counts = {}
+
+    def enable(self):
+        self.enabled = True
+
+    @jit.dont_look_inside
+    def count_instr(self, bytecode, pc, prev_pc):
+        instr = ord(bytecode.code[pc])
+        self.opcode_counts[instr] += 1
+        # The first instruction of a frame has no predecessor.
+        if prev_pc != pc:
+            prev_instr = ord(bytecode.code[prev_pc])
+            self.pair_counts[prev_instr * len(self.opcode_counts) + instr] += 1
+        idx = self.code_indexes.get(bytecode, -1)
+        if idx == -1:
+            idx = self.code_indexes[bytecode] = len(self.codes)
+            self.codes.append(bytecode)
+            self.code_counts.append(0)
+        self.code_counts[idx] += 1
+
+    @jit.dont_look_inside
+    def count_send(self, name):
+        count = self.send_counts.get(name, 0)
+        if count == 0:
+            self.send_names.append(name)
+        self.send_counts[name] = count + 1
+
+    def instructions(self):
+        total = 0
+        for count in self.opcode_counts:
+            total += count
+        return total
+
+    def sends(self):
+        total = 0
+        for count in self.send_counts.itervalues():
+            total += count
+        return total
+
+    def _sorted(self, counts):
+        entries = []
+        for i in xrange(len(counts)):
+            if counts[i]:
+                entries.append((counts[i], i))
+        CountSorter(entries).sort()
+        return entries
+
+    def sorted_opcodes(self):
+        return self._sorted(self.opcode_counts)
+
+    def sorted_pairs(self):
+        return self._sorted(self.pair_counts)
+
+    def sorted_codes(self):
+        return self._sorted(self.code_counts)
+
+    def sorted_sends(self):
+        return self._sorted([self.send_counts[name] for name in self.send_names])
+
+    def _pair_names(self, idx):
+        n = len(self.opcode_counts)
+        return consts.BYTECODE_NAMES[idx / n], consts.BYTECODE_NAMES[idx % n]
+
+    def _code_line(self, bytecode):
+        if bytecode.lineno_table:
+            return bytecode.lineno_table[0]
+        return 0
+
+    def _percent(self, count, total):
+        if total == 0:
+            return "0.0%"
+        return "%s%%" % (count * 1000 / total / 10.0)
+
+    def report(self):
+        instructions = self.instructions()
+        sends = self.sends()
+        lines = ["dispatch stats: %d instructions, %d sends\n" % (instructions, sends)]
+        lines.append("\n%s %s  %s\n" % (rjust("count", 12), rjust("%", 6), "opcode"))
+        for count, idx in self.sorted_opcodes():
+            lines.append("%s %s  %s\n" % (
+                rjust(str(count), 12), rjust(self._percent(count, instructions), 6),
+                consts.BYTECODE_NAMES[idx]
+            ))
+        lines.append("\n%s %s  %s\n" % (rjust("count", 12), rjust("%", 6), "opcode pair"))
+        for count, idx in self.sorted_pairs()[:self.REPORT_LIMIT]:
+            first, second = self._pair_names(idx)
+            lines.append("%s %s  %s %s\n" % (
+                rjust(str(count), 12), rjust(self._percent(count, instructions), 6),
+                first, second
+            ))
+        lines.append("\n%s %s  %s\n" % (rjust("count", 12), rjust("%", 6), "code"))
+        for count, idx in self.sorted_codes()[:self.REPORT_LIMIT]:
+            bytecode = self.codes[idx]
+            lines.append("%s %s  %s (%s:%d)\n" % (
+                rjust(str(count), 12), rjust(self._percent(count, instructions), 6),
+                bytecode.name, bytecode.filepath, self._code_line(bytecode)
+            ))
+        lines.append("\n%s %s  %s\n" % (rjust("count", 12), rjust("%", 6), "send"))
+        for count, idx in self.sorted_sends()[:self.REPORT_LIMIT]:
+            lines.append("%s %s  %s\n" % (
+                rjust(str(count), 12), rjust(self._percent(count, sends), 6),
+                self.send_names[idx]
+            ))
+        return "".join(lines)
+
+    def report_json(self):
+        opcodes = []
+        for count, idx in self.sorted_opcodes():
+            opcodes.append('{"opcode": %s, "count": %d}' % (
+                json_str(consts.BYTECODE_NAMES[idx]), count
+            ))
+        pairs = []
+        for count, idx in self.sorted_pairs():
+            first, second = self._pair_names(idx)
+            pairs.append('{"first": %s, "second": %s, "count": %d}' % (
+                json_str(first), json_str(second), count
+            ))
+        codes = []
+        for count, idx in self.sorted_codes():
+            bytecode = self.codes[idx]
+            codes.append('{"name": %s, "file": %s, "line": %d, "count": %d}' % (
+                json_str(bytecode.name), json_str(bytecode.filepath),
+                self._code_line(bytecode), count
+            ))
+        sends = []
+        for count, idx in self.sorted_sends():
+            sends.append('{"name": %s, "count": %d}' % (json_str(self.send_names[idx]), count))
+        return (
+            '{"instructions": %d, "sends": %d,\n'
+            '"opcodes": [\n%s\n],\n"pairs": [\n%s\n],\n"code": [\n%s\n],\n"send_names": [\n%s\n]}\n'
+        ) % (
+            self.instructions(), self.sends(),
+            ",\n".join(opcodes), ",\n".join(pairs), ",\n".join(codes), ",\n".join(sends)
+        )
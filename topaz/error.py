@@ -4,6 +4,9 @@ import os
 class RubyError(Exception):
     def __init__(self, w_value):
         self.w_value = w_value
+        # Whether a TracePoint was told about this raise already, it's
+        # seen by every frame the error unwinds through.
+        self.raise_traced = False
 
     def __str__(self):
         return "<RubyError: %s>" % self.w_value
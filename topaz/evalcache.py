@@ -0,0 +1,41 @@
+from topaz.astcompiler import SymbolTable
+from topaz.utils.ordereddict import OrderedDict
+
+
+class EvalCache(object):
+    """
+    The code objects compiled for strings passed to eval, instance_eval and
+    class_eval, keyed by the source, file, first line and the names of the
+    local variables of the binding it runs in. It holds at most MAX_ENTRIES
+    code objects, evicting the least recently used one first.
+    """
+
+    MAX_ENTRIES = 256
+
+    def __init__(self, space):
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, space, source, filepath, initial_lineno, names):
+        key = (source, filepath, initial_lineno, "\0".join(names))
+        bc = self.entries.pop(key, None)
+        if bc is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            symtable = SymbolTable()
+            for name in names:
+                symtable.cells[name] = symtable.FREEVAR
+            bc = space.compile(source, filepath, initial_lineno=initial_lineno, symtable=symtable)
+            if len(self.entries) >= self.MAX_ENTRIES:
+                self.evict_oldest()
+        # Reinserting moves the entry to the end, the oldest are at the front.
+        self.entries[key] = bc
+        return bc
+
+    def evict_oldest(self):
+        # Only the first entry is looked at, not a list of all the keys.
+        for key, _ in self.entries.iteritems():
+            del self.entries[key]
+            return
@@ -1,5 +1,6 @@
 from rpython.rlib import jit
 
+from topaz.closure import ClosureCell
 from topaz.error import RubyError
 from topaz.frame import Frame
 from topaz.objects.fiberobject import W_FiberObject
@@ -83,7 +84,24 @@ class ExecutionContext(object):
                 back.escaped = True
             frame_vref()
         jit.virtual_ref_finish(frame_vref, frame)
-        self.regexp_match_cell = original_regexp_match_cell
+        # A builtin may have just created the match cell of the Ruby frame
+        # below it, which has to stay visible.
+        if isinstance(frame, Frame):
+            self.regexp_match_cell = original_regexp_match_cell
+
+    def get_regexp_match(self, space):
+        if self.regexp_match_cell is None:
+            return None
+        return self.regexp_match_cell.get(space, None, 0)
+
+    def set_regexp_match(self, space, w_match):
+        if self.regexp_match_cell is None:
+            frame = self.gettoprubyframe()
+            if frame is None:
+                self.regexp_match_cell = ClosureCell(None)
+            else:
+                self.regexp_match_cell = frame.get_regexp_match_cell()
+        self.regexp_match_cell.set(space, None, 0, w_match)
 
     def visit_frame(self, frame):
         return _VisitFrameContextManager(self, frame)
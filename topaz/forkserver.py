@@ -0,0 +1,208 @@
+from __future__ import absolute_import
+
+import errno
+import os
+import stat
+import time
+
+from rpython.rlib import rsocket
+from rpython.rlib.rmarshal import get_marshaller, get_unmarshaller
+from rpython.rlib.rstring import assert_str0
+
+from topaz.utils import ll_fdpass
+
+
+# (argv, environment, working directory)
+REQUEST_TYPE = ([str], {str: str}, str)
+HEADER_SIZE = 16
+# How long the server waits before accepting again after an error.
+ACCEPT_ERROR_DELAY = 1.0
+
+_dump_request = get_marshaller(REQUEST_TYPE)
+_load_request = get_unmarshaller(REQUEST_TYPE)
+
+
+def _str0(s):
+    if "\x00" in s:
+        raise ValueError("NUL byte in request")
+    return assert_str0(s)
+
+
+def _read_exactly(fd, size):
+    parts = []
+    while size > 0:
+        data = os.read(fd, size)
+        if not data:
+            raise OSError(errno.ECONNRESET, "connection closed")
+        parts.append(data)
+        size -= len(data)
+    return "".join(parts)
+
+
+def _write_all(fd, data):
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def send_request(fd, argv, env, cwd, fds):
+    """
+    Sends a script run to the server listening on the other end of fd, the
+    file descriptors in fds become the standard input, output and error of
+    the run.
+    """
+    # The marshaller generalizes the strings of the list it's given, which
+    # mustn't be the caller's NUL-free ones.
+    request_argv = []
+    for arg in argv:
+        request_argv.append(arg)
+    buf = []
+    _dump_request(buf, (request_argv, env, cwd))
+    data = "".join(buf)
+    header = str(len(data))
+    header = "0" * (HEADER_SIZE - len(header)) + header
+    sent = ll_fdpass.send_fds(fd, header, fds)
+    _write_all(fd, header[sent:] + data)
+
+
+def recv_request(fd):
+    """
+    Receives a script run sent with send_request, returns its argv,
+    environment, working directory and file descriptors.
+    """
+    header, fds = ll_fdpass.recv_fds(fd, HEADER_SIZE)
+    if not header:
+        raise OSError(errno.ECONNRESET, "connection closed")
+    header += _read_exactly(fd, HEADER_SIZE - len(header))
+    if not header.isdigit():
+        raise ValueError("bad request header")
+    data = _read_exactly(fd, int(header))
+    argv, env, cwd = _load_request(data)
+    env0 = {}
+    for key, value in env.iteritems():
+        env0[_str0(key)] = _str0(value)
+    return [_str0(arg) for arg in argv], env0, _str0(cwd), fds
+
+
+class ForkServer(object):
+    """
+    Serves script runs from an interpreter which is set up once. For every
+    connection it forks a child, which adopts the client's argv,
+    environment, working directory and standard streams, runs the script
+    with entry_point and reports its exit status back to the client.
+    """
+
+    def __init__(self, space, path):
+        self.space = space
+        self.path = path
+
+    def serve(self, entry_point):
+        sock = rsocket.RSocket(rsocket.AF_UNIX, rsocket.SOCK_STREAM)
+        try:
+            try:
+                st = os.lstat(self.path)
+            except OSError:
+                pass
+            else:
+                # Only the socket of an earlier server is replaced.
+                if not stat.S_ISSOCK(st.st_mode):
+                    raise OSError(errno.EEXIST, "not a socket")
+                os.unlink(self.path)
+            # Only the user running the server may connect to it.
+            old_umask = os.umask(0o077)
+            try:
+                sock.bind(rsocket.UNIXAddress(self.path))
+            finally:
+                os.umask(old_umask)
+            sock.listen(128)
+        except OSError as e:
+            os.write(2, "%s -- %s (topaz server)\n" % (os.strerror(e.errno), self.path))
+            return 1
+        except rsocket.SocketError as e:
+            os.write(2, "%s -- %s (topaz server)\n" % (e.get_msg(), self.path))
+            return 1
+        while True:
+            self.reap_children()
+            try:
+                fd, _ = sock.accept()
+            except rsocket.SocketError as e:
+                if isinstance(e, rsocket.SocketErrorWithErrno) and e.errno == errno.EINTR:
+                    continue
+                os.write(2, "%s -- %s (topaz server)\n" % (e.get_msg(), self.path))
+                time.sleep(ACCEPT_ERROR_DELAY)
+                continue
+            pid = os.fork()
+            if pid == 0:
+                sock.close()
+                os._exit(self.run_child(fd, entry_point))
+            os.close(fd)
+
+    def reap_children(self):
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except OSError:
+                return
+            if pid == 0:
+                return
+
+    def run_child(self, fd, entry_point):
+        try:
+            argv, env, cwd, fds = recv_request(fd)
+        except (OSError, ValueError):
+            return 1
+        for i, stdio_fd in enumerate(fds):
+            if stdio_fd != i:
+                os.dup2(stdio_fd, i)
+                os.close(stdio_fd)
+        for key in os.environ.keys():
+            if key not in env:
+                del os.environ[key]
+        for key, value in env.iteritems():
+            os.environ[key] = value
+        try:
+            os.chdir(cwd)
+        except OSError as e:
+            os.write(2, "%s -- %s\n" % (os.strerror(e.errno), cwd))
+            status = 1
+        else:
+            status = entry_point(self.space, argv)
+        try:
+            _write_all(fd, "%d\n" % status)
+        except OSError:
+            pass
+        return status
+
+
+def run_client(path, argv):
+    """
+    Runs argv on the fork server listening at path, with this process's
+    environment, working directory and standard streams, and returns the
+    exit status of the run.
+    """
+    sock = rsocket.RSocket(rsocket.AF_UNIX, rsocket.SOCK_STREAM)
+    try:
+        sock.connect(rsocket.UNIXAddress(path))
+    except rsocket.SocketError as e:
+        os.write(2, "%s -- %s (topaz server)\n" % (e.get_msg(), path))
+        return 1
+    fd = sock.fd
+    env = {}
+    for key, value in os.environ.items():
+        env[key] = value
+    try:
+        send_request(fd, argv, env, os.getcwd(), [0, 1, 2])
+        status = ""
+        while True:
+            data = os.read(fd, 32)
+            if not data:
+                break
+            status += data
+    except OSError as e:
+        os.write(2, "%s -- %s (topaz server)\n" % (os.strerror(e.errno), path))
+        return 1
+    finally:
+        sock.close()
+    status = status.strip()
+    if not status.isdigit():
+        return 1
+    return int(status)
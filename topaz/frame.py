@@ -1,7 +1,9 @@
 from rpython.rlib import jit
 
-from topaz.closure import LocalCell
+from topaz.closure import ClosureCell, IntCell
+from topaz.gateway import fixed_args_w
 from topaz.objects.arrayobject import W_ArrayObject
+from topaz.objects.intobject import W_FixnumObject
 
 
 class BaseFrame(object):
@@ -18,7 +20,6 @@ class Frame(BaseFrame):
         "cells[*]", "lastblock", "lexical_scope", "last_instr", "parent_interp",
     ]
 
-    @jit.unroll_safe
     def __init__(self, bytecode, w_self, lexical_scope, block, parent_interp,
                  regexp_match_cell):
         self = jit.hint(self, fresh_virtualizable=True, access_directly=True)
@@ -27,17 +28,51 @@ class Frame(BaseFrame):
         self.localsstack_w = [None] * (len(bytecode.cellvars) + bytecode.max_stackdepth)
         self.stackpos = len(bytecode.cellvars)
         self.last_instr = 0
-        self.cells = [LocalCell() for _ in bytecode.cellvars] + [None] * len(bytecode.freevars)
+        # Locals live in localsstack_w until a closure captures them, only
+        # then do they get a cell. Free variables are filled in by the caller.
+        self.cells = [None] * (len(bytecode.cellvars) + len(bytecode.freevars))
+        # Created the first time $~ is set, or a block is built.
         self.regexp_match_cell = regexp_match_cell
         self.w_self = w_self
         self.lexical_scope = lexical_scope
         self.block = block
         self.parent_interp = parent_interp
         self.lastblock = None
+        # The method running in this frame, None for other code.
+        self.w_function = None
 
     def _set_arg(self, space, pos, w_value):
         assert pos >= 0
-        self.cells[pos].set(space, self, pos, w_value)
+        self.store_deref(space, pos, w_value)
+
+    def load_deref(self, space, pos):
+        cell = self.cells[pos]
+        if cell is None:
+            return self.localsstack_w[pos]
+        return cell.get(space, self, pos)
+
+    def store_deref(self, space, pos, w_value):
+        cell = self.cells[pos]
+        if cell is None:
+            self.localsstack_w[pos] = w_value
+        else:
+            cell.set(space, self, pos, w_value)
+
+    def upgrade_to_closure(self, space, pos):
+        cell = self.cells[pos]
+        if cell is None:
+            w_obj = self.localsstack_w[pos]
+            if isinstance(w_obj, W_FixnumObject):
+                cell = IntCell(space.int_w(w_obj))
+            else:
+                cell = ClosureCell(w_obj)
+            self.cells[pos] = cell
+        return cell
+
+    def get_regexp_match_cell(self):
+        if self.regexp_match_cell is None:
+            self.regexp_match_cell = ClosureCell(None)
+        return self.regexp_match_cell
 
     def handle_block_args(self, space, bytecode, args_w, block):
         if (len(args_w) == 1 and
@@ -53,6 +88,41 @@ class Frame(BaseFrame):
                 del args_w[len(bytecode.arg_pos):]
         return self.handle_args(space, bytecode, args_w, block)
 
+    def handle_fixed_block_args(self, space, bytecode, num_args, w_arg0, w_arg1, w_arg2, block):
+        if not self._takes_fixed_args(bytecode, num_args):
+            args_w = fixed_args_w(num_args, w_arg0, w_arg1, w_arg2)
+            return self.handle_block_args(space, bytecode, args_w, block)
+        self._set_fixed_args(space, bytecode, num_args, w_arg0, w_arg1, w_arg2, block)
+
+    def handle_fixed_args(self, space, bytecode, num_args, w_arg0, w_arg1, w_arg2, block):
+        """
+        handle_args for at most MAX_FIXED_ARGS arguments. When they match the
+        parameters exactly they are stored straight into the locals, without
+        building an args_w list.
+        """
+        if not self._takes_fixed_args(bytecode, num_args):
+            args_w = fixed_args_w(num_args, w_arg0, w_arg1, w_arg2)
+            return self.handle_args(space, bytecode, args_w, block)
+        self._set_fixed_args(space, bytecode, num_args, w_arg0, w_arg1, w_arg2, block)
+
+    def _takes_fixed_args(self, bytecode, num_args):
+        return (len(bytecode.arg_pos) == num_args and len(bytecode.defaults) == 0 and
+                bytecode.splat_arg_pos == -1)
+
+    def _set_fixed_args(self, space, bytecode, num_args, w_arg0, w_arg1, w_arg2, block):
+        if num_args >= 1:
+            self._set_arg(space, bytecode.arg_pos[0], w_arg0)
+        if num_args >= 2:
+            self._set_arg(space, bytecode.arg_pos[1], w_arg1)
+        if num_args >= 3:
+            self._set_arg(space, bytecode.arg_pos[2], w_arg2)
+        if bytecode.block_arg_pos != -1:
+            if block is None:
+                w_block = space.w_nil
+            else:
+                w_block = space.newproc(block)
+            self._set_arg(space, bytecode.block_arg_pos, w_block)
+
     @jit.unroll_safe
     def handle_args(self, space, bytecode, args_w, block):
         from topaz.interpreter import Interpreter
@@ -106,6 +176,16 @@ class Frame(BaseFrame):
             items_w[i] = self.pop()
         return items_w
 
+    def popfixedargs(self, num_args):
+        w_arg0 = w_arg1 = w_arg2 = None
+        if num_args >= 3:
+            w_arg2 = self.pop()
+        if num_args >= 2:
+            w_arg1 = self.pop()
+        if num_args >= 1:
+            w_arg0 = self.pop()
+        return w_arg0, w_arg1, w_arg2
+
     def peek(self):
         stackpos = jit.promote(self.stackpos) - 1
         assert stackpos >= 0
@@ -140,7 +220,24 @@ class Frame(BaseFrame):
             instr = self.last_instr
         else:
             instr = prev_frame.back_last_instr - 1
-        return self.bytecode.lineno_table[instr]
+        return self.lineno_at(instr)
+
+    @jit.unroll_safe
+    def lineno_at(self, instr):
+        """
+        The line of instr, or of the closest instruction before or after it
+        which has one: a frame that hasn't run an instruction yet, or one
+        stopped at an instruction without a line, still reports a line.
+        """
+        lineno_table = self.bytecode.lineno_table
+        instr = max(instr, 0)
+        for i in xrange(instr, -1, -1):
+            if lineno_table[i] >= 0:
+                return lineno_table[i]
+        for i in xrange(instr + 1, len(lineno_table)):
+            if lineno_table[i] >= 0:
+                return lineno_table[i]
+        return 0
 
     def get_code_name(self):
         return self.bytecode.name
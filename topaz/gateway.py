@@ -5,6 +5,22 @@ from rpython.rlib.unroll import unrolling_iterable
 from topaz.coerce import Coerce
 
 
+# The largest number of arguments builtins can be called with without putting
+# them in a list, see W_FunctionObject.call_fixed.
+MAX_FIXED_ARGS = 3
+
+
+def fixed_args_w(num_args, w_arg0, w_arg1, w_arg2):
+    if num_args == 0:
+        return []
+    elif num_args == 1:
+        return [w_arg0]
+    elif num_args == 2:
+        return [w_arg0, w_arg1]
+    else:
+        return [w_arg0, w_arg1, w_arg2]
+
+
 class WrapperGenerator(object):
     def __init__(self, name, func, argspec, self_cls):
         self.name = name
@@ -12,32 +28,37 @@ class WrapperGenerator(object):
         self.argspec = argspec
         self.self_cls = self_cls
 
-    def generate_wrapper(self):
-        if hasattr(self.func, "__wraps__"):
-            wrapped_func = self.func.__wraps__
+        if hasattr(func, "__wraps__"):
+            wrapped_func = func.__wraps__
         else:
-            wrapped_func = self.func
-
+            wrapped_func = func
         code = wrapped_func.__code__
         if wrapped_func.__defaults__ is not None:
-            defaults = wrapped_func.__defaults__
-            default_start = code.co_argcount - len(defaults)
+            self.defaults = wrapped_func.__defaults__
+            self.default_start = code.co_argcount - len(self.defaults)
         else:
-            defaults = []
-            default_start = None
+            self.defaults = []
+            self.default_start = None
+
+        self.argnames = code.co_varnames[:code.co_argcount]
+        self.argcount = 0
+        for arg in self.argnames:
+            self.argcount += arg.startswith("w_") or arg in argspec
+        self.min_args = self.argcount
+        for arg, default in zip(reversed(self.argnames), reversed(self.defaults)):
+            self.min_args -= arg.startswith("w_") or arg in argspec
+        self.takes_args_w = "args_w" in self.argnames
+
+    def generate_wrapper(self):
+        defaults = self.defaults
+        default_start = self.default_start
         argspec = self.argspec
         self_cls = self.self_cls
         func = self.func
-
-        argnames = code.co_varnames[:code.co_argcount]
-        argcount = 0
-        for arg in argnames:
-            argcount += arg.startswith("w_") or arg in argspec
-        min_args = argcount
-        for arg, default in zip(reversed(argnames), reversed(defaults)):
-            min_args -= arg.startswith("w_") or arg in argspec
-        unrolling_argnames = unrolling_iterable(enumerate(argnames))
-        takes_args_w = "args_w" in argnames
+        argcount = self.argcount
+        min_args = self.min_args
+        unrolling_argnames = unrolling_iterable(enumerate(self.argnames))
+        takes_args_w = self.takes_args_w
 
         @functools.wraps(self.func)
         def wrapper(self, space, args_w, block):
@@ -82,3 +103,70 @@ class WrapperGenerator(object):
                 w_res = space.w_nil
             return w_res
         return wrapper
+
+    def generate_fixed_wrappers(self):
+        """
+        Returns a list of wrappers taking their arguments as w_arg0, w_arg1
+        and w_arg2, one for each number of arguments up to MAX_FIXED_ARGS. It
+        holds None for the numbers of arguments the function can't be called
+        with, and for functions taking args_w, those calls go through the
+        generic wrapper.
+        """
+        fixed_wrappers = [None] * (MAX_FIXED_ARGS + 1)
+        if self.takes_args_w:
+            return fixed_wrappers
+        for num_args in xrange(self.min_args, min(self.argcount, MAX_FIXED_ARGS) + 1):
+            fixed_wrappers[num_args] = self.generate_fixed_wrapper(num_args)
+        return fixed_wrappers
+
+    def generate_fixed_wrapper(self, num_args):
+        defaults = self.defaults
+        default_start = self.default_start
+        argspec = self.argspec
+        self_cls = self.self_cls
+        func = self.func
+
+        # Which of w_arg0, w_arg1 and w_arg2 each argument comes from, this
+        # has to be known ahead of time for the unrolled loop.
+        arg_indices = []
+        arg_count = 0
+        for argname in self.argnames:
+            arg_indices.append(arg_count)
+            if argname.startswith("w_") or argname in argspec:
+                arg_count += 1
+        unrolling_argnames = unrolling_iterable(zip(range(len(self.argnames)), self.argnames, arg_indices))
+
+        @functools.wraps(self.func)
+        def fixed_wrapper(self, space, w_arg0, w_arg1, w_arg2, block):
+            args = ()
+            for i, argname, arg_idx in unrolling_argnames:
+                if argname == "self":
+                    assert isinstance(self, self_cls)
+                    args += (self,)
+                elif argname == "block":
+                    args += (block,)
+                elif argname == "space":
+                    args += (space,)
+                elif argname.startswith("w_") or argname in argspec:
+                    if arg_idx < num_args:
+                        if arg_idx == 0:
+                            w_arg = w_arg0
+                        elif arg_idx == 1:
+                            w_arg = w_arg1
+                        else:
+                            w_arg = w_arg2
+                        if argname.startswith("w_"):
+                            args += (w_arg,)
+                        else:
+                            args += (getattr(Coerce, argspec[argname])(space, w_arg),)
+                    elif default_start is not None and i >= default_start:
+                        args += (defaults[i - default_start],)
+                    else:
+                        raise SystemError("bad arg count")
+                else:
+                    raise SystemError("%r not implemented" % argname)
+            w_res = func(*args)
+            if w_res is None:
+                w_res = space.w_nil
+            return w_res
+        return fixed_wrapper
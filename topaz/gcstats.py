@@ -0,0 +1,84 @@
+import time
+
+from rpython.memory.gc import env
+from rpython.rlib import jit, rgc
+
+from topaz.utils.reporting import format_ms, ljust, rjust
+
+
+# The environment variables incminimark reads its tuning parameters from
+# when it starts up.
+GC_NURSERY_ENV = "PYPY_GC_NURSERY"
+GC_MAJOR_COLLECT_ENV = "PYPY_GC_MAJOR_COLLECT"
+GC_MAX_ENV = "PYPY_GC_MAX"
+GC_LOG_ENV = "PYPYLOG"
+
+
+class GCRecord(object):
+    def __init__(self, invoke_time, seconds, major):
+        self.invoke_time = invoke_time
+        self.seconds = seconds
+        self.major = major
+
+
+class GCStats(object):
+    """
+    Times the collections the interpreter asks for (GC.start,
+    ObjectSpace.garbage_collect), and records each of them while GC::Profiler
+    is enabled. The collections incminimark starts by itself aren't reported
+    to RPython code, so there are no counts of collections or of their time
+    to give, --gc-log has the GC log them with their durations. Nor can they
+    be suspended, GC.disable only stops the requested ones.
+    """
+
+    def __init__(self, space):
+        self.start_time = 0.0
+        self.disabled = False
+        self.profiler_enabled = False
+        self.records = []
+        self.max_heap_size = 0
+
+    def setup(self):
+        # Built while translating, so what depends on the process running
+        # is only read once it starts.
+        self.start_time = time.time()
+        self.max_heap_size = env.read_from_env(GC_MAX_ENV)
+
+    @jit.dont_look_inside
+    def collect(self, full):
+        if self.disabled:
+            return
+        invoke_time = time.time()
+        if full:
+            rgc.collect()
+        else:
+            rgc.collect(0)
+        if self.profiler_enabled:
+            seconds = time.time() - invoke_time
+            self.records.append(GCRecord(invoke_time - self.start_time, seconds, full))
+
+    def set_max_heap_size(self, nbytes):
+        rgc.set_max_heap_size(nbytes)
+        self.max_heap_size = nbytes
+
+    def profiler_total_time(self):
+        total = 0.0
+        for record in self.records:
+            total += record.seconds
+        return total
+
+    def profiler_result(self):
+        if not self.records:
+            return ""
+        lines = [
+            "GC %d invokes.\n" % len(self.records),
+            "Index    Invoke Time(sec)  Type         GC Time(ms)\n",
+        ]
+        for i, record in enumerate(self.records):
+            lines.append("%s %s  %s %s\n" % (
+                rjust(str(i + 1), 5),
+                rjust(str(int(record.invoke_time * 1000) / 1000.0), 19),
+                ljust("major" if record.major else "minor", 5),
+                rjust(format_ms(record.seconds), 19)
+            ))
+        return "".join(lines)
@@ -0,0 +1,164 @@
+import os
+
+from rpython.rlib import rgc
+from rpython.rlib.objectmodel import compute_unique_id, we_are_translated
+from rpython.rlib.rstring import StringBuilder
+
+from topaz.allocationtracer import object_type
+from topaz.mapdict import AttributeNode, StorageNode
+from topaz.objects.objectobject import W_BaseObject, W_Object
+from topaz.objects.stringobject import W_StringObject
+from topaz.objects.symbolobject import W_SymbolObject
+from topaz.utils.reporting import json_str
+
+
+STRING_PREVIEW = 64
+
+
+def try_cast_gcref_to_w_baseobject(gcref):
+    return rgc.try_cast_gcref_to_instance(W_BaseObject, gcref)
+
+
+def address(w_obj):
+    return "0x%x" % compute_unique_id(w_obj)
+
+
+def gcref_id(gcref):
+    if we_are_translated():
+        return compute_unique_id(gcref)
+    # Before translation a _GcRef hashes like the object it wraps.
+    return hash(gcref)
+
+
+class HeapOutput(object):
+    def write(self, line):
+        raise NotImplementedError
+
+
+class StringOutput(HeapOutput):
+    def __init__(self):
+        self.builder = StringBuilder()
+
+    def write(self, line):
+        self.builder.append(line)
+
+    def build(self):
+        return self.builder.build()
+
+
+class FdOutput(HeapOutput):
+    def __init__(self, fd):
+        self.fd = fd
+
+    def write(self, line):
+        while line:
+            line = line[os.write(self.fd, line):]
+
+
+class HeapDumper(object):
+    """
+    Walks the heap from the GC's roots and describes each Ruby object on a
+    line of JSON: its address, class, type, approximate size, the addresses
+    of the Ruby objects it references, a preview of strings and symbols and
+    the names of its instance variables. The RPython objects between two
+    Ruby objects (lists, dicts, storage, maps) are followed through for
+    every Ruby object reaching them, their size is only counted in the
+    first one. Each line goes to the output as soon as its object is
+    reached, which mustn't run any Ruby code.
+    """
+
+    def __init__(self, space):
+        self.space = space
+        self.marked = []
+
+    def _mark(self, gcref):
+        rgc.toggle_gcflag_extra(gcref)
+        self.marked.append(gcref)
+
+    def _clear(self):
+        for gcref in self.marked:
+            if rgc.get_gcflag_extra(gcref):
+                rgc.toggle_gcflag_extra(gcref)
+        self.marked = []
+
+    def dump(self, output):
+        pending = [gcref for gcref in rgc.get_rpy_roots() if gcref]
+        try:
+            while pending:
+                gcref = pending.pop()
+                if rgc.get_gcflag_extra(gcref):
+                    continue
+                self._mark(gcref)
+                w_obj = try_cast_gcref_to_w_baseobject(gcref)
+                if w_obj is None:
+                    pending.extend(rgc.get_rpy_referents(gcref))
+                else:
+                    output.write(self.dump_object(w_obj, gcref, pending))
+        finally:
+            self._clear()
+
+    def dump_object(self, w_obj, gcref, pending):
+        space = self.space
+        size = rgc.get_rpy_memory_usage(gcref)
+        references = []
+        seen = {}
+        # The GC flag tells which objects were already counted in some
+        # object's size, the objects walked for this one are kept apart.
+        visited = {}
+        stack = rgc.get_rpy_referents(gcref)
+        while stack:
+            ref = stack.pop()
+            if not ref:
+                continue
+            w_ref = try_cast_gcref_to_w_baseobject(ref)
+            if w_ref is not None:
+                ref_address = address(w_ref)
+                if w_ref is not w_obj and ref_address not in seen:
+                    seen[ref_address] = None
+                    references.append(json_str(ref_address))
+                if not rgc.get_gcflag_extra(ref):
+                    pending.append(ref)
+                continue
+            key = gcref_id(ref)
+            if key in visited:
+                continue
+            visited[key] = None
+            if not rgc.get_gcflag_extra(ref):
+                self._mark(ref)
+                size += rgc.get_rpy_memory_usage(ref)
+            stack.extend(rgc.get_rpy_referents(ref))
+
+        w_cls = space.getclass(w_obj)
+        fields = [
+            '"address": %s' % json_str(address(w_obj)),
+            '"class": %s' % json_str(self.class_name(w_cls)),
+            '"type": %s' % json_str(object_type(w_obj)),
+            '"size": %d' % size,
+            '"references": [%s]' % ", ".join(references),
+        ]
+        if isinstance(w_obj, W_StringObject):
+            value = space.str_w(w_obj)
+            fields.append('"length": %d' % len(value))
+            fields.append('"value": %s' % json_str(value[:STRING_PREVIEW]))
+        elif isinstance(w_obj, W_SymbolObject):
+            fields.append('"value": %s' % json_str(space.symbol_w(w_obj)))
+        if isinstance(w_obj, W_Object):
+            names = self.ivar_names(w_obj)
+            if names:
+                fields.append('"ivars": [%s]' % ", ".join([json_str(name) for name in names]))
+        return "{%s}\n" % ", ".join(fields)
+
+    def class_name(self, w_cls):
+        if w_cls.name is not None:
+            return w_cls.name
+        return "#<Class:%s>" % address(w_cls)
+
+    def ivar_names(self, w_obj):
+        names = []
+        node = w_obj.map
+        while isinstance(node, StorageNode):
+            if isinstance(node, AttributeNode):
+                names.append(node.name)
+            node = node.prev
+        names.reverse()
+        return names
@@ -1,19 +1,29 @@
+import operator
+
 from rpython.rlib import jit, rstackovf
 from rpython.rlib.debug import check_nonneg
 from rpython.rlib.objectmodel import we_are_translated, specialize
+from rpython.rlib.rarithmetic import ovfcheck
 
 from topaz import consts
+from topaz.callsite import OperatorState
+from topaz.dispatchstats import DispatchStats
 from topaz.error import RubyError
 from topaz.objects.arrayobject import W_ArrayObject
 from topaz.objects.blockobject import W_BlockObject
 from topaz.objects.classobject import W_ClassObject
 from topaz.objects.codeobject import W_CodeObject
+from topaz.objects.floatobject import W_FloatObject
+from topaz.gateway import MAX_FIXED_ARGS
 from topaz.objects.functionobject import W_FunctionObject
+from topaz.objects.intobject import W_FixnumObject
 from topaz.objects.moduleobject import W_ModuleObject
 from topaz.objects.objectobject import W_Root
 from topaz.objects.procobject import W_ProcObject
 from topaz.objects.stringobject import W_StringObject
+from topaz.profiler import SamplingProfiler
 from topaz.scope import StaticScope
+from topaz.tracepoint import EVENT_CLASS, EVENT_END, EVENT_LINE, EVENT_RAISE, TracePointState
 from topaz.utils.regexp import RegexpError
 
 
@@ -38,6 +48,9 @@ class Interpreter(object):
 
     def interpret(self, space, frame, bytecode):
         pc = 0
+        profiler = space.fromcache(SamplingProfiler)
+        if profiler.enabled:
+            profiler.tick(space)
         try:
             while True:
                 self.jitdriver.jit_merge_point(
@@ -60,9 +73,19 @@ class Interpreter(object):
     def _interpret(self, space, pc, frame, bytecode):
         prev_instr = frame.last_instr
         frame.last_instr = pc
+        stats = space.fromcache(DispatchStats)
+        if stats.enabled:
+            stats.count_instr(bytecode, pc, prev_instr)
         if (space.getexecutioncontext().hastraceproc() and
             bytecode.lineno_table[pc] != bytecode.lineno_table[prev_instr]):
             space.getexecutioncontext().invoke_trace_proc(space, "line", None, None, frame=frame)
+        tracepoints = space.fromcache(TracePointState)
+        if (tracepoints.events & EVENT_LINE and bytecode.lineno_table[pc] >= 0 and
+            (pc == 0 or bytecode.lineno_table[pc] != bytecode.lineno_table[prev_instr])):
+            tracepoints.fire(space, EVENT_LINE, frame, frame.w_self)
+        coverage = bytecode.coverage
+        if coverage is not None:
+            coverage.hit(pc)
         try:
             pc = self.handle_bytecode(space, pc, frame, bytecode)
         except RubyError as e:
@@ -109,6 +132,12 @@ class Interpreter(object):
             pc += 2
         if num_args >= 3:
             raise NotImplementedError
+        # name is a constant here, so this is folded away for everything
+        # but the sends.
+        if name.startswith("SEND"):
+            stats = space.fromcache(DispatchStats)
+            if stats.enabled:
+                stats.count_send(space.symbol_w(bytecode.consts_w[args[0]]))
 
         method = getattr(self, name)
         try:
@@ -123,6 +152,10 @@ class Interpreter(object):
         return pc
 
     def handle_ruby_error(self, space, pc, frame, bytecode, e):
+        tracepoints = space.fromcache(TracePointState)
+        if tracepoints.events & EVENT_RAISE and not e.raise_traced:
+            e.raise_traced = True
+            tracepoints.fire(space, EVENT_RAISE, frame, frame.w_self, frame.w_function, e.w_value)
         block = frame.unrollstack(ApplicationException.kind)
         if block is None:
             raise e
@@ -152,6 +185,9 @@ class Interpreter(object):
 
     def jump(self, space, bytecode, frame, cur_pc, target_pc):
         if target_pc < cur_pc:
+            profiler = space.fromcache(SamplingProfiler)
+            if profiler.enabled:
+                profiler.tick(space)
             self.jitdriver.can_enter_jit(
                 self=self, bytecode=bytecode, frame=frame, pc=target_pc,
                 block_bytecode=self.get_block_bytecode(frame.block),
@@ -180,20 +216,20 @@ class Interpreter(object):
         frame.push(bytecode.consts_w[idx])
 
     def LOAD_DEREF(self, space, bytecode, frame, pc, idx):
-        frame.push(frame.cells[idx].get(space, frame, idx) or space.w_nil)
+        frame.push(frame.load_deref(space, idx) or space.w_nil)
 
     def STORE_DEREF(self, space, bytecode, frame, pc, idx):
-        frame.cells[idx].set(space, frame, idx, frame.peek())
+        frame.store_deref(space, idx, frame.peek())
 
     def LOAD_CLOSURE(self, space, bytecode, frame, pc, idx):
-        frame.push(frame.cells[idx].upgrade_to_closure(space, frame, idx))
+        frame.push(frame.upgrade_to_closure(space, idx))
 
     def LOAD_CONSTANT(self, space, bytecode, frame, pc, idx):
         space.getexecutioncontext().last_instr = pc
         w_scope = frame.pop()
         w_name = bytecode.consts_w[idx]
         name = space.symbol_w(w_name)
-        w_obj = space.find_const(w_scope, name)
+        w_obj = space.find_const_from_site(bytecode, pc, w_scope, name)
         frame.push(w_obj)
 
     def STORE_CONSTANT(self, space, bytecode, frame, pc, idx):
@@ -219,7 +255,7 @@ class Interpreter(object):
         frame.pop()
         w_name = bytecode.consts_w[idx]
         name = space.symbol_w(w_name)
-        frame.push(space.find_lexical_const(jit.promote(frame.lexical_scope), name))
+        frame.push(space.find_lexical_const_from_site(bytecode, pc, jit.promote(frame.lexical_scope), name))
 
     @jit.unroll_safe
     def DEFINED_LOCAL_CONSTANT(self, space, bytecode, frame, pc, idx):
@@ -351,9 +387,13 @@ class Interpreter(object):
         cells = [frame.pop() for _ in range(n_cells)]
         w_code = frame.pop()
         assert isinstance(w_code, W_CodeObject)
+        regexp_match_cell = frame.get_regexp_match_cell()
+        # The block shares $~ with this frame, whose cell may have only just
+        # been created.
+        space.getexecutioncontext().regexp_match_cell = regexp_match_cell
         block = W_BlockObject(
             w_code, frame.w_self, frame.lexical_scope, cells, frame.block,
-            self, frame.regexp_match_cell
+            self, regexp_match_cell
         )
         frame.push(block)
 
@@ -505,8 +545,13 @@ class Interpreter(object):
         event = "class" if space.is_kind_of(w_mod, space.w_class) else "module"
         space.getexecutioncontext().invoke_trace_proc(space, event, None, None, frame=frame)
         sub_frame = space.create_frame(w_bytecode, w_mod, StaticScope(w_mod, frame.lexical_scope), block=frame.block)
+        tracepoints = space.fromcache(TracePointState)
         with space.getexecutioncontext().visit_frame(sub_frame):
+            if tracepoints.events & EVENT_CLASS:
+                tracepoints.fire(space, EVENT_CLASS, sub_frame, w_mod)
             w_res = space.execute_frame(sub_frame, w_bytecode)
+            if tracepoints.events & EVENT_END:
+                tracepoints.fire(space, EVENT_END, sub_frame, w_mod)
 
         space.getexecutioncontext().invoke_trace_proc(space, "end", None, None, frame=frame)
         frame.push(w_res)
@@ -517,23 +562,37 @@ class Interpreter(object):
 
     def SEND(self, space, bytecode, frame, pc, meth_idx, num_args):
         space.getexecutioncontext().last_instr = pc
-        args_w = frame.popitemsreverse(num_args)
-        w_receiver = frame.pop()
-        w_res = space.send(w_receiver, bytecode.consts_w[meth_idx], args_w)
+        if num_args <= MAX_FIXED_ARGS:
+            w_res = self._send_fixed(space, bytecode, frame, pc, meth_idx, num_args, None)
+        else:
+            args_w = frame.popitemsreverse(num_args)
+            w_receiver = frame.pop()
+            w_res = space.send_from_site(bytecode, pc, w_receiver, bytecode.consts_w[meth_idx], args_w)
         frame.push(w_res)
 
     def SEND_BLOCK(self, space, bytecode, frame, pc, meth_idx, num_args):
         space.getexecutioncontext().last_instr = pc
         w_block = frame.pop()
-        args_w = frame.popitemsreverse(num_args - 1)
-        w_receiver = frame.pop()
         if w_block is space.w_nil:
             w_block = None
         else:
             assert isinstance(w_block, W_BlockObject)
-        w_res = space.send(w_receiver, bytecode.consts_w[meth_idx], args_w, block=w_block)
+        if num_args - 1 <= MAX_FIXED_ARGS:
+            w_res = self._send_fixed(space, bytecode, frame, pc, meth_idx, num_args - 1, w_block)
+        else:
+            args_w = frame.popitemsreverse(num_args - 1)
+            w_receiver = frame.pop()
+            w_res = space.send_from_site(bytecode, pc, w_receiver, bytecode.consts_w[meth_idx], args_w, block=w_block)
         frame.push(w_res)
 
+    def _send_fixed(self, space, bytecode, frame, pc, meth_idx, num_args, block):
+        w_arg0, w_arg1, w_arg2 = frame.popfixedargs(num_args)
+        w_receiver = frame.pop()
+        return space.send_fixed_from_site(
+            bytecode, pc, w_receiver, bytecode.consts_w[meth_idx], num_args,
+            w_arg0, w_arg1, w_arg2, block
+        )
+
     @jit.unroll_safe
     def SEND_SPLAT(self, space, bytecode, frame, pc, meth_idx, num_args):
         space.getexecutioncontext().last_instr = pc
@@ -548,7 +607,7 @@ class Interpreter(object):
             args_w[pos:pos + len(array_w)] = array_w
             pos += len(array_w)
         w_receiver = frame.pop()
-        w_res = space.send(w_receiver, bytecode.consts_w[meth_idx], args_w)
+        w_res = space.send_from_site(bytecode, pc, w_receiver, bytecode.consts_w[meth_idx], args_w)
         frame.push(w_res)
 
     @jit.unroll_safe
@@ -564,17 +623,73 @@ class Interpreter(object):
             w_block = None
         else:
             assert isinstance(w_block, W_BlockObject)
-        w_res = space.send(w_receiver, bytecode.consts_w[meth_idx], args_w, block=w_block)
+        w_res = space.send_from_site(bytecode, pc, w_receiver, bytecode.consts_w[meth_idx], args_w, block=w_block)
         frame.push(w_res)
 
     def DEFINED_METHOD(self, space, bytecode, frame, pc, meth_idx):
         space.getexecutioncontext().last_instr = pc
         w_obj = frame.pop()
-        if space.respond_to(w_obj, bytecode.consts_w[meth_idx]):
+        if space.respond_to_from_site(bytecode, pc, w_obj, bytecode.consts_w[meth_idx]):
             frame.push(space.newstr_fromstr("method"))
         else:
             frame.push(space.w_nil)
 
+    def new_arith_op(name, func):
+        def op(self, space, bytecode, frame, pc, meth_idx):
+            space.getexecutioncontext().last_instr = pc
+            w_other = frame.pop()
+            w_receiver = frame.pop()
+            state = space.fromcache(OperatorState)
+            if (isinstance(w_receiver, W_FixnumObject) and
+                isinstance(w_other, W_FixnumObject) and
+                not state.fixnum_redefined):
+                try:
+                    value = ovfcheck(func(w_receiver.intvalue, w_other.intvalue))
+                except OverflowError:
+                    pass
+                else:
+                    frame.push(space.newint(value))
+                    return
+            elif (isinstance(w_receiver, W_FloatObject) and
+                  isinstance(w_other, W_FloatObject) and
+                  not state.float_redefined and
+                  space.getclass(w_receiver) is space.w_float):
+                frame.push(space.newfloat(func(w_receiver.floatvalue, w_other.floatvalue)))
+                return
+            w_res = space.send_from_site(bytecode, pc, w_receiver, bytecode.consts_w[meth_idx], [w_other])
+            frame.push(w_res)
+        op.__name__ = name
+        return op
+    SEND_ADD = new_arith_op("SEND_ADD", operator.add)
+    SEND_SUB = new_arith_op("SEND_SUB", operator.sub)
+    SEND_MUL = new_arith_op("SEND_MUL", operator.mul)
+
+    def new_compare_op(name, func):
+        def op(self, space, bytecode, frame, pc, meth_idx):
+            space.getexecutioncontext().last_instr = pc
+            w_other = frame.pop()
+            w_receiver = frame.pop()
+            state = space.fromcache(OperatorState)
+            if (isinstance(w_receiver, W_FixnumObject) and
+                isinstance(w_other, W_FixnumObject) and
+                not state.fixnum_redefined):
+                frame.push(space.newbool(func(w_receiver.intvalue, w_other.intvalue)))
+            elif (isinstance(w_receiver, W_FloatObject) and
+                  isinstance(w_other, W_FloatObject) and
+                  not state.float_redefined and
+                  space.getclass(w_receiver) is space.w_float):
+                frame.push(space.newbool(func(w_receiver.floatvalue, w_other.floatvalue)))
+            else:
+                w_res = space.send_from_site(bytecode, pc, w_receiver, bytecode.consts_w[meth_idx], [w_other])
+                frame.push(w_res)
+        op.__name__ = name
+        return op
+    SEND_LT = new_compare_op("SEND_LT", operator.lt)
+    SEND_LE = new_compare_op("SEND_LE", operator.le)
+    SEND_GT = new_compare_op("SEND_GT", operator.gt)
+    SEND_GE = new_compare_op("SEND_GE", operator.ge)
+    SEND_EQ = new_compare_op("SEND_EQ", operator.eq)
+
     def SEND_SUPER_BLOCK(self, space, bytecode, frame, pc, meth_idx, num_args):
         space.getexecutioncontext().last_instr = pc
         w_block = frame.pop()
@@ -584,7 +699,7 @@ class Interpreter(object):
             w_block = None
         else:
             assert isinstance(w_block, W_BlockObject)
-        w_res = space.send_super(frame.lexical_scope.w_mod, w_receiver, bytecode.consts_w[meth_idx], args_w, block=w_block)
+        w_res = space.send_super_from_site(bytecode, pc, frame.lexical_scope.w_mod, w_receiver, bytecode.consts_w[meth_idx], args_w, block=w_block)
         frame.push(w_res)
 
     @jit.unroll_safe
@@ -600,7 +715,7 @@ class Interpreter(object):
             w_block = None
         else:
             assert isinstance(w_block, W_BlockObject)
-        w_res = space.send_super(frame.lexical_scope.w_mod, w_receiver, bytecode.consts_w[meth_idx], args_w, block=w_block)
+        w_res = space.send_super_from_site(bytecode, pc, frame.lexical_scope.w_mod, w_receiver, bytecode.consts_w[meth_idx], args_w, block=w_block)
         frame.push(w_res)
 
     def DEFINED_SUPER(self, space, bytecode, frame, pc, meth_idx):
@@ -651,6 +766,12 @@ class Interpreter(object):
         else:
             return self.jump(space, bytecode, frame, pc, target_pc)
 
+    def CASE_DISPATCH(self, space, bytecode, frame, pc, table_idx):
+        target_pc = bytecode.case_tables[table_idx].find_target(space, frame.peek())
+        if target_pc == -1:
+            return pc
+        return self.jump(space, bytecode, frame, pc, target_pc)
+
     def DISCARD_TOP(self, space, bytecode, frame, pc):
         frame.pop()
 
@@ -700,10 +821,14 @@ class Interpreter(object):
         if frame.block is None:
             raise space.error(space.w_LocalJumpError, "no block given (yield)")
         space.getexecutioncontext().last_instr = pc
-        args_w = [None] * n_args
-        for i in xrange(n_args - 1, -1, -1):
-            args_w[i] = frame.pop()
-        w_res = space.invoke_block(frame.block, args_w)
+        if n_args <= MAX_FIXED_ARGS:
+            w_arg0, w_arg1, w_arg2 = frame.popfixedargs(n_args)
+            w_res = space.invoke_block_fixed(frame.block, n_args, w_arg0, w_arg1, w_arg2)
+        else:
+            args_w = [None] * n_args
+            for i in xrange(n_args - 1, -1, -1):
+                args_w[i] = frame.pop()
+            w_res = space.invoke_block(frame.block, args_w)
         frame.push(w_res)
 
     @jit.unroll_safe
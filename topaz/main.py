@@ -3,12 +3,18 @@ from __future__ import absolute_import
 import os
 import subprocess
 
-from rpython.rlib.objectmodel import specialize
+from rpython.rlib.objectmodel import we_are_translated
 from rpython.rlib.streamio import open_file_as_stream, fdopen_as_stream
 
+from topaz.bytecodecache import BytecodeCache
+from topaz.dispatchstats import DispatchStats
 from topaz.error import RubyError, print_traceback
+from topaz.forkserver import ForkServer, run_client
+from topaz.gcstats import GC_LOG_ENV, GC_MAJOR_COLLECT_ENV, GC_MAX_ENV, GC_NURSERY_ENV
 from topaz.objects.exceptionobject import W_SystemExit
 from topaz.objspace import ObjectSpace
+from topaz.profiler import SamplingProfiler
+from topaz.startupprofile import StartupProfile
 from topaz.system import IS_WINDOWS, IS_64BIT
 
 
@@ -36,7 +42,24 @@ USAGE = "\n".join([
     """  -W[level=2]     set warning level; 0=silence, 1=medium, 2=verbose""",
 #   """  -x[directory]   strip off text before #!ruby line and perhaps cd to directory""",
     """  --copyright     print the copyright""",
+    """  --dispatch-stats[=file]""",
+    """                  count the executed opcodes and sends, report them on exit (as JSON to file)""",
+    """  --dump-bytecode print the compiled bytecode, then exit""",
+    """  --gc-nursery=size, --gc-major-collect=ratio, --gc-max-heap=size""",
+    """                  tune the GC (size in bytes, or with a KB, MB or GB suffix)""",
+    """  --gc-log=file   log every collection and its duration to file""",
+    """  --no-optimize   disable the bytecode optimizer""",
+    """  --profile[=file] sample the program, report where it spent its time on exit""",
+    """                  (as collapsed stacks for flamegraph.pl to file)""",
+    """  --startup-profile[=file]""",
+    """                  time the phases of the startup, report them on exit (as JSON to file)""",
     """  --version       print the version""",
+    "",
+    """Usage: topaz --server socket [--preload files] (not on Windows)""",
+    """       topaz --client socket [switches] [--] [programfile] [arguments]""",
+    """  --server socket serve script runs from this preloaded interpreter""",
+    """  --preload files require these files in the server, before serving""",
+    """  --client socket run the script on the server listening at socket""",
     ""
 ])
 COPYRIGHT = "topaz - Copyright (c) Alex Gaynor and individual contributors\n"
@@ -48,25 +71,135 @@ RUBY_REVISION = subprocess.check_output([
 
 
 
-@specialize.memo()
-def getspace(config):
-    return ObjectSpace(config)
-
-
 def get_topaz_config_options():
     return {
         "translation.continuation": True,
     }
 
 
-def create_entry_point(config):
+def create_entry_point(config, prebuild_kernel=False):
+    space = ObjectSpace(config)
+    if prebuild_kernel:
+        space.prebuild_kernel()
+
     def entry_point(argv):
-        space = getspace(config)
-        space.setup(argv[0])
-        return _entry_point(space, argv)
+        if len(argv) >= 2 and (argv[1] == "--server" or argv[1] == "--client"):
+            if IS_WINDOWS:
+                os.write(2, "%s is not supported on Windows (RuntimeError)\n" % argv[1])
+                return 1
+        if len(argv) >= 3 and argv[1] == "--client":
+            return run_client(argv[2], [argv[0]] + argv[3:])
+        gc_environment = _gc_environment(argv)
+        if gc_environment:
+            _exec_with_environment(argv, gc_environment)
+        profile_path = _startup_profile_path(argv)
+        profile = space.fromcache(StartupProfile)
+        if profile_path is not None:
+            profile.enable()
+        with profile.measure("setup"):
+            space.setup(argv[0])
+        if len(argv) >= 2 and argv[1] == "--server":
+            return _server_entry_point(space, argv)
+        status = _entry_point(space, argv)
+        if profile_path is not None:
+            text = profile.report_json() if profile_path else profile.report()
+            _write_report(profile_path, text, "startup profile")
+        return status
     return entry_point
 
 
+GC_OPTIONS = [
+    ("--gc-nursery=", GC_NURSERY_ENV),
+    ("--gc-major-collect=", GC_MAJOR_COLLECT_ENV),
+    ("--gc-max-heap=", GC_MAX_ENV),
+    ("--gc-log=", GC_LOG_ENV),
+]
+
+
+def _gc_environment(argv):
+    # The GC reads its parameters from the environment as the process
+    # starts, before the entry point runs, so these options become
+    # environment variables the interpreter re-executes itself with.
+    environment = []
+    idx = 1
+    while idx < len(argv):
+        arg = argv[idx]
+        for prefix, name in GC_OPTIONS:
+            if arg.startswith(prefix):
+                value = arg[len(prefix):]
+                if name == GC_LOG_ENV:
+                    value = "gc:" + value
+                environment.append((name, value))
+        if arg == "-e" or arg == "-I" or arg == "-r":
+            idx += 1
+        elif arg == "--" or not arg.startswith("-"):
+            break
+        idx += 1
+    return environment
+
+
+def _exec_with_environment(argv, environment):
+    changed = False
+    for name, value in environment:
+        if os.environ.get(name) != value:
+            os.environ[name] = value
+            changed = True
+    if not changed or not we_are_translated():
+        return
+    executable = argv[0]
+    search_path = os.environ.get("PATH")
+    if os.sep not in executable and search_path is not None:
+        for dirname in search_path.split(os.pathsep):
+            candidate = os.path.join(dirname, executable)
+            if os.access(candidate, os.X_OK):
+                executable = candidate
+                break
+    try:
+        os.execv(executable, argv)
+    except OSError as e:
+        os.write(2, "%s -- %s (GC options)\n" % (os.strerror(e.errno), executable))
+
+
+def _startup_profile_path(argv):
+    # This has to be known before the space is set up, so it is looked for
+    # ahead of _parse_argv.
+    idx = 1
+    while idx < len(argv):
+        arg = argv[idx]
+        if arg == "--startup-profile":
+            return ""
+        elif arg.startswith("--startup-profile="):
+            return arg[len("--startup-profile="):]
+        elif arg == "-e" or arg == "-I" or arg == "-r":
+            idx += 1
+        elif arg == "--" or not arg.startswith("-"):
+            break
+        idx += 1
+    return None
+
+
+def _write_report(path, text, what):
+    # An empty path is stderr.
+    if not path:
+        os.write(2, text)
+        return
+    try:
+        f = open_file_as_stream(path, "w", buffering=0)
+        try:
+            f.write(text)
+        finally:
+            f.close()
+    except OSError as e:
+        os.write(2, "%s -- %s (%s)\n" % (os.strerror(e.errno), path, what))
+
+
+def _is_gc_option(arg):
+    for prefix, _ in GC_OPTIONS:
+        if arg.startswith(prefix):
+            return True
+    return False
+
+
 class CommandLineError(Exception):
     def __init__(self, message):
         self.message = message
@@ -91,6 +224,9 @@ def _parse_argv(space, argv):
     }
     warning_level = None
     do_loop = False
+    dump_bytecode = False
+    dispatch_stats_path = None
+    profile_path = None
     path = None
     search_path = False
     globalize_switches = False
@@ -114,6 +250,22 @@ def _parse_argv(space, argv):
                     [space.newstr_fromstr("RUBY_DESCRIPTION")]
                 )
             ))
+        elif arg == "--dump-bytecode":
+            dump_bytecode = True
+        elif arg == "--no-optimize":
+            space.optimize_bytecode = False
+        elif arg == "--startup-profile" or arg.startswith("--startup-profile="):
+            pass
+        elif _is_gc_option(arg):
+            pass
+        elif arg == "--dispatch-stats":
+            dispatch_stats_path = ""
+        elif arg.startswith("--dispatch-stats="):
+            dispatch_stats_path = arg[len("--dispatch-stats="):]
+        elif arg == "--profile":
+            profile_path = ""
+        elif arg.startswith("--profile="):
+            profile_path = arg[len("--profile="):]
         elif arg == "-v":
             flag_globals_w["$-v"] = space.w_true
             flag_globals_w["$VERBOSE"] = space.w_true
@@ -183,6 +335,9 @@ def _parse_argv(space, argv):
     return (
         flag_globals_w,
         do_loop,
+        dump_bytecode,
+        dispatch_stats_path,
+        profile_path,
         path,
         search_path,
         globalized_switches,
@@ -193,6 +348,38 @@ def _parse_argv(space, argv):
     )
 
 
+def _server_entry_point(space, argv):
+    path = None
+    preloads = []
+    idx = 1
+    while idx < len(argv):
+        arg = argv[idx]
+        if idx + 1 == len(argv):
+            os.write(2, "missing argument for %s (RuntimeError)\n" % arg)
+            return 1
+        elif arg == "--server":
+            path = argv[idx + 1]
+        elif arg == "--preload":
+            preloads += argv[idx + 1].split(os.pathsep)
+        else:
+            os.write(2, "invalid option for --server: %s (RuntimeError)\n" % arg)
+            return 1
+        idx += 2
+    assert path is not None
+
+    try:
+        for preload in preloads:
+            space.send(
+                space.w_kernel,
+                space.newsymbol("require"),
+                [space.newstr_fromstr(preload)]
+            )
+    except RubyError as e:
+        print_traceback(space, e.w_value)
+        return 1
+    return ForkServer(space, path).serve(_entry_point)
+
+
 def _entry_point(space, argv):
     if IS_WINDOWS:
         system = "Windows"
@@ -211,18 +398,23 @@ def _entry_point(space, argv):
     space.set_const(space.w_object, "RUBY_DESCRIPTION", space.newstr_fromstr(description))
     space.set_const(space.w_object, "RUBY_REVISION", space.newstr_fromstr(RUBY_REVISION))
 
+    profile = space.fromcache(StartupProfile)
     try:
-        (
-            flag_globals_w,
-            do_loop,
-            path,
-            search_path,
-            globalized_switches,
-            exprs,
-            reqs,
-            load_path_entries,
-            argv_w
-        ) = _parse_argv(space, argv)
+        with profile.measure("argv"):
+            (
+                flag_globals_w,
+                do_loop,
+                dump_bytecode,
+                dispatch_stats_path,
+                profile_path,
+                path,
+                search_path,
+                globalized_switches,
+                exprs,
+                reqs,
+                load_path_entries,
+                argv_w
+            ) = _parse_argv(space, argv)
     except ShortCircuitError as e:
         os.write(1, e.message)
         return 0
@@ -230,6 +422,17 @@ def _entry_point(space, argv):
         os.write(2, e.message)
         return 1
 
+    cache_dir = os.environ.get("TOPAZ_BYTECODE_CACHE")
+    if cache_dir:
+        space.fromcache(BytecodeCache).cache_dir = cache_dir
+
+    dispatch_stats = space.fromcache(DispatchStats)
+    if dispatch_stats_path is not None:
+        dispatch_stats.enable()
+    profiler = space.fromcache(SamplingProfiler)
+    if profile_path is not None:
+        profiler.start(SamplingProfiler.DEFAULT_INTERVAL)
+
     for path_entry in load_path_entries:
         space.send(
             space.w_load_path,
@@ -266,7 +469,8 @@ def _entry_point(space, argv):
             os.write(2, "%s -- %s (LoadError)\n" % (os.strerror(e.errno), path))
             return 1
         try:
-            source = f.readall()
+            with profile.measure("read", path):
+                source = f.readall()
         finally:
             f.close()
     elif explicitly_verbose:
@@ -296,7 +500,9 @@ def _entry_point(space, argv):
     w_exit_error = None
     explicit_status = False
     try:
-        if do_loop:
+        if dump_bytecode:
+            os.write(1, space.compile(source, path).disassemble())
+        elif do_loop:
             print_after = space.is_true(flag_globals_w["$-p"])
             bc = space.compile(source, path)
             frame = space.create_frame(bc)
@@ -309,7 +515,9 @@ def _entry_point(space, argv):
                     if print_after:
                         space.send(space.w_kernel, space.newsymbol("print"), [w_res])
         else:
-            space.execute(source, filepath=path)
+            bc = space.compile(source, path)
+            with profile.measure("run", path):
+                space.execute_code(bc)
     except RubyError as e:
         explicit_status = True
         w_exc = e.w_value
@@ -323,5 +531,15 @@ def _entry_point(space, argv):
         status = exit_handler_status
     if w_exit_error is not None:
         print_traceback(space, w_exit_error, path)
+    if profile_path is not None:
+        profiler.stop()
+        if profile_path:
+            text = profiler.report_collapsed()
+        else:
+            text = profiler.report_flat() + profiler.report_tree()
+        _write_report(profile_path, text, "profile")
+    if dispatch_stats_path is not None:
+        text = dispatch_stats.report_json() if dispatch_stats_path else dispatch_stats.report()
+        _write_report(dispatch_stats_path, text, "dispatch stats")
 
     return status
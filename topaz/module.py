@@ -141,12 +141,16 @@ class ClassCache(Cache):
         w_class = self.space.newclass(classdef.name, superclass)
         yield w_class
         for name, (method, argspec) in classdef.methods.iteritems():
-            func = WrapperGenerator(name, method, argspec, classdef.cls).generate_wrapper()
-            w_class.define_method(self.space, name, W_BuiltinFunction(name, w_class, func))
+            generator = WrapperGenerator(name, method, argspec, classdef.cls)
+            w_func = W_BuiltinFunction(name, w_class, generator.generate_wrapper(),
+                                       generator.generate_fixed_wrappers())
+            w_class.define_method(self.space, name, w_func)
 
         for name, (method, argspec) in classdef.singleton_methods.iteritems():
-            func = WrapperGenerator(name, method, argspec, W_ClassObject).generate_wrapper()
-            w_class.attach_method(self.space, name, W_BuiltinFunction(name, w_class, func))
+            generator = WrapperGenerator(name, method, argspec, W_ClassObject)
+            w_func = W_BuiltinFunction(name, w_class, generator.generate_wrapper(),
+                                       generator.generate_fixed_wrappers())
+            w_class.attach_method(self.space, name, w_func)
 
         for mod in reversed(classdef.includes):
             w_mod = self.space.getmoduleobject(mod.moduledef)
@@ -164,11 +168,15 @@ class ModuleCache(Cache):
 
         w_mod = self.space.newmodule(moduledef.name)
         for name, (method, argspec) in moduledef.methods.iteritems():
-            func = WrapperGenerator(name, method, argspec, W_BaseObject).generate_wrapper()
-            w_mod.define_method(self.space, name, W_BuiltinFunction(name, w_mod, func))
+            generator = WrapperGenerator(name, method, argspec, W_BaseObject)
+            w_func = W_BuiltinFunction(name, w_mod, generator.generate_wrapper(),
+                                       generator.generate_fixed_wrappers())
+            w_mod.define_method(self.space, name, w_func)
         for name, (method, argspec) in moduledef.singleton_methods.iteritems():
-            func = WrapperGenerator(name, method, argspec, W_ModuleObject).generate_wrapper()
-            w_mod.attach_method(self.space, name, W_BuiltinFunction(name, w_mod, func))
+            generator = WrapperGenerator(name, method, argspec, W_ModuleObject)
+            w_func = W_BuiltinFunction(name, w_mod, generator.generate_wrapper(),
+                                       generator.generate_fixed_wrappers())
+            w_mod.attach_method(self.space, name, w_func)
 
         if moduledef.setup_module_func is not None:
             moduledef.setup_module_func(self.space, w_mod)
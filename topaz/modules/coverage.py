@@ -0,0 +1,42 @@
+from __future__ import absolute_import
+
+from topaz.coverage import CoverageState
+from topaz.module import Module, ModuleDef
+
+
+class Coverage(Module):
+    moduledef = ModuleDef("Coverage", filepath=__file__)
+
+    @staticmethod
+    def build_result(space, coverage):
+        w_res = space.newhash()
+        for file_coverage in coverage.files:
+            counts_w = []
+            for count in file_coverage.counts:
+                counts_w.append(space.w_nil if count == -1 else space.newint(count))
+            w_res.method_subscript_assign(space, space.newstr_fromstr(file_coverage.path), space.newarray(counts_w))
+        return w_res
+
+    @moduledef.function("start")
+    def method_start(self, space):
+        space.fromcache(CoverageState).start()
+
+    @moduledef.function("running?")
+    def method_runningp(self, space):
+        return space.newbool(space.fromcache(CoverageState).enabled)
+
+    @moduledef.function("peek_result")
+    def method_peek_result(self, space):
+        coverage = space.fromcache(CoverageState)
+        if not coverage.enabled:
+            raise space.error(space.w_RuntimeError, "coverage measurement is not enabled")
+        return Coverage.build_result(space, coverage)
+
+    @moduledef.function("result")
+    def method_result(self, space):
+        coverage = space.fromcache(CoverageState)
+        if not coverage.enabled:
+            raise space.error(space.w_RuntimeError, "coverage measurement is not enabled")
+        w_res = Coverage.build_result(space, coverage)
+        coverage.stop()
+        return w_res
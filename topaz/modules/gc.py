@@ -0,0 +1,112 @@
+from __future__ import absolute_import
+
+from topaz.gcstats import GCStats
+from topaz.module import Module, ModuleDef
+from topaz.objects.hashobject import W_HashObject
+
+
+class Profiler(Module):
+    moduledef = ModuleDef("GC::Profiler", filepath=__file__)
+
+    @moduledef.function("enabled?")
+    def method_enabledp(self, space):
+        return space.newbool(space.fromcache(GCStats).profiler_enabled)
+
+    @moduledef.function("enable")
+    def method_enable(self, space):
+        space.fromcache(GCStats).profiler_enabled = True
+
+    @moduledef.function("disable")
+    def method_disable(self, space):
+        space.fromcache(GCStats).profiler_enabled = False
+
+    @moduledef.function("clear")
+    def method_clear(self, space):
+        space.fromcache(GCStats).records = []
+
+    @moduledef.function("total_time")
+    def method_total_time(self, space):
+        return space.newfloat(space.fromcache(GCStats).profiler_total_time())
+
+    @moduledef.function("raw_data")
+    def method_raw_data(self, space):
+        records_w = []
+        for record in space.fromcache(GCStats).records:
+            w_record = space.newhash()
+            for name, w_value in [
+                ("GC_TIME", space.newfloat(record.seconds)),
+                ("GC_INVOKE_TIME", space.newfloat(record.invoke_time)),
+                ("MAJOR", space.newbool(record.major)),
+            ]:
+                w_record.method_subscript_assign(space, space.newsymbol(name), w_value)
+            records_w.append(w_record)
+        return space.newarray(records_w)
+
+    @moduledef.function("result")
+    def method_result(self, space):
+        return space.newstr_fromstr(space.fromcache(GCStats).profiler_result())
+
+    @moduledef.function("report")
+    def method_report(self, space, w_io=None):
+        if w_io is None:
+            w_io = space.globals.get(space, "$stdout")
+        w_result = space.newstr_fromstr(space.fromcache(GCStats).profiler_result())
+        space.send(w_io, space.newsymbol("write"), [w_result])
+
+
+class GC(Module):
+    moduledef = ModuleDef("GC", filepath=__file__)
+
+    @moduledef.setup_module
+    def setup_module(space, w_mod):
+        space.set_const(w_mod, "Profiler", space.getmoduleobject(Profiler.moduledef))
+
+    @moduledef.function("start")
+    def method_start(self, space, w_opts=None):
+        full = True
+        if w_opts is not None:
+            if not isinstance(w_opts, W_HashObject):
+                raise space.error(space.w_TypeError, "no implicit conversion to hash")
+            w_full = w_opts.method_subscript(space, space.newsymbol("full"))
+            if w_full is not space.w_nil:
+                full = space.is_true(w_full)
+        space.fromcache(GCStats).collect(full)
+
+    @moduledef.function("stat")
+    def method_stat(self, space, w_key=None):
+        # The GC doesn't tell RPython code about the collections it runs by
+        # itself, so there are no counts or times to report, only the limit
+        # the heap was given.
+        stats = space.fromcache(GCStats)
+        w_res = space.newhash()
+        w_res.method_subscript_assign(space, space.newsymbol("max_heap_size"), space.newint(stats.max_heap_size))
+        if w_key is not None:
+            return w_res.method_subscript(space, w_key)
+        return w_res
+
+    @moduledef.function("disable")
+    def method_disable(self, space):
+        # Only makes GC.start and ObjectSpace.garbage_collect do nothing, the
+        # GC still collects whenever it needs to.
+        stats = space.fromcache(GCStats)
+        was_disabled = stats.disabled
+        stats.disabled = True
+        return space.newbool(was_disabled)
+
+    @moduledef.function("enable")
+    def method_enable(self, space):
+        stats = space.fromcache(GCStats)
+        was_disabled = stats.disabled
+        stats.disabled = False
+        return space.newbool(was_disabled)
+
+    @moduledef.function("max_heap_size")
+    def method_max_heap_size(self, space):
+        return space.newint(space.fromcache(GCStats).max_heap_size)
+
+    @moduledef.function("max_heap_size=", nbytes="int")
+    def method_set_max_heap_size(self, space, nbytes):
+        if nbytes < 0:
+            raise space.error(space.w_ArgumentError, "negative heap size")
+        space.fromcache(GCStats).set_max_heap_size(nbytes)
+        return space.newint(nbytes)
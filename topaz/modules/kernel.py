@@ -6,7 +6,8 @@ import time
 from rpython.rlib.rfloat import round_double
 from rpython.rlib.streamio import open_file_as_stream
 
-from topaz.coerce import Coerce
+from topaz.bytecodecache import BytecodeCache
+from topaz.coverage import CoverageState
 from topaz.error import RubyError, error_for_oserror
 from topaz.module import Module, ModuleDef
 from topaz.modules.process import Process
@@ -16,6 +17,8 @@ from topaz.objects.procobject import W_ProcObject
 from topaz.objects.stringobject import W_StringObject
 from topaz.objects.classobject import W_ClassObject
 from topaz.objects.moduleobject import W_ModuleObject
+from topaz.requirecache import LoadedFeatures, LoadPathCache
+from topaz.startupprofile import StartupProfile
 
 
 class Kernel(Module):
@@ -55,13 +58,9 @@ class Kernel(Module):
             path += ".rb"
 
         if not (path.startswith("/") or path.startswith("./") or path.startswith("../")):
-            w_load_path = space.globals.get(space, "$LOAD_PATH")
-            for w_base in space.listview(w_load_path):
-                base = Coerce.path(space, w_base)
-                full = os.path.join(base, path)
-                if os.path.isfile(full):
-                    path = os.path.join(base, path)
-                    break
+            full = space.fromcache(LoadPathCache).find(space, path)
+            if full is not None:
+                path = full
         return path
 
     @staticmethod
@@ -69,16 +68,23 @@ class Kernel(Module):
         if not os.path.exists(path):
             raise space.error(space.w_LoadError, orig_path)
 
+        profile = space.fromcache(StartupProfile)
         try:
-            f = open_file_as_stream(path, buffering=0)
-            try:
-                contents = f.readall()
-            finally:
-                f.close()
+            with profile.measure("read", path):
+                f = open_file_as_stream(path, buffering=0)
+                try:
+                    contents = f.readall()
+                finally:
+                    f.close()
         except OSError as e:
             raise error_for_oserror(space, e)
 
-        space.execute(contents, filepath=path)
+        bc = space.fromcache(BytecodeCache).compile(space, contents, path)
+        coverage = space.fromcache(CoverageState)
+        if coverage.enabled:
+            coverage.register(bc, contents)
+        with profile.measure("run", path):
+            space.execute_code(bc)
 
     @moduledef.function("require", path="path")
     def function_require(self, space, path):
@@ -86,17 +92,32 @@ class Kernel(Module):
         orig_path = path
         path = Kernel.find_feature(space, path)
 
-        w_loaded_features = space.globals.get(space, '$"')
-        w_already_loaded = space.send(
-            w_loaded_features, space.newsymbol("include?"), [space.newstr_fromstr(path)]
-        )
-        if space.is_true(w_already_loaded):
+        loaded_features = space.fromcache(LoadedFeatures)
+        if loaded_features.include(space, path):
             return space.w_false
 
         Kernel.load_feature(space, path, orig_path)
-        w_loaded_features.method_lshift(space, space.newstr_fromstr(path))
+        loaded_features.add(space, path)
         return space.w_true
 
+    @moduledef.method("autoload", name="symbol", path="path")
+    def method_autoload(self, space, name, path):
+        return space.send(Kernel._autoload_scope(space, self), space.newsymbol("autoload"),
+            [space.newsymbol(name), space.newstr_fromstr(path)]
+        )
+
+    @moduledef.method("autoload?", name="symbol")
+    def method_autoloadp(self, space, name):
+        return space.send(Kernel._autoload_scope(space, self), space.newsymbol("autoload?"),
+            [space.newsymbol(name)]
+        )
+
+    @staticmethod
+    def _autoload_scope(space, w_obj):
+        if isinstance(w_obj, W_ModuleObject):
+            return w_obj
+        return space.getnonsingletonclass(w_obj)
+
     @moduledef.function("load", path="path")
     def function_load(self, space, path):
         assert path is not None
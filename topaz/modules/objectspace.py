@@ -1,13 +1,15 @@
 from __future__ import absolute_import
 
-from rpython.rlib import rgc, jit
+from rpython.rlib import rgc
 
+from topaz.allocationtracer import AllocationTracer, count_types
+from topaz.gcstats import GCStats
+from topaz.heapdump import FdOutput, HeapDumper, StringOutput, try_cast_gcref_to_w_baseobject
 from topaz.module import Module, ModuleDef
-from topaz.objects.objectobject import W_BaseObject
-
-
-def try_cast_gcref_to_w_baseobject(gcref):
-    return rgc.try_cast_gcref_to_instance(W_BaseObject, gcref)
+from topaz.objects.classobject import W_ClassObject
+from topaz.objects.ioobject import W_IOObject
+from topaz.objects.moduleobject import ModuleRegistry
+from topaz.utils.reporting import CountSorter
 
 
 def clear_gcflag_extra(pending):
@@ -18,6 +20,44 @@ def clear_gcflag_extra(pending):
             pending.extend(rgc.get_rpy_referents(gcref))
 
 
+def all_modules(space):
+    """
+    Every class and module, found through the descendants of BasicObject and
+    of the modules, rather than by walking the heap.
+    """
+    modules_w = []
+    seen = {}
+    pending = [space.w_basicobject]
+    pending.extend(space.fromcache(ModuleRegistry).modules())
+    while pending:
+        w_mod = pending.pop()
+        if w_mod not in seen:
+            seen[w_mod] = None
+            modules_w.append(w_mod)
+            pending.extend(w_mod.descendants)
+    return modules_w
+
+
+def heap_objects(space, w_mod=None):
+    """
+    The Ruby objects reachable from the GC's roots which are kinds of w_mod,
+    or all of them without w_mod.
+    """
+    objects_w = []
+    roots = [gcref for gcref in rgc.get_rpy_roots() if gcref]
+    pending = roots[:]
+    while pending:
+        gcref = pending.pop()
+        if not rgc.get_gcflag_extra(gcref):
+            rgc.toggle_gcflag_extra(gcref)
+            w_obj = try_cast_gcref_to_w_baseobject(gcref)
+            if w_obj is not None and (w_mod is None or space.is_kind_of(w_obj, w_mod)):
+                objects_w.append(w_obj)
+            pending.extend(rgc.get_rpy_referents(gcref))
+    clear_gcflag_extra(roots)
+    return objects_w
+
+
 class ObjectSpace(Module):
     moduledef = ModuleDef("ObjectSpace", filepath=__file__)
 
@@ -26,22 +66,110 @@ class ObjectSpace(Module):
         if block is None:
             return space.send(self, space.newsymbol("enum_for"), [space.newsymbol("each_object"), w_mod], block)
         match_w = []
-        roots = [gcref for gcref in rgc.get_rpy_roots() if gcref]
-        pending = roots[:]
-        while pending:
-            gcref = pending.pop()
-            if not rgc.get_gcflag_extra(gcref):
-                rgc.toggle_gcflag_extra(gcref)
-                w_obj = try_cast_gcref_to_w_baseobject(gcref)
-                if w_obj is not None and space.is_kind_of(w_obj, w_mod):
+        if isinstance(w_mod, W_ClassObject) and space.w_module.is_ancestor_of(w_mod):
+            # Only modules are instances of w_mod, no need to walk the heap.
+            for w_obj in all_modules(space):
+                if space.is_kind_of(w_obj, w_mod):
                     match_w.append(w_obj)
-                pending.extend(rgc.get_rpy_referents(gcref))
-        clear_gcflag_extra(roots)
+        else:
+            match_w = heap_objects(space, w_mod)
         for w_obj in match_w:
             space.invoke_block(block, [w_obj])
         return space.newint(len(match_w))
 
+    @moduledef.function("dump_all")
+    def method_dump_all(self, space, w_io=None):
+        if w_io is None or w_io is space.w_nil:
+            output = StringOutput()
+            HeapDumper(space).dump(output)
+            return space.newstr_fromstr(output.build())
+        # No Ruby code may run while the heap is walked, so the lines are
+        # written straight to the IO's file descriptor.
+        if not isinstance(w_io, W_IOObject):
+            raise space.error(
+                space.w_TypeError,
+                "wrong argument type %s (expected IO)" % space.getclass(w_io).name
+            )
+        w_io.ensure_not_closed(space)
+        HeapDumper(space).dump(FdOutput(w_io.getfd()))
+        return w_io
+
     @moduledef.function("garbage_collect")
-    @jit.dont_look_inside
-    def method_garbage_collect(self):
-        rgc.collect()
+    def method_garbage_collect(self, space):
+        space.fromcache(GCStats).collect(True)
+
+    @moduledef.function("trace_object_allocations")
+    def method_trace_object_allocations(self, space, block):
+        if block is None:
+            raise space.error(space.w_LocalJumpError, "no block given")
+        tracer = space.fromcache(AllocationTracer)
+        if tracer.enabled:
+            return space.invoke_block(block, [])
+        tracer.start()
+        try:
+            return space.invoke_block(block, [])
+        finally:
+            tracer.stop()
+
+    @moduledef.function("trace_object_allocations_start")
+    def method_trace_object_allocations_start(self, space):
+        space.fromcache(AllocationTracer).start()
+
+    @moduledef.function("trace_object_allocations_stop")
+    def method_trace_object_allocations_stop(self, space):
+        space.fromcache(AllocationTracer).stop()
+
+    @moduledef.function("trace_object_allocations_clear")
+    def method_trace_object_allocations_clear(self, space):
+        space.fromcache(AllocationTracer).clear()
+
+    @moduledef.function("allocation_sourcefile")
+    def method_allocation_sourcefile(self, space, w_obj):
+        site = space.fromcache(AllocationTracer).find_site(w_obj)
+        if site is None:
+            return space.w_nil
+        return space.newstr_fromstr(site.path)
+
+    @moduledef.function("allocation_sourceline")
+    def method_allocation_sourceline(self, space, w_obj):
+        site = space.fromcache(AllocationTracer).find_site(w_obj)
+        if site is None:
+            return space.w_nil
+        return space.newint(site.lineno)
+
+    @moduledef.function("allocation_sites")
+    def method_allocation_sites(self, space, w_retained=None):
+        tracer = space.fromcache(AllocationTracer)
+        retained = None
+        if w_retained is not None and space.is_true(w_retained):
+            retained = tracer.retained()
+        entries = [(tracer.sites[i].count, i) for i in xrange(len(tracer.sites))]
+        CountSorter(entries).sort()
+        sites_w = []
+        for _, idx in entries:
+            site = tracer.sites[idx]
+            w_site = space.newhash()
+            w_site.method_subscript_assign(space, space.newsymbol("class"), site.w_cls)
+            w_site.method_subscript_assign(space, space.newsymbol("file"), space.newstr_fromstr(site.path))
+            w_site.method_subscript_assign(space, space.newsymbol("line"), space.newint(site.lineno))
+            w_site.method_subscript_assign(space, space.newsymbol("count"), space.newint(site.count))
+            if retained is not None:
+                w_site.method_subscript_assign(
+                    space, space.newsymbol("retained"), space.newint(retained.get(site, 0))
+                )
+            sites_w.append(w_site)
+        return space.newarray(sites_w)
+
+    @moduledef.function("count_objects")
+    def method_count_objects(self, space):
+        # Always the objects on the heap, whether or not allocations were
+        # traced.
+        types, counts = count_types(heap_objects(space))
+        total = 0
+        for name in types:
+            total += counts[name]
+        w_res = space.newhash()
+        w_res.method_subscript_assign(space, space.newsymbol("TOTAL"), space.newint(total))
+        for name in types:
+            w_res.method_subscript_assign(space, space.newsymbol(name), space.newint(counts[name]))
+        return w_res
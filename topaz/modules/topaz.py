@@ -2,13 +2,69 @@ from __future__ import absolute_import
 
 from rpython.rlib.rarithmetic import intmask
 
+from topaz.callsite import CallSiteStats
+from topaz.evalcache import EvalCache
 from topaz.module import Module, ModuleDef
 from topaz.objects.classobject import W_ClassObject
+from topaz.objects.moduleobject import InvalidationStats
+from topaz.profiler import SamplingProfiler
+
+
+def _stats_hash(space, pairs):
+    w_res = space.newhash()
+    for name, count in pairs:
+        w_res.method_subscript_assign(space, space.newsymbol(name), space.newint(count))
+    return w_res
+
+
+class Profiler(Module):
+    moduledef = ModuleDef("Topaz::Profiler", filepath=__file__)
+
+    @moduledef.function("start", interval="float")
+    def method_start(self, space, interval=SamplingProfiler.DEFAULT_INTERVAL):
+        profiler = space.fromcache(SamplingProfiler)
+        if profiler.enabled:
+            return space.w_false
+        if interval < 0.0:
+            raise space.error(space.w_ArgumentError, "negative sampling interval")
+        profiler.start(interval)
+        return space.w_true
+
+    @moduledef.function("stop")
+    def method_stop(self, space):
+        profiler = space.fromcache(SamplingProfiler)
+        if not profiler.enabled:
+            return space.w_false
+        profiler.stop()
+        return space.w_true
+
+    @moduledef.function("running?")
+    def method_runningp(self, space):
+        return space.newbool(space.fromcache(SamplingProfiler).enabled)
+
+    @moduledef.function("samples")
+    def method_samples(self, space):
+        return space.newint(space.fromcache(SamplingProfiler).samples)
+
+    @moduledef.function("report", format="symbol")
+    def method_report(self, space, format="flat"):
+        profiler = space.fromcache(SamplingProfiler)
+        if format == "flat":
+            return space.newstr_fromstr(profiler.report_flat())
+        elif format == "tree":
+            return space.newstr_fromstr(profiler.report_tree())
+        elif format == "collapsed":
+            return space.newstr_fromstr(profiler.report_collapsed())
+        raise space.error(space.w_ArgumentError, "unknown profile format: %s" % format)
 
 
 class Topaz(Module):
     moduledef = ModuleDef("Topaz", filepath=__file__)
 
+    @moduledef.setup_module
+    def setup_module(space, w_mod):
+        space.set_const(w_mod, "Profiler", space.getmoduleobject(Profiler.moduledef))
+
     @moduledef.function("intmask")
     def method_intmask(self, space, w_int):
         if space.is_kind_of(w_int, space.w_fixnum):
@@ -27,3 +83,29 @@ class Topaz(Module):
     def method_compare(self, space, w_a, w_b, block=None):
         return space.compare(w_a, w_b, block)
 
+    @moduledef.function("method_cache_stats")
+    def method_method_cache_stats(self, space):
+        stats = space.fromcache(CallSiteStats)
+        return _stats_hash(space, [
+            ("hits", stats.hits),
+            ("misses", stats.misses),
+            ("megamorphic", stats.megamorphic),
+        ])
+
+    @moduledef.function("invalidation_stats")
+    def method_invalidation_stats(self, space):
+        stats = space.fromcache(InvalidationStats)
+        return _stats_hash(space, [
+            ("methods", stats.methods),
+            ("constants", stats.constants),
+            ("ancestors", stats.ancestors),
+        ])
+
+    @moduledef.function("eval_cache_stats")
+    def method_eval_cache_stats(self, space):
+        cache = space.fromcache(EvalCache)
+        return _stats_hash(space, [
+            ("hits", cache.hits),
+            ("misses", cache.misses),
+            ("size", len(cache.entries)),
+        ])
@@ -25,10 +25,14 @@ class W_ArrayObject(W_Object):
     def __init__(self, space, items_w, klass=None):
         W_Object.__init__(self, space, klass)
         self.items_w = items_w
+        # Bumped by the methods changing the items, lets a cache built from
+        # an array tell whether it's still up to date.
+        self.mutations = 0
 
     def __deepcopy__(self, memo):
         obj = super(W_ArrayObject, self).__deepcopy__(memo)
         obj.items_w = copy.deepcopy(self.items_w, memo)
+        obj.mutations = self.mutations
         return obj
 
     def listview(self, space):
@@ -44,6 +48,7 @@ class W_ArrayObject(W_Object):
     def method_replace(self, space, other_w):
         del self.items_w[:]
         self.items_w.extend(other_w)
+        self.mutations += 1
         return self
 
     @classdef.method("[]")
@@ -66,6 +71,7 @@ class W_ArrayObject(W_Object):
             w_count = w_count_or_obj
         else:
             w_obj = w_count_or_obj
+        self.mutations += 1
         start, end, as_range, nil = space.subscript_access(len(self.items_w), w_idx, w_count=w_count)
 
         if w_count and end < start:
@@ -107,6 +113,7 @@ class W_ArrayObject(W_Object):
     @classdef.method("slice!")
     @check_frozen()
     def method_slice_i(self, space, w_idx, w_count=None):
+        self.mutations += 1
         start, end, as_range, nil = space.subscript_access(len(self.items_w), w_idx, w_count=w_count)
 
         if nil:
@@ -141,23 +148,27 @@ class W_ArrayObject(W_Object):
     @check_frozen()
     def method_lshift(self, space, w_obj):
         self.items_w.append(w_obj)
+        self.mutations += 1
         return self
 
     @classdef.method("concat", other="array")
     @check_frozen()
     def method_concat(self, space, other):
         self.items_w += other
+        self.mutations += 1
         return self
 
     @classdef.method("push")
     @check_frozen()
     def method_push(self, space, args_w):
         self.items_w.extend(args_w)
+        self.mutations += 1
         return self
 
     @classdef.method("shift")
     @check_frozen()
     def method_shift(self, space, w_n=None):
+        self.mutations += 1
         if w_n is None:
             if self.items_w:
                 return self.items_w.pop(0)
@@ -176,6 +187,7 @@ class W_ArrayObject(W_Object):
         for i in xrange(len(args_w) - 1, -1, -1):
             w_obj = args_w[i]
             self.items_w.insert(0, w_obj)
+        self.mutations += 1
         return self
 
     @classdef.method("join")
@@ -204,6 +216,7 @@ class W_ArrayObject(W_Object):
     @classdef.method("pop")
     @check_frozen()
     def method_pop(self, space, w_num=None):
+        self.mutations += 1
         if w_num is None:
             if self.items_w:
                 return self.items_w.pop()
@@ -224,6 +237,7 @@ class W_ArrayObject(W_Object):
     @classdef.method("delete_at", idx="int")
     @check_frozen()
     def method_delete_at(self, space, idx):
+        self.mutations += 1
         if idx < 0:
             idx += len(self.items_w)
         if idx < 0 or idx >= len(self.items_w):
@@ -260,17 +274,20 @@ class W_ArrayObject(W_Object):
     @check_frozen()
     def method_clear(self, space):
         del self.items_w[:]
+        self.mutations += 1
         return self
 
     @classdef.method("sort!")
     def method_sort(self, space, block):
         RubySorter(space, self.items_w, sortblock=block).sort()
+        self.mutations += 1
         return self
 
     @classdef.method("reverse!")
     @check_frozen()
     def method_reverse_i(self, space):
         self.items_w.reverse()
+        self.mutations += 1
         return self
 
     @classdef.method("rotate!", n="int")
@@ -288,4 +305,5 @@ class W_ArrayObject(W_Object):
         assert n >= 0       
         self.items_w.extend(self.items_w[:n])
         del self.items_w[:n]
+        self.mutations += 1
         return self
@@ -1,4 +1,3 @@
-from topaz.astcompiler import SymbolTable
 from topaz.module import ClassDef
 from topaz.objects.objectobject import W_Object
 
@@ -17,10 +16,7 @@ class W_BindingObject(W_Object):
 
     @classdef.method("eval", source="str")
     def method_eval(self, space, source):
-        symtable = SymbolTable()
-        for name in self.names:
-            symtable.cells[name] = symtable.FREEVAR
-        bc = space.compile(source, "", symtable=symtable)
+        bc = space.compile_eval(source, "", names=self.names)
         frame = space.create_frame(bc, w_self=self.w_self, lexical_scope=self.lexical_scope)
         for idx, cell in enumerate(self.cells):
             frame.cells[idx + len(bc.cellvars)] = cell
@@ -43,26 +43,29 @@ class W_ClassObject(W_ModuleObject):
         return self.klass
 
     def find_const(self, space, name):
+        return self.find_resolved_const(space, name)
+
+    def lookup_const(self, space, name):
         w_res = W_ModuleObject.find_included_const(self, space, name)
         if w_res is None and self.superclass is not None:
             w_res = self.superclass.find_const(space, name)
         return w_res
 
-    def find_method(self, space, name):
-        method = W_ModuleObject.find_method(self, space, name)
+    def lookup_method(self, space, name):
+        method = W_ModuleObject.lookup_method(self, space, name)
         if method is None and self.superclass is not None:
             method = self.superclass.find_method(space, name)
         return method
 
-    def find_method_super(self, space, name):
-        method = W_ModuleObject.find_method_super(self, space, name)
+    def lookup_method_super(self, space, name):
+        method = W_ModuleObject.lookup_method_super(self, space, name)
         if method is None and self.superclass is not None:
             method = self.superclass.find_method(space, name)
         return method
 
-    def ancestors(self, include_singleton=True, include_self=True):
+    def compute_ancestors(self, include_singleton, include_self):
         assert include_self
-        ary = W_ModuleObject.ancestors(self,
+        ary = W_ModuleObject.compute_ancestors(self,
             include_singleton, not (self.is_singleton and not include_singleton)
         )
         if self.superclass is not None:
@@ -74,6 +77,13 @@ class W_ClassObject(W_ModuleObject):
         if not space.bootstrap and space.respond_to(self, space.newsymbol("inherited")):
             space.send(self, space.newsymbol("inherited"), [w_mod])
 
+    def subclasses(self):
+        subclasses_w = []
+        for w_mod in self.descendants:
+            if isinstance(w_mod, W_ClassObject) and w_mod.superclass is self and not w_mod.is_singleton:
+                subclasses_w.append(w_mod)
+        return subclasses_w
+
     @classdef.singleton_method("allocate")
     def singleton_method_allocate(self, space, w_superclass=None):
         if w_superclass is not None:
@@ -99,3 +109,20 @@ class W_ClassObject(W_ModuleObject):
     @classdef.method("superclass")
     def method_superclass(self, space):
         return self.superclass if self.superclass is not None else space.w_nil
+
+    @classdef.method("subclasses")
+    def method_subclasses(self, space):
+        return space.newarray(self.subclasses())
+
+    @classdef.method("descendants")
+    def method_descendants(self, space):
+        descendants_w = []
+        pending = self.subclasses()
+        pending.reverse()
+        while pending:
+            w_cls = pending.pop()
+            descendants_w.append(w_cls)
+            subclasses_w = w_cls.subclasses()
+            subclasses_w.reverse()
+            pending.extend(subclasses_w)
+        return space.newarray(descendants_w)
@@ -1,5 +1,7 @@
 import copy
 
+from topaz import consts
+from topaz.callsite import CallSites
 from topaz.module import ClassDef
 from topaz.objects.objectobject import W_BaseObject
 
@@ -8,13 +10,14 @@ class W_CodeObject(W_BaseObject):
     _immutable_fields_ = [
         "code", "consts_w[*]", "max_stackdepth", "cellvars[*]", "freevars[*]",
         "arg_pos[*]", "defaults[*]", "block_arg_pos", "splat_arg_pos",
+        "case_tables[*]", "coverage?",
     ]
 
     classdef = ClassDef("Code", W_BaseObject.classdef, filepath=__file__)
 
     def __init__(self, name, filepath, code, max_stackdepth, consts, args,
                  splat_arg, block_arg, defaults, cellvars, freevars,
-                 lineno_table):
+                 lineno_table, case_tables):
 
         self.name = name
         self.filepath = filepath
@@ -25,6 +28,10 @@ class W_CodeObject(W_BaseObject):
         self.cellvars = cellvars
         self.freevars = freevars
         self.lineno_table = lineno_table
+        self.case_tables = case_tables
+        self.call_sites = CallSites()
+        # The FileCoverage counting the lines run while Coverage is started.
+        self.coverage = None
 
         n_args = len(args)
         arg_pos = [-1] * n_args
@@ -53,11 +60,31 @@ class W_CodeObject(W_BaseObject):
         obj.cellvars = self.cellvars
         obj.freevars = self.freevars
         obj.lineno_table = self.lineno_table
+        obj.case_tables = self.case_tables
+        obj.call_sites = copy.deepcopy(self.call_sites, memo)
+        obj.coverage = copy.deepcopy(self.coverage, memo)
         obj.arg_pos = self.arg_pos
         obj.block_arg_pos = self.block_arg_pos
         obj.splat_arg_pos = self.splat_arg_pos
         return obj
 
+    def disassemble(self):
+        lines = ["== %s (%s)" % (self.name, self.filepath)]
+        i = 0
+        while i < len(self.code):
+            c = ord(self.code[i])
+            line = "%04d %s" % (i, consts.BYTECODE_NAMES[c])
+            i += 1
+            for j in xrange(consts.BYTECODE_NUM_ARGS[c]):
+                line += " %d" % (ord(self.code[i]) | (ord(self.code[i + 1]) << 8))
+                i += 2
+            lines.append(line)
+        lines.append("")
+        for w_const in self.consts_w:
+            if isinstance(w_const, W_CodeObject):
+                lines.append(w_const.disassemble())
+        return "\n".join(lines)
+
     @classdef.method("filepath")
     def method_filepath(self, space):
         return space.newstr_fromstr(self.filepath)
@@ -1,7 +1,9 @@
 import copy
 
 from topaz.frame import BuiltinFrame
+from topaz.gateway import fixed_args_w
 from topaz.objects.objectobject import W_BaseObject
+from topaz.tracepoint import EVENT_CALL, EVENT_C_CALL, EVENT_C_RETURN, EVENT_RETURN, TracePointState
 
 
 class W_FunctionObject(W_BaseObject):
@@ -20,6 +22,14 @@ class W_FunctionObject(W_BaseObject):
     def arity(self, space):
         return space.newint(0)
 
+    def call_fixed(self, space, w_receiver, num_args, w_arg0, w_arg1, w_arg2, block):
+        """
+        Calls the function with num_args arguments, at most MAX_FIXED_ARGS,
+        the unused ones are None. Functions which can take the arguments
+        without a list override this.
+        """
+        return self.call(space, w_receiver, fixed_args_w(num_args, w_arg0, w_arg1, w_arg2), block)
+
 
 class W_UserFunction(W_FunctionObject):
     _immutable_fields_ = ["bytecode", "lexical_scope"]
@@ -42,9 +52,31 @@ class W_UserFunction(W_FunctionObject):
             lexical_scope=self.lexical_scope,
             block=block,
         )
+        frame.w_function = self
         with space.getexecutioncontext().visit_frame(frame):
             frame.handle_args(space, self.bytecode, args_w, block)
-            return space.execute_frame(frame, self.bytecode)
+            return self._execute(space, frame, w_receiver)
+
+    def call_fixed(self, space, w_receiver, num_args, w_arg0, w_arg1, w_arg2, block):
+        frame = space.create_frame(
+            self.bytecode,
+            w_self=w_receiver,
+            lexical_scope=self.lexical_scope,
+            block=block,
+        )
+        frame.w_function = self
+        with space.getexecutioncontext().visit_frame(frame):
+            frame.handle_fixed_args(space, self.bytecode, num_args, w_arg0, w_arg1, w_arg2, block)
+            return self._execute(space, frame, w_receiver)
+
+    def _execute(self, space, frame, w_receiver):
+        tracepoints = space.fromcache(TracePointState)
+        if tracepoints.events & EVENT_CALL:
+            tracepoints.fire(space, EVENT_CALL, frame, w_receiver, self)
+        w_res = space.execute_frame(frame, self.bytecode)
+        if tracepoints.events & EVENT_RETURN:
+            tracepoints.fire(space, EVENT_RETURN, frame, w_receiver, self, w_res)
+        return w_res
 
     def arity(self, space):
         args_count = len(self.bytecode.arg_pos) - len(self.bytecode.defaults)
@@ -55,22 +87,46 @@ class W_UserFunction(W_FunctionObject):
 
 
 class W_BuiltinFunction(W_FunctionObject):
-    _immutable_fields_ = ["func"]
+    _immutable_fields_ = ["func", "fixed_funcs[*]"]
 
-    def __init__(self, name, w_class, func):
+    def __init__(self, name, w_class, func, fixed_funcs):
         W_FunctionObject.__init__(self, name, w_class)
         self.func = func
+        self.fixed_funcs = fixed_funcs
 
     def __deepcopy__(self, memo):
         obj = super(W_BuiltinFunction, self).__deepcopy__(memo)
         obj.func = self.func
+        obj.fixed_funcs = self.fixed_funcs
         return obj
 
+    def call_fixed(self, space, w_receiver, num_args, w_arg0, w_arg1, w_arg2, block):
+        fixed_func = self.fixed_funcs[num_args]
+        if fixed_func is None:
+            return W_FunctionObject.call_fixed(self, space, w_receiver, num_args, w_arg0, w_arg1, w_arg2, block)
+        frame = BuiltinFrame(self.name)
+        ec = space.getexecutioncontext()
+        ec.invoke_trace_proc(space, "c-call", self.name, self.w_class.name)
+        tracepoints = space.fromcache(TracePointState)
+        if tracepoints.events & EVENT_C_CALL:
+            tracepoints.fire(space, EVENT_C_CALL, ec.gettoprubyframe(), w_receiver, self)
+        with ec.visit_frame(frame):
+            w_res = fixed_func(w_receiver, space, w_arg0, w_arg1, w_arg2, block)
+        ec.invoke_trace_proc(space, "c-return", self.name, self.w_class.name)
+        if tracepoints.events & EVENT_C_RETURN:
+            tracepoints.fire(space, EVENT_C_RETURN, ec.gettoprubyframe(), w_receiver, self, w_res)
+        return w_res
+
     def call(self, space, w_receiver, args_w, block):
         frame = BuiltinFrame(self.name)
         ec = space.getexecutioncontext()
         ec.invoke_trace_proc(space, "c-call", self.name, self.w_class.name)
+        tracepoints = space.fromcache(TracePointState)
+        if tracepoints.events & EVENT_C_CALL:
+            tracepoints.fire(space, EVENT_C_CALL, ec.gettoprubyframe(), w_receiver, self)
         with ec.visit_frame(frame):
             w_res = self.func(w_receiver, space, args_w, block)
         ec.invoke_trace_proc(space, "c-return", self.name, self.w_class.name)
+        if tracepoints.events & EVENT_C_RETURN:
+            tracepoints.fire(space, EVENT_C_RETURN, ec.gettoprubyframe(), w_receiver, self, w_res)
         return w_res
@@ -1,11 +1,15 @@
 import copy
+import weakref
 
 from rpython.rlib import jit
 
+from topaz.allocationtracer import AllocationHooks
+from topaz.callsite import ConstantState, OperatorState
+from topaz.casedispatch import CaseDispatchState
 from topaz.celldict import CellDict, VersionTag
 from topaz.module import ClassDef
 from topaz.objects.functionobject import W_FunctionObject
-from topaz.objects.objectobject import W_RootObject
+from topaz.objects.objectobject import W_Root, W_RootObject
 from topaz.scope import StaticScope
 
 
@@ -18,6 +22,9 @@ class AttributeReader(W_FunctionObject):
     def call(self, space, w_obj, args_w, block):
         return space.find_instance_var(w_obj, self.varname)
 
+    def call_fixed(self, space, w_obj, num_args, w_arg0, w_arg1, w_arg2, block):
+        return space.find_instance_var(w_obj, self.varname)
+
 
 class AttributeWriter(W_FunctionObject):
     _immutable_fields_ = ["varname"]
@@ -30,6 +37,12 @@ class AttributeWriter(W_FunctionObject):
         space.set_instance_var(w_obj, self.varname, w_value)
         return w_value
 
+    def call_fixed(self, space, w_obj, num_args, w_arg0, w_arg1, w_arg2, block):
+        if num_args != 1:
+            return W_FunctionObject.call_fixed(self, space, w_obj, num_args, w_arg0, w_arg1, w_arg2, block)
+        space.set_instance_var(w_obj, self.varname, w_arg0)
+        return w_arg0
+
     def arity(self, space):
         return space.newint(1)
 
@@ -76,33 +89,130 @@ class DefineMethodMethod(W_FunctionObject):
         return space.send(w_bound_method, space.newsymbol("call"), args_w, block)
 
 
+class InvalidationStats(object):
+    """
+    Space-wide counts of invalidated method, constant and ancestor lookups.
+    """
+
+    def __init__(self, space):
+        self.methods = 0
+        self.constants = 0
+        self.ancestors = 0
+
+
+class ModuleRegistry(object):
+    """
+    Every module which isn't a class. Classes are all reachable through the
+    descendants of BasicObject, a module only knows the modules including
+    it, so this is how the modules are found without walking the heap. The
+    modules are kept through weak references, an anonymous module can still
+    be collected once nothing else uses it.
+    """
+
+    def __init__(self, space):
+        self.module_refs = []
+
+    def __deepcopy__(self, memo):
+        # Weak references are copied as they are, they'd still point to the
+        # original modules.
+        obj = object.__new__(self.__class__)
+        memo[id(self)] = obj
+        obj.module_refs = [
+            weakref.ref(copy.deepcopy(w_mod, memo)) for w_mod in self.modules()
+        ]
+        return obj
+
+    def register(self, w_mod):
+        self.module_refs.append(weakref.ref(w_mod))
+
+    def modules(self):
+        """
+        Returns the modules which are still alive, and forgets the others.
+        """
+        module_refs = []
+        modules_w = []
+        for ref in self.module_refs:
+            w_mod = ref()
+            if w_mod is not None:
+                module_refs.append(ref)
+                modules_w.append(w_mod)
+        self.module_refs = module_refs
+        return modules_w
+
+
+class MethodCell(object):
+    _immutable_fields_ = ["method?", "stale?"]
+
+    def __init__(self):
+        self.method = None
+        self.stale = True
+
+
+class ConstCell(object):
+    _immutable_fields_ = ["w_value?", "stale?"]
+
+    def __init__(self):
+        self.w_value = None
+        self.stale = True
+
+
+class W_AutoloadConstant(W_Root):
+    """
+    Stands in for a constant registered with autoload, in the constants table
+    of its module, until the first lookup requires its path. It's never
+    visible to Ruby code.
+    """
+
+    _immutable_fields_ = ["path"]
+
+    def __init__(self, path):
+        self.path = path
+        self.loading = False
+
+    def __deepcopy__(self, memo):
+        obj = super(W_AutoloadConstant, self).__deepcopy__(memo)
+        obj.path = self.path
+        obj.loading = self.loading
+        return obj
+
+
 class W_ModuleObject(W_RootObject):
-    _immutable_fields_ = ["version?", "included_modules?[*]", "klass?", "name?"]
+    _immutable_fields_ = [
+        "constants_version?", "resolution_version?", "included_modules?[*]", "klass?",
+        "name?"
+    ]
 
     classdef = ClassDef("Module", W_RootObject.classdef, filepath=__file__)
 
     def __init__(self, space, name):
         self.name = name
         self.klass = None
-        self.version = VersionTag()
+        self.constants_version = VersionTag()
         self.methods_w = {}
         self.constants_w = {}
         self.class_variables = CellDict()
         self.instance_variables = CellDict()
         self.included_modules = []
         self.descendants = []
+        self.resolution_version = VersionTag()
+        self._clear_resolution()
+        hooks = space.fromcache(AllocationHooks)
+        if hooks.enabled:
+            hooks.allocated(space, self, space.getclassfor(self.__class__))
 
     def __deepcopy__(self, memo):
         obj = super(W_ModuleObject, self).__deepcopy__(memo)
         obj.name = self.name
         obj.klass = copy.deepcopy(self.klass, memo)
-        obj.version = copy.deepcopy(self.version, memo)
+        obj.constants_version = copy.deepcopy(self.constants_version, memo)
         obj.methods_w = copy.deepcopy(self.methods_w, memo)
         obj.constants_w = copy.deepcopy(self.constants_w, memo)
         obj.class_variables = copy.deepcopy(self.class_variables, memo)
         obj.instance_variables = copy.deepcopy(self.instance_variables, memo)
         obj.included_modules = copy.deepcopy(self.included_modules, memo)
         obj.descendants = copy.deepcopy(self.descendants, memo)
+        obj.resolution_version = VersionTag()
+        obj._clear_resolution()
         return obj
 
     def getclass(self, space):
@@ -117,16 +227,90 @@ class W_ModuleObject(W_RootObject):
             )
         return self.klass
 
-    def mutated(self):
-        self.version = VersionTag()
+    def _clear_resolution(self):
+        # Set once this module is part of some module's linearized
+        # ancestors, and so may have resolved lookups cached on it, or on one
+        # of its descendants.
+        self.resolution_observed = False
+        self.linearized_ancestors = None
+        self.ancestor_set = None
+        self.resolved_methods = {}
+        self.resolved_super_methods = {}
+        self.resolved_consts = {}
+        # The names the modules including this one looked up in our
+        # constants table while resolving them.
+        self.const_readers = {}
+
+    def invalidate_resolution(self, space):
+        """
+        Throws away everything that was resolved through this module's
+        ancestors, here and in all of its descendants. A module that was never
+        observed can't have anything cached below it, so the walk stops there.
+        """
+        if not self.resolution_observed:
+            return
+        space.fromcache(InvalidationStats).ancestors += 1
+        for cell in self.resolved_methods.itervalues():
+            cell.stale = True
+        for cell in self.resolved_super_methods.itervalues():
+            cell.stale = True
+        for const_cell in self.resolved_consts.itervalues():
+            const_cell.stale = True
+        self.resolution_version = VersionTag()
+        self._clear_resolution()
+        for w_mod in self.descendants:
+            w_mod.invalidate_resolution(space)
 
     def define_method(self, space, name, method):
-        self.mutated()
         self.methods_w[name] = method
+        self.method_changed(space, name)
+        space.fromcache(OperatorState).method_defined(space, self, name)
+        space.fromcache(CaseDispatchState).method_defined(space, self, name)
 
     @jit.unroll_safe
+    def method_changed(self, space, name):
+        """
+        Invalidates the resolved lookups of a single method name. Descendants
+        only resolve a name through a module after it has a cell for it, so
+        the walk stops wherever there is no live cell.
+        """
+        stats = space.fromcache(InvalidationStats)
+        cell = self.resolved_super_methods.get(name, None)
+        if cell is not None and not cell.stale:
+            cell.stale = True
+            stats.methods += 1
+        cell = self.resolved_methods.get(name, None)
+        if cell is not None and not cell.stale:
+            cell.stale = True
+            stats.methods += 1
+            for w_mod in self.descendants:
+                w_mod.method_changed(space, name)
+
     def find_method(self, space, name):
-        method = self._find_method_pure(space, name, self.version)
+        return self.resolve_method(space, name).method
+
+    def resolve_method(self, space, name):
+        cell = self._method_cell(name, self.resolution_version)
+        if cell.stale:
+            cell.method = self.lookup_method(space, name)
+            cell.stale = False
+        return cell
+
+    @jit.elidable
+    def _method_cell(self, name, version):
+        try:
+            return self.resolved_methods[name]
+        except KeyError:
+            self.ancestors()
+            cell = self.resolved_methods[name] = MethodCell()
+            return cell
+
+    def find_local_method(self, space, name):
+        return self.methods_w.get(name, None)
+
+    @jit.unroll_safe
+    def lookup_method(self, space, name):
+        method = self.find_local_method(space, name)
         if method is None:
             for module in self.included_modules:
                 method = module.find_method(space, name)
@@ -134,46 +318,140 @@ class W_ModuleObject(W_RootObject):
                     return method
         return method
 
-    @jit.unroll_safe
     def find_method_super(self, space, name):
+        return self.resolve_method_super(space, name).method
+
+    def resolve_method_super(self, space, name):
+        cell = self._method_super_cell(name, self.resolution_version)
+        if cell.stale:
+            cell.method = self.lookup_method_super(space, name)
+            cell.stale = False
+        return cell
+
+    @jit.elidable
+    def _method_super_cell(self, name, version):
+        try:
+            return self.resolved_super_methods[name]
+        except KeyError:
+            self.ancestors()
+            cell = self.resolved_super_methods[name] = MethodCell()
+            return cell
+
+    @jit.unroll_safe
+    def lookup_method_super(self, space, name):
         for module in self.included_modules:
             method = module.find_method(space, name)
             if method is not None:
                 return method
         return None
 
-    @jit.elidable
-    def _find_method_pure(self, space, method, version):
-        return self.methods_w.get(method, None)
-
     def set_const(self, space, name, w_obj):
-        self.mutated()
+        self.constants_version = VersionTag()
         self.constants_w[name] = w_obj
+        self.const_changed(space, name)
+        space.fromcache(ConstantState).changed()
+
+    def remove_const(self, space, name):
+        self.constants_version = VersionTag()
+        del self.constants_w[name]
+        self.const_changed(space, name)
+        space.fromcache(ConstantState).changed()
+
+    @jit.unroll_safe
+    def const_changed(self, space, name):
+        self._invalidate_const(space, name)
+        # Modules including this one read our constants table directly,
+        # rather than through a cell, so they have to be visited, but only
+        # when one of them looked the name up. Otherwise the cells reached
+        # from ours are all there is to invalidate.
+        if name in self.const_readers:
+            del self.const_readers[name]
+            for w_mod in self.descendants:
+                w_mod._invalidate_const(space, name)
+
+    @jit.unroll_safe
+    def _invalidate_const(self, space, name):
+        cell = self.resolved_consts.get(name, None)
+        if cell is not None and not cell.stale:
+            cell.stale = True
+            space.fromcache(InvalidationStats).constants += 1
+            for w_mod in self.descendants:
+                w_mod._invalidate_const(space, name)
 
     def find_const(self, space, name):
-        w_res = self.find_included_const(space, name)
+        w_res = self.find_resolved_const(space, name)
         if w_res is None:
             return space.w_object.find_const(space, name)
         else:
             return w_res
 
+    def find_resolved_const(self, space, name):
+        cell = self._const_cell(name, self.resolution_version)
+        if cell.stale:
+            cell.w_value = self.lookup_const(space, name)
+            cell.stale = False
+        return cell.w_value
+
+    @jit.elidable
+    def _const_cell(self, name, version):
+        try:
+            return self.resolved_consts[name]
+        except KeyError:
+            self.ancestors()
+            cell = self.resolved_consts[name] = ConstCell()
+            return cell
+
+    def lookup_const(self, space, name):
+        return self.find_included_const(space, name)
+
     @jit.unroll_safe
     def find_included_const(self, space, name):
         w_res = self.find_local_const(space, name)
         if w_res is None:
             for w_mod in self.included_modules:
+                w_mod.const_readers[name] = None
                 w_res = w_mod.find_local_const(space, name)
                 if w_res is not None:
                     break
         return w_res
 
     def find_local_const(self, space, name):
-        return self._find_const_pure(name, self.version)
+        w_res = self._find_const_pure(name, self.constants_version)
+        if isinstance(w_res, W_AutoloadConstant):
+            w_res = self._autoload_const(space, name, w_res)
+        return w_res
 
     @jit.elidable
     def _find_const_pure(self, name, version):
         return self.constants_w.get(name, None)
 
+    def _autoload_const(self, space, name, w_autoload):
+        # While its feature is being required the constant is undefined, so
+        # the feature itself can define it.
+        if w_autoload.loading:
+            return None
+        w_autoload.loading = True
+        try:
+            space.send(space.w_kernel, space.newsymbol("require"), [space.newstr_fromstr(w_autoload.path)])
+        finally:
+            w_autoload.loading = False
+        w_res = self._find_const_pure(name, self.constants_version)
+        if isinstance(w_res, W_AutoloadConstant):
+            if w_res is w_autoload:
+                self.remove_const(space, name)
+            return None
+        return w_res
+
+    def set_autoload(self, space, name, path):
+        if name not in self.constants_w:
+            space.set_const(self, name, W_AutoloadConstant(path))
+
+    def find_autoload(self, space, name):
+        w_res = self._find_const_pure(name, self.constants_version)
+        if isinstance(w_res, W_AutoloadConstant) and not w_res.loading:
+            return w_res.path
+        return None
+
     @jit.unroll_safe
     def set_class_var(self, space, name, w_obj):
         ancestors = self.ancestors()
@@ -213,26 +491,50 @@ class W_ModuleObject(W_RootObject):
         return self.instance_variables.get(space, name) or space.w_nil
 
     def ancestors(self, include_singleton=True, include_self=True):
+        """
+        The full list of ancestors is cached, callers must not modify it.
+        """
+        if include_singleton and include_self:
+            return self._linearized_ancestors(self.resolution_version)
+        return self.compute_ancestors(include_singleton, include_self)
+
+    @jit.elidable
+    def _linearized_ancestors(self, version):
+        if self.linearized_ancestors is None:
+            ancestors = self.compute_ancestors(True, True)
+            for w_mod in ancestors:
+                # The same lists end up in Module#ancestors' arrays, where
+                # they're only known to hold W_Roots.
+                assert isinstance(w_mod, W_ModuleObject)
+                w_mod.resolution_observed = True
+            self.linearized_ancestors = ancestors
+        return self.linearized_ancestors
+
+    def compute_ancestors(self, include_singleton, include_self):
         if include_self:
             return [self] + self.included_modules
         else:
             return self.included_modules[:]
 
-    @jit.unroll_safe
     def is_ancestor_of(self, w_cls):
-        if self is w_cls:
-            return True
-        for w_mod in w_cls.included_modules:
-            if self is w_mod:
-                return True
-        if w_cls.superclass is not None:
-            return self.is_ancestor_of(w_cls.superclass)
-        return False
+        return w_cls._has_ancestor(self, w_cls.resolution_version)
+
+    @jit.elidable
+    def _has_ancestor(self, w_mod, version):
+        if self.ancestor_set is None:
+            ancestor_set = {}
+            for w_ancestor in self.ancestors():
+                ancestor_set[w_ancestor] = None
+            self.ancestor_set = ancestor_set
+        return w_mod in self.ancestor_set
 
     def include_module(self, space, w_mod):
         assert isinstance(w_mod, W_ModuleObject)
-        if w_mod not in self.ancestors():
+        if not w_mod.is_ancestor_of(self):
             self.included_modules = [w_mod] + self.included_modules
+            self.invalidate_resolution(space)
+            space.fromcache(ConstantState).changed()
+            space.fromcache(CaseDispatchState).module_included(space, self, w_mod)
             w_mod.included(space, self)
 
     def included(self, space, w_mod):
@@ -241,8 +543,10 @@ class W_ModuleObject(W_RootObject):
             space.send(self, space.newsymbol("included"), [w_mod])
 
     def extend_object(self, space, w_obj, w_mod):
-        if w_mod not in self.ancestors():
+        if not w_mod.is_ancestor_of(self):
             self.included_modules = [w_mod] + self.included_modules
+            self.invalidate_resolution(space)
+            space.fromcache(ConstantState).changed()
             w_mod.extended(space, w_obj, self)
 
     def extended(self, space, w_obj, w_mod):
@@ -266,7 +570,9 @@ class W_ModuleObject(W_RootObject):
 
     @classdef.singleton_method("allocate")
     def method_allocate(self, space):
-        return W_ModuleObject(space, None)
+        w_mod = W_ModuleObject(space, None)
+        space.fromcache(ModuleRegistry).register(w_mod)
+        return w_mod
 
     @classdef.method("to_s")
     def method_to_s(self, space):
@@ -332,7 +638,7 @@ class W_ModuleObject(W_RootObject):
     def method_module_function(self, space, args_w):
         for w_arg in args_w:
             name = space.symbol_w(w_arg)
-            self.attach_method(space, name, self._find_method_pure(space, name, self.version))
+            self.attach_method(space, name, self.find_local_method(space, name))
 
     @classdef.method("private_class_method")
     def method_private_class_method(self, space, w_name):
@@ -384,6 +690,20 @@ class W_ModuleObject(W_RootObject):
     def method_constants(self, space):
         return space.newarray([space.newsymbol(n) for n in self.constants_w])
 
+    @classdef.method("autoload", name="symbol", path="path")
+    def method_autoload(self, space, name, path):
+        if not path:
+            raise space.error(space.w_ArgumentError, "empty file name")
+        self.set_autoload(space, name, path)
+        return space.w_nil
+
+    @classdef.method("autoload?", name="symbol")
+    def method_autoloadp(self, space, name):
+        path = self.find_autoload(space, name)
+        if path is None:
+            return space.w_nil
+        return space.newstr_fromstr(path)
+
     @classdef.method("const_missing", name="symbol")
     def method_const_missing(self, space, name):
         raise space.error(space.w_NameError, "uninitialized constant %s" % name)
@@ -398,7 +718,8 @@ class W_ModuleObject(W_RootObject):
                 lineno = space.int_w(w_lineno)
             else:
                 lineno = 1
-            return space.execute(string, self, lexical_scope=StaticScope(self, None), filepath=filename, initial_lineno=lineno)
+            bc = space.compile_eval(string, filename, initial_lineno=lineno)
+            return space.execute_code(bc, w_self=self, lexical_scope=StaticScope(self, None))
         else:
             space.invoke_block(block.copy(w_self=self, lexical_scope=StaticScope(self, None)), [])
 
@@ -456,7 +777,7 @@ class W_ModuleObject(W_RootObject):
 
     @classdef.method("remove_method", name="symbol")
     def method_remove_method(self, space, name):
-        w_method = self._find_method_pure(space, name, self.version)
+        w_method = self.find_local_method(space, name)
         if w_method is None or isinstance(w_method, UndefMethod):
             cls_name = space.obj_to_s(self)
             raise space.error(space.w_NameError,
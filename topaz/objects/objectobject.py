@@ -3,6 +3,7 @@ import copy
 from rpython.rlib import jit
 from rpython.rlib.objectmodel import compute_unique_id, compute_identity_hash
 
+from topaz.allocationtracer import AllocationHooks
 from topaz.mapdict import MapTransitionCache
 from topaz.module import ClassDef
 from topaz.scope import StaticScope
@@ -99,7 +100,8 @@ class W_BaseObject(W_Root):
                 lineno = space.int_w(w_lineno)
             else:
                 lineno = 1
-            return space.execute(string, self, StaticScope(space.getclass(self), None), filename, lineno)
+            bc = space.compile_eval(string, filename, initial_lineno=lineno)
+            return space.execute_code(bc, w_self=self, lexical_scope=StaticScope(space.getclass(self), None))
         else:
             return space.invoke_block(block.copy(w_self=self), [])
 
@@ -199,6 +201,9 @@ class W_Object(W_RootObject):
             klass = space.getclassfor(self.__class__)
         self.map = space.fromcache(MapTransitionCache).get_class_node(klass)
         self.storage = None
+        hooks = space.fromcache(AllocationHooks)
+        if hooks.enabled:
+            hooks.allocated(space, self, klass)
 
     def __deepcopy__(self, memo):
         obj = super(W_Object, self).__deepcopy__(memo)
@@ -222,9 +227,12 @@ class W_Object(W_RootObject):
         assert not w_cls.is_singleton
         w_copy = space.newclass(w_cls.name, w_cls, is_singleton=True)
         w_copy.methods_w.update(w_other.methods_w)
-        w_copy.constants_w.update(w_other.constants_w)
+        for name, w_const in w_other.constants_w.iteritems():
+            w_copy.set_const(space, name, w_const)
         w_copy.included_modules = w_copy.included_modules + w_other.included_modules
-        w_copy.mutated()
+        for w_mod in w_other.included_modules:
+            w_mod.descendants.append(w_copy)
+        w_copy.invalidate_resolution(space)
 
         self.map = self.map.change_class(space, w_copy)
         return w_cls
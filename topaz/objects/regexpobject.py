@@ -75,19 +75,19 @@ class W_RegexpObject(W_Object):
 
     @staticmethod
     def _get_regexp_match(space):
-        return space.getexecutioncontext().regexp_match_cell.get(space, None, 0)
+        return space.getexecutioncontext().get_regexp_match(space)
 
     @staticmethod
     def _set_regexp_match(space, w_match):
         if (w_match is not space.w_nil and
             not space.is_kind_of(w_match, space.getclassfor(W_MatchDataObject))):
             raise space.error(space.w_TypeError, "wrong argument type %s (expected MatchData)" % space.getclass(w_match).name)
-        space.getexecutioncontext().regexp_match_cell.set(space, None, 0, w_match)
+        space.getexecutioncontext().set_regexp_match(space, w_match)
 
     @staticmethod
     def _create_regexp_match_getter(n):
         def getter(space):
-            w_match = space.getexecutioncontext().regexp_match_cell.get(space, None, 0)
+            w_match = space.getexecutioncontext().get_regexp_match(space)
             if w_match is None:
                 return space.w_nil
             else:
@@ -96,7 +96,7 @@ class W_RegexpObject(W_Object):
 
     @staticmethod
     def _get_last_match(space):
-        w_match = space.getexecutioncontext().regexp_match_cell.get(space, None, 0)
+        w_match = space.getexecutioncontext().get_regexp_match(space)
         if w_match is None:
             return space.w_nil
         else:
@@ -106,7 +106,7 @@ class W_RegexpObject(W_Object):
 
     @staticmethod
     def _get_pre_match(space):
-        w_match = space.getexecutioncontext().regexp_match_cell.get(space, None, 0)
+        w_match = space.getexecutioncontext().get_regexp_match(space)
         if w_match is None:
             return space.w_nil
         else:
@@ -114,7 +114,7 @@ class W_RegexpObject(W_Object):
 
     @staticmethod
     def _get_post_match(space):
-        w_match = space.getexecutioncontext().regexp_match_cell.get(space, None, 0)
+        w_match = space.getexecutioncontext().get_regexp_match(space)
         if w_match is None:
             return space.w_nil
         else:
@@ -0,0 +1,157 @@
+from topaz.module import ClassDef
+from topaz.objects.functionobject import W_UserFunction
+from topaz.objects.objectobject import W_Object
+from topaz.tracepoint import (ALL_EVENTS, EVENTS, EVENT_NAMES, EVENT_C_RETURN,
+    EVENT_RAISE, EVENT_RETURN, TracePointState)
+
+
+class W_TracePointObject(W_Object):
+    classdef = ClassDef("TracePoint", W_Object.classdef, filepath=__file__)
+
+    def __init__(self, space, klass=None):
+        W_Object.__init__(self, space, klass)
+        self.events = 0
+        self.block = None
+        self.enabled = False
+        self._clear_event()
+
+    def _clear_event(self):
+        self.event = 0
+        self.frame = None
+        self.w_self = None
+        self.w_func = None
+        self.w_value = None
+
+    def call(self, space, event, frame, w_self, w_func, w_value):
+        self.event = event
+        self.frame = frame
+        self.w_self = w_self
+        self.w_func = w_func
+        self.w_value = w_value
+        try:
+            space.invoke_block(self.block, [self])
+        finally:
+            self._clear_event()
+
+    def _check_event(self, space):
+        if not self.event:
+            raise space.error(space.w_RuntimeError, "access from outside")
+
+    @classdef.singleton_method("allocate")
+    def method_allocate(self, space, args_w):
+        return W_TracePointObject(space, self)
+
+    @classdef.singleton_method("trace")
+    def singleton_method_trace(self, space, args_w, block):
+        w_tracepoint = space.send(self, space.newsymbol("new"), args_w, block)
+        space.send(w_tracepoint, space.newsymbol("enable"))
+        return w_tracepoint
+
+    @classdef.method("initialize")
+    def method_initialize(self, space, args_w, block):
+        if block is None:
+            raise space.error(space.w_ArgumentError, "must be called with a block")
+        events = 0
+        for w_event in args_w:
+            name = space.symbol_w(w_event)
+            if name not in EVENTS:
+                raise space.error(space.w_ArgumentError, "unknown event: %s" % name)
+            events |= EVENTS[name]
+        if events == 0:
+            events = ALL_EVENTS
+        self.events = events
+        self.block = block
+
+    @classdef.method("enable")
+    def method_enable(self, space, block):
+        was_enabled = self.enabled
+        self.enabled = True
+        space.fromcache(TracePointState).enable(self)
+        if block is None:
+            return space.newbool(was_enabled)
+        try:
+            return space.invoke_block(block, [])
+        finally:
+            if not was_enabled:
+                space.send(self, space.newsymbol("disable"))
+
+    @classdef.method("disable")
+    def method_disable(self, space, block):
+        was_enabled = self.enabled
+        self.enabled = False
+        space.fromcache(TracePointState).disable(self)
+        if block is None:
+            return space.newbool(was_enabled)
+        try:
+            return space.invoke_block(block, [])
+        finally:
+            if was_enabled:
+                space.send(self, space.newsymbol("enable"))
+
+    @classdef.method("enabled?")
+    def method_enabledp(self, space):
+        return space.newbool(self.enabled)
+
+    @classdef.method("event")
+    def method_event(self, space):
+        self._check_event(space)
+        return space.newsymbol(EVENT_NAMES[self.event])
+
+    @classdef.method("path")
+    def method_path(self, space):
+        self._check_event(space)
+        if self.frame is None:
+            return space.w_nil
+        return space.newstr_fromstr(self.frame.get_filename())
+
+    @classdef.method("lineno")
+    def method_lineno(self, space):
+        self._check_event(space)
+        if self.frame is None:
+            return space.newint(0)
+        return space.newint(self.frame.get_lineno(None))
+
+    @classdef.method("method_id")
+    def method_method_id(self, space):
+        self._check_event(space)
+        if self.w_func is None:
+            return space.w_nil
+        return space.newsymbol(self.w_func.name)
+
+    @classdef.method("defined_class")
+    def method_defined_class(self, space):
+        self._check_event(space)
+        w_func = self.w_func
+        if w_func is None:
+            return space.w_nil
+        if w_func.w_class is not None:
+            return w_func.w_class
+        if isinstance(w_func, W_UserFunction) and w_func.lexical_scope is not None:
+            return w_func.lexical_scope.w_mod
+        return space.w_object
+
+    @classdef.method("self")
+    def method_self(self, space):
+        self._check_event(space)
+        return self.w_self
+
+    @classdef.method("return_value")
+    def method_return_value(self, space):
+        self._check_event(space)
+        if not self.event & (EVENT_RETURN | EVENT_C_RETURN):
+            raise space.error(space.w_RuntimeError, "not supported by this event")
+        return self.w_value
+
+    @classdef.method("raised_exception")
+    def method_raised_exception(self, space):
+        self._check_event(space)
+        if not self.event & EVENT_RAISE:
+            raise space.error(space.w_RuntimeError, "not supported by this event")
+        return self.w_value
+
+    @classdef.method("binding")
+    def method_binding(self, space):
+        self._check_event(space)
+        if self.frame is None:
+            return space.w_nil
+        return space.newbinding_fromframe(self.frame)
@@ -14,16 +14,22 @@ from rply.errors import ParsingError
 
 from topaz import system
 from topaz.astcompiler import CompilerContext, SymbolTable
+from topaz.callsite import ConstantState
+from topaz.casedispatch import CaseDispatchState
 from topaz.celldict import GlobalsDict
-from topaz.closure import ClosureCell
 from topaz.error import RubyError, print_traceback
+from topaz.evalcache import EvalCache
 from topaz.executioncontext import ExecutionContext, ExecutionContextHolder
 from topaz.frame import Frame
+from topaz.gateway import fixed_args_w
+from topaz.gcstats import GCStats
 from topaz.interpreter import Interpreter
 from topaz.lexer import LexerError, Lexer
 from topaz.module import ClassCache, ModuleCache
 from topaz.modules.comparable import Comparable
+from topaz.modules.coverage import Coverage
 from topaz.modules.enumerable import Enumerable
+from topaz.modules.gc import GC
 from topaz.modules.math import Math
 from topaz.modules.kernel import Kernel
 from topaz.modules.objectspace import ObjectSpace as ObjectSpaceModule
@@ -55,7 +61,7 @@ from topaz.objects.integerobject import W_IntegerObject
 from topaz.objects.intobject import W_FixnumObject
 from topaz.objects.ioobject import W_IOObject
 from topaz.objects.methodobject import W_MethodObject, W_UnboundMethodObject
-from topaz.objects.moduleobject import W_ModuleObject
+from topaz.objects.moduleobject import ModuleRegistry, W_ModuleObject
 from topaz.objects.nilobject import W_NilObject
 from topaz.objects.numericobject import W_NumericObject
 from topaz.objects.objectobject import W_Object, W_BaseObject, W_Root
@@ -67,10 +73,35 @@ from topaz.objects.stringobject import W_StringObject
 from topaz.objects.symbolobject import W_SymbolObject
 from topaz.objects.threadobject import W_ThreadObject
 from topaz.objects.timeobject import W_TimeObject
+from topaz.objects.tracepointobject import W_TracePointObject
 from topaz.parser import Parser
+from topaz.startupprofile import StartupProfile
 from topaz.utils.ll_file import isdir
 
 
+# The files in lib-topaz making up the kernel, in the order they are loaded.
+KERNEL_FILES = [
+    "array.rb",
+    "class.rb",
+    "comparable.rb",
+    "enumerable.rb",
+    "enumerator.rb",
+    "file.rb",
+    "fixnum.rb",
+    "hash.rb",
+    "integer.rb",
+    "io.rb",
+    "kernel.rb",
+    "numeric.rb",
+    "process.rb",
+    "range.rb",
+    "random.rb",
+    "string.rb",
+    "symbol.rb",
+    "top_self.rb",
+]
+
+
 class SpaceCache(Cache):
     def __init__(self, space):
         Cache.__init__(self)
@@ -90,6 +121,8 @@ class ObjectSpace(object):
         self.globals = GlobalsDict()
         self.bootstrap = True
         self.exit_handlers_w = []
+        self.optimize_bytecode = True
+        self.kernel_code = None
 
         self.w_true = W_TrueObject(self)
         self.w_false = W_FalseObject(self)
@@ -103,6 +136,8 @@ class ObjectSpace(object):
         self.w_class = self.getclassfor(W_ClassObject)
         # We replace the one reference to our FakeClass with the real class.
         self.w_basicobject.klass.superclass = self.w_class
+        self.w_class.descendants.append(self.w_basicobject.klass)
+        self.w_basicobject.klass.invalidate_resolution(self)
 
         self.w_symbol = self.getclassfor(W_SymbolObject)
         self.w_array = self.getclassfor(W_ArrayObject)
@@ -175,6 +210,7 @@ class ObjectSpace(object):
             self.getclassfor(W_RandomObject),
             self.getclassfor(W_ThreadObject),
             self.getclassfor(W_TimeObject),
+            self.getclassfor(W_TracePointObject),
             self.getclassfor(W_MethodObject),
             self.getclassfor(W_UnboundMethodObject),
             self.getclassfor(W_FiberObject),
@@ -183,7 +219,9 @@ class ObjectSpace(object):
             self.getclassfor(W_ThreadError),
 
             self.getmoduleobject(Comparable.moduledef),
+            self.getmoduleobject(Coverage.moduledef),
             self.getmoduleobject(Enumerable.moduledef),
+            self.getmoduleobject(GC.moduledef),
             self.getmoduleobject(Math.moduledef),
             self.getmoduleobject(Process.moduledef),
             self.getmoduleobject(Signal.moduledef),
@@ -242,6 +280,7 @@ class ObjectSpace(object):
         """
         Performs runtime setup.
         """
+        self.fromcache(GCStats).setup()
         path = rpath.rabspath(self.find_executable(executable))
         # Fallback to a path relative to the compiled location.
         lib_path = self.base_lib_path
@@ -253,14 +292,37 @@ class ObjectSpace(object):
                 kernel_path = os.path.join(path, "lib-topaz")
                 break
         self.send(self.w_load_path, self.newsymbol("unshift"), [self.newstr_fromstr(lib_path)])
-        self.load_kernel(kernel_path)
+        with self.fromcache(StartupProfile).measure("kernel"):
+            self.load_kernel(kernel_path)
 
     def load_kernel(self, kernel_path):
-        self.send(
-            self.w_kernel,
-            self.newsymbol("load"),
-            [self.newstr_fromstr(os.path.join(kernel_path, "bootstrap.rb"))]
-        )
+        if self.kernel_code is not None:
+            for bc in self.kernel_code:
+                with self.fromcache(StartupProfile).measure("run", bc.filepath):
+                    self.execute_code(bc)
+        else:
+            for filename in KERNEL_FILES:
+                self.send(
+                    self.w_kernel,
+                    self.newsymbol("load"),
+                    [self.newstr_fromstr(os.path.join(kernel_path, filename))]
+                )
+        self.fromcache(CaseDispatchState).kernel_loaded(self)
+
+    def prebuild_kernel(self):
+        """
+        Compiles the kernel ahead of time, this is done during translation so
+        the code objects are part of the executable, and load_kernel runs them
+        instead of loading lib-topaz from disk.
+        """
+        kernel_path = os.path.join(os.path.dirname(self.base_lib_path), "lib-topaz")
+        kernel_code = []
+        for filename in KERNEL_FILES:
+            path = os.path.join(kernel_path, filename)
+            with open(path) as f:
+                source = f.read()
+            kernel_code.append(self.compile(source, path))
+        self.kernel_code = kernel_code
 
     @specialize.memo()
     def fromcache(self, key):
@@ -268,12 +330,20 @@ class ObjectSpace(object):
 
     # Methods for dealing with source code.
 
-    def parse(self, source, initial_lineno=1, symtable=None):
+    def parse(self, source, initial_lineno=1, symtable=None, filepath=""):
         if symtable is None:
             symtable = SymbolTable()
-        parser = Parser(Lexer(source, initial_lineno=initial_lineno, symtable=symtable))
+        profile = self.fromcache(StartupProfile)
+        parser = Parser(Lexer(source, initial_lineno=initial_lineno, symtable=symtable), profile.enabled)
+        measurement = profile.measure("parse", filepath)
         try:
-            return parser.parse().getast()
+            with measurement:
+                try:
+                    return parser.parse().getast()
+                finally:
+                    if profile.enabled:
+                        measurement.exclude(parser.lex_time)
+                        profile.add("lex", filepath, parser.lex_time, 0)
         except ParsingError as e:
             source_pos = e.getsourcepos()
             if source_pos is not None:
@@ -287,15 +357,23 @@ class ObjectSpace(object):
     def compile(self, source, filepath, initial_lineno=1, symtable=None):
         if symtable is None:
             symtable = SymbolTable()
-        astnode = self.parse(source, initial_lineno=initial_lineno, symtable=symtable)
-        ctx = CompilerContext(self, "<main>", symtable, filepath)
-        with ctx.set_lineno(initial_lineno):
+        astnode = self.parse(source, initial_lineno=initial_lineno, symtable=symtable, filepath=filepath)
+        with self.fromcache(StartupProfile).measure("compile", filepath):
+            ctx = CompilerContext(self, "<main>", symtable, filepath, self.optimize_bytecode)
             astnode.compile(ctx)
-        return ctx.create_bytecode([], [], None, None)
+            return ctx.create_bytecode([], [], None, None)
+
+    def compile_eval(self, source, filepath, initial_lineno=1, names=None):
+        if names is None:
+            names = []
+        return self.fromcache(EvalCache).compile(self, source, filepath, initial_lineno, names)
 
     def execute(self, source, w_self=None, lexical_scope=None, filepath="-e",
                 initial_lineno=1):
         bc = self.compile(source, filepath, initial_lineno=initial_lineno)
+        return self.execute_code(bc, w_self=w_self, lexical_scope=lexical_scope)
+
+    def execute_code(self, bc, w_self=None, lexical_scope=None):
         frame = self.create_frame(bc, w_self=w_self, lexical_scope=lexical_scope)
         with self.getexecutioncontext().visit_frame(frame):
             return self.execute_frame(frame, bc)
@@ -313,8 +391,6 @@ class ObjectSpace(object):
 
         if w_self is None:
             w_self = self.w_top_self
-        if regexp_match_cell is None:
-            regexp_match_cell = ClosureCell(None)
         return Frame(jit.promote(bc), w_self, lexical_scope, block, parent_interp, regexp_match_cell)
 
     def execute_frame(self, frame, bc):
@@ -386,7 +462,9 @@ class ObjectSpace(object):
 
     def newmodule(self, name, w_scope=None):
         complete_name = self.buildname(name, w_scope)
-        return W_ModuleObject(self, complete_name)
+        w_mod = W_ModuleObject(self, complete_name)
+        self.fromcache(ModuleRegistry).register(w_mod)
+        return w_mod
 
     def newclass(self, name, superclass, is_singleton=False, w_scope=None):
         complete_name = self.buildname(name, w_scope)
@@ -416,7 +494,7 @@ class ObjectSpace(object):
         names = frame.bytecode.cellvars + frame.bytecode.freevars
         cells = [None] * len(frame.cells)
         for i in xrange(len(frame.cells)):
-            cells[i] = frame.cells[i].upgrade_to_closure(self, frame, i)
+            cells[i] = frame.upgrade_to_closure(self, i)
         return W_BindingObject(self, names, cells, frame.w_self, frame.lexical_scope)
 
     @jit.unroll_safe
@@ -498,6 +576,22 @@ class ObjectSpace(object):
             w_res = self.send(w_module, self.newsymbol("const_missing"), [self.newsymbol(name)])
         return w_res
 
+    def find_const_from_site(self, bytecode, pc, w_module, name):
+        # Like the call site caches, these only speed up the interpreter.
+        if jit.we_are_jitted():
+            return self.find_const(w_module, name)
+        cache = bytecode.call_sites.get_constant(pc)
+        serial = self.fromcache(ConstantState).serial
+        if cache.serial == serial and cache.w_scope is w_module:
+            return cache.w_value
+        w_res = w_module.find_const(self, name)
+        if w_res is None:
+            return self.send(w_module, self.newsymbol("const_missing"), [self.newsymbol(name)])
+        cache.serial = serial
+        cache.w_scope = w_module
+        cache.w_value = w_res
+        return w_res
+
     @jit.elidable
     def _check_const_name(self, name):
         valid = name[0].isupper()
@@ -516,8 +610,29 @@ class ObjectSpace(object):
         self._check_const_name(name)
         module.set_const(self, name, w_value)
 
-    @jit.unroll_safe
     def find_lexical_const(self, lexical_scope, name):
+        w_res = self.lookup_lexical_const(lexical_scope, name)
+        if w_res is None:
+            w_res = self._lexical_const_missing(lexical_scope, name)
+        return w_res
+
+    def find_lexical_const_from_site(self, bytecode, pc, lexical_scope, name):
+        if jit.we_are_jitted():
+            return self.find_lexical_const(lexical_scope, name)
+        cache = bytecode.call_sites.get_constant(pc)
+        serial = self.fromcache(ConstantState).serial
+        if cache.serial == serial and cache.lexical_scope is lexical_scope:
+            return cache.w_value
+        w_res = self.lookup_lexical_const(lexical_scope, name)
+        if w_res is None:
+            return self._lexical_const_missing(lexical_scope, name)
+        cache.serial = serial
+        cache.lexical_scope = lexical_scope
+        cache.w_value = w_res
+        return w_res
+
+    @jit.unroll_safe
+    def lookup_lexical_const(self, lexical_scope, name):
         w_res = None
         scope = lexical_scope
         while scope is not None:
@@ -530,14 +645,15 @@ class ObjectSpace(object):
             w_res = lexical_scope.w_mod.find_const(self, name)
         if w_res is None:
             w_res = self.w_object.find_const(self, name)
-        if w_res is None:
-            if lexical_scope is not None:
-                w_mod = lexical_scope.w_mod
-            else:
-                w_mod = self.w_object
-            w_res = self.send(w_mod, self.newsymbol("const_missing"), [self.newsymbol(name)])
         return w_res
 
+    def _lexical_const_missing(self, lexical_scope, name):
+        if lexical_scope is not None:
+            w_mod = lexical_scope.w_mod
+        else:
+            w_mod = self.w_object
+        return self.send(w_mod, self.newsymbol("const_missing"), [self.newsymbol(name)])
+
     def find_instance_var(self, w_obj, name):
         w_res = w_obj.find_instance_var(self, name)
         return w_res if w_res is not None else self.w_nil
@@ -565,6 +681,41 @@ class ObjectSpace(object):
         raw_method = w_cls.find_method_super(self, name)
         return self._send_raw(w_method, raw_method, w_receiver, w_cls, args_w, block)
 
+    def send_from_site(self, bytecode, pc, w_receiver, w_method, args_w, block=None):
+        # The call site caches only speed up the interpreter, inside the JIT
+        # method lookups are constant folded anyway.
+        if jit.we_are_jitted():
+            return self.send(w_receiver, w_method, args_w, block)
+        name = self.symbol_w(w_method)
+
+        w_cls = self.getclass(w_receiver)
+        raw_method = bytecode.call_sites.get(pc).find_method(self, w_cls, name)
+        return self._send_raw(w_method, raw_method, w_receiver, w_cls, args_w, block)
+
+    def send_fixed_from_site(self, bytecode, pc, w_receiver, w_method, num_args,
+                             w_arg0, w_arg1, w_arg2, block=None):
+        """
+        Like send_from_site, for at most MAX_FIXED_ARGS arguments, which are
+        only put in a list if the method can't take them directly.
+        """
+        name = self.symbol_w(w_method)
+        w_cls = self.getclass(w_receiver)
+        if jit.we_are_jitted():
+            raw_method = w_cls.find_method(self, name)
+        else:
+            raw_method = bytecode.call_sites.get(pc).find_method(self, w_cls, name)
+        if raw_method is None:
+            args_w = fixed_args_w(num_args, w_arg0, w_arg1, w_arg2)
+            return self._send_raw(w_method, raw_method, w_receiver, w_cls, args_w, block)
+        return raw_method.call_fixed(self, w_receiver, num_args, w_arg0, w_arg1, w_arg2, block)
+
+    def send_super_from_site(self, bytecode, pc, w_cls, w_receiver, w_method, args_w, block=None):
+        if jit.we_are_jitted():
+            return self.send_super(w_cls, w_receiver, w_method, args_w, block)
+        name = self.symbol_w(w_method)
+        raw_method = bytecode.call_sites.get(pc).find_method_super(self, w_cls, name)
+        return self._send_raw(w_method, raw_method, w_receiver, w_cls, args_w, block)
+
     def _send_raw(self, w_method, raw_method, w_receiver, w_cls, args_w, block):
         if raw_method is None:
             method_missing = w_cls.find_method(self, "method_missing")
@@ -579,19 +730,46 @@ class ObjectSpace(object):
         raw_method = w_cls.find_method(self, name)
         return raw_method is not None
 
+    def respond_to_from_site(self, bytecode, pc, w_receiver, w_method):
+        if jit.we_are_jitted():
+            return self.respond_to(w_receiver, w_method)
+        name = self.symbol_w(w_method)
+        w_cls = self.getclass(w_receiver)
+        raw_method = bytecode.call_sites.get(pc).find_method(self, w_cls, name)
+        return raw_method is not None
+
     def is_kind_of(self, w_obj, w_cls):
         return w_obj.is_kind_of(self, w_cls)
 
     @jit.unroll_safe
     def invoke_block(self, block, args_w, block_arg=None):
         bc = block.bytecode
-        frame = self.create_frame(
-            bc, w_self=block.w_self, lexical_scope=block.lexical_scope,
+        frame = self._create_block_frame(block)
+        if len(bc.arg_pos) != 0 or bc.splat_arg_pos != -1 or bc.block_arg_pos != -1:
+            frame.handle_block_args(self, bc, args_w, block_arg)
+        return self._execute_block_frame(block, frame)
+
+    def invoke_block_fixed(self, block, num_args, w_arg0, w_arg1, w_arg2, block_arg=None):
+        """
+        Like invoke_block, for at most MAX_FIXED_ARGS arguments, which are only
+        put in a list if the block's parameters don't match them exactly.
+        """
+        bc = block.bytecode
+        frame = self._create_block_frame(block)
+        if len(bc.arg_pos) != 0 or bc.splat_arg_pos != -1 or bc.block_arg_pos != -1:
+            frame.handle_fixed_block_args(self, bc, num_args, w_arg0, w_arg1, w_arg2, block_arg)
+        return self._execute_block_frame(block, frame)
+
+    def _create_block_frame(self, block):
+        return self.create_frame(
+            block.bytecode, w_self=block.w_self, lexical_scope=block.lexical_scope,
             block=block.block, parent_interp=block.parent_interp,
             regexp_match_cell=block.regexp_match_cell,
         )
-        if len(bc.arg_pos) != 0 or bc.splat_arg_pos != -1 or bc.block_arg_pos != -1:
-            frame.handle_block_args(self, bc, args_w, block_arg)
+
+    @jit.unroll_safe
+    def _execute_block_frame(self, block, frame):
+        bc = block.bytecode
         assert len(block.cells) == len(bc.freevars)
         for i in xrange(len(bc.freevars)):
             frame.cells[len(bc.cellvars) + i] = block.cells[i]
@@ -1,3 +1,5 @@
+import time
+
 from rpython.rlib.objectmodel import specialize
 from rpython.rlib.rbigint import rbigint
 
@@ -10,12 +12,17 @@ from topaz.utils import regexp
 
 
 class Parser(object):
-    def __init__(self, lexer):
+    def __init__(self, lexer, timed=False):
         self.lexer = lexer
+        self.timed = timed
+        self.lex_time = 0.0
 
     def parse(self):
-        l = LexerWrapper(self.lexer.tokenize())
-        return self.parser.parse(l, state=self)
+        l = LexerWrapper(self.lexer.tokenize(), self.timed)
+        try:
+            return self.parser.parse(l, state=self)
+        finally:
+            self.lex_time = l.elapsed
 
     def error(self, msg):
         # TODO: this should use a real SourcePosition
@@ -1724,7 +1731,8 @@ class Parser(object):
             p[3].getargs(),
             p[3].getsplatarg(),
             p[3].getblockarg(),
-            body
+            body,
+            p[0].getsourcepos().lineno
         )
         self.save_and_pop_scope(node)
         return BoxAST(node)
@@ -1739,6 +1747,7 @@ class Parser(object):
             p[7].getsplatarg(),
             p[7].getblockarg(),
             body,
+            p[0].getsourcepos().lineno,
         )
         self.save_and_pop_scope(node)
         return BoxAST(node)
@@ -2871,10 +2880,22 @@ class Parser(object):
 
 
 class LexerWrapper(object):
-    def __init__(self, lexer):
+    def __init__(self, lexer, timed=False):
         self.lexer = lexer
+        # The lexer runs interleaved with the parser, so the time spent
+        # lexing can only be measured token by token.
+        self.timed = timed
+        self.elapsed = 0.0
 
     def next(self):
+        if self.timed:
+            start = time.time()
+            token = self._next()
+            self.elapsed += time.time() - start
+            return token
+        return self._next()
+
+    def _next(self):
         try:
             return self.lexer.next()
         except StopIteration:
@@ -0,0 +1,192 @@
+import time
+
+from rpython.rlib import jit
+from rpython.rlib.listsort import make_timsort_class
+
+from topaz.utils.reporting import format_ms, rjust
+
+
+def _seconds_gt(a, b):
+    return a[0] > b[0]
+
+
+def _node_gt(a, b):
+    return a.seconds > b.seconds
+
+# Most seconds first, equal items keep their order: (seconds, label) pairs
+# and ProfileNodes.
+SecondsSorter = make_timsort_class(lt=_seconds_gt)
+NodeSorter = make_timsort_class(lt=_node_gt)
+
+
+class ProfileStack(object):
+    def __init__(self, frames):
+        # Outermost frame first.
+        self.frames = frames
+        self.samples = 0
+        self.seconds = 0.0
+
+
+class ProfileNode(object):
+    def __init__(self, label):
+        self.label = label
+        self.seconds = 0.0
+        self.children = []
+        self.children_by_label = {}
+
+    def child(self, label):
+        node = self.children_by_label.get(label, None)
+        if node is None:
+            node = self.children_by_label[label] = ProfileNode(label)
+            self.children.append(node)
+        return node
+
+
+class SamplingProfiler(object):
+    """
+    A sampling profiler. The interpreter ticks it when it enters a frame and
+    on every backward jump; every check_ticks ticks it looks at the clock,
+    and once interval seconds have passed it records the frame stack of the
+    current execution context, weighted by the time since the last sample.
+    Disabled it costs a check of a quasi-immutable flag, enabled the tick is
+    traced like the rest of the loop, so it runs with the JIT on.
+    """
+
+    _immutable_fields_ = ["enabled?"]
+
+    DEFAULT_INTERVAL = 0.001
+    CHECK_TICKS = 1000
+    MAX_DEPTH = 256
+
+    def __init__(self, space):
+        self.enabled = False
+        self.interval = self.DEFAULT_INTERVAL
+        self.check_ticks = self.CHECK_TICKS
+        self.ticker = 0
+        self.last_sample = 0.0
+        self.clear()
+
+    def clear(self):
+        self.samples = 0
+        self.seconds = 0.0
+        self.stacks = []
+        self.stacks_by_key = {}
+
+    def start(self, interval):
+        self.clear()
+        self.interval = interval
+        self.ticker = self.check_ticks
+        self.last_sample = time.time()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def tick(self, space):
+        self.ticker -= 1
+        if self.ticker <= 0:
+            self.ticker = self.check_ticks
+            self.check_clock(space)
+
+    @jit.dont_look_inside
+    def check_clock(self, space):
+        now = time.time()
+        if now - self.last_sample >= self.interval:
+            self.sample(space, now - self.last_sample)
+            self.last_sample = now
+
+    def sample(self, space, seconds):
+        frames = []
+        frame = space.getexecutioncontext().gettopframe()
+        prev_frame = None
+        while frame is not None and frame.has_contents() and len(frames) < self.MAX_DEPTH:
+            frames.append("%s (%s:%d)" % (
+                frame.get_code_name(), frame.get_filename(), frame.get_lineno(prev_frame)
+            ))
+            prev_frame = frame
+            frame = frame.backref()
+        if not frames:
+            return
+        frames.reverse()
+        key = ";".join(frames)
+        stack = self.stacks_by_key.get(key, None)
+        if stack is None:
+            stack = self.stacks_by_key[key] = ProfileStack(frames)
+            self.stacks.append(stack)
+        stack.samples += 1
+        stack.seconds += seconds
+        self.samples += 1
+        self.seconds += seconds
+
+    def _header(self):
+        return "profile: %d samples, %s ms\n" % (self.samples, format_ms(self.seconds))
+
+    def _percent(self, seconds):
+        if self.seconds == 0.0:
+            return "0.0%"
+        return "%s%%" % (int(seconds / self.seconds * 1000) / 10.0)
+
+    def report_flat(self):
+        labels = []
+        self_seconds = {}
+        total_seconds = {}
+        for stack in self.stacks:
+            seen = {}
+            for label in stack.frames:
+                if label in seen:
+                    continue
+                seen[label] = None
+                if label not in total_seconds:
+                    labels.append(label)
+                    total_seconds[label] = 0.0
+                    self_seconds[label] = 0.0
+                total_seconds[label] += stack.seconds
+            self_seconds[stack.frames[-1]] += stack.seconds
+        entries = [(self_seconds[label], label) for label in labels]
+        SecondsSorter(entries).sort()
+        lines = [
+            self._header(),
+            "%s %s %s  %s\n" % (rjust("self ms", 10), rjust("self", 6), rjust("total ms", 10), "function"),
+        ]
+        for _, label in entries:
+            lines.append("%s %s %s  %s\n" % (
+                rjust(format_ms(self_seconds[label]), 10),
+                rjust(self._percent(self_seconds[label]), 6),
+                rjust(format_ms(total_seconds[label]), 10),
+                label
+            ))
+        return "".join(lines)
+
+    def report_tree(self):
+        root = ProfileNode("")
+        for stack in self.stacks:
+            node = root
+            for label in stack.frames:
+                node = node.child(label)
+                node.seconds += stack.seconds
+        lines = [
+            self._header(),
+            "%s %s  %s\n" % (rjust("total ms", 10), rjust("total", 6), "call tree"),
+        ]
+        self._report_node(lines, root, 0)
+        return "".join(lines)
+
+    def _report_node(self, lines, node, depth):
+        children = node.children[:]
+        NodeSorter(children).sort()
+        for child in children:
+            lines.append("%s %s  %s%s\n" % (
+                rjust(format_ms(child.seconds), 10),
+                rjust(self._percent(child.seconds), 6),
+                "  " * depth, child.label
+            ))
+            self._report_node(lines, child, depth + 1)
+
+    def report_collapsed(self):
+        # The input format of flamegraph.pl: the stack, outermost frame
+        # first, then the number of samples.
+        lines = []
+        for stack in self.stacks:
+            lines.append("%s %d\n" % (";".join(stack.frames), stack.samples))
+        return "".join(lines)
+
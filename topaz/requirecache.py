@@ -0,0 +1,105 @@
+import os
+
+from topaz.coerce import Coerce
+from topaz.objects.stringobject import W_StringObject
+
+
+class LoadedFeatures(object):
+    """
+    A set of the paths in $LOADED_FEATURES, so require doesn't have to scan
+    the array. $LOADED_FEATURES is an ordinary array Ruby code can modify,
+    so the set remembers the array's mutation count it was built at and is
+    rebuilt once the array has changed.
+    """
+
+    def __init__(self, space):
+        self.w_features = None
+        self.mutations = 0
+        self.paths = {}
+
+    def _sync(self, space):
+        w_features = space.w_loaded_features
+        if w_features is self.w_features and w_features.mutations == self.mutations:
+            return
+        self.w_features = w_features
+        self.mutations = w_features.mutations
+        self.paths = {}
+        for w_item in w_features.listview(space):
+            if isinstance(w_item, W_StringObject):
+                self.paths[space.str_w(w_item)] = None
+
+    def include(self, space, path):
+        self._sync(space)
+        return path in self.paths
+
+    def add(self, space, path):
+        self._sync(space)
+        w_features = space.w_loaded_features
+        w_features.method_lshift(space, space.newstr_fromstr(path))
+        self.mutations = w_features.mutations
+        self.paths[path] = None
+
+
+class DirectoryListing(object):
+    def __init__(self, mtime, names):
+        self.mtime = mtime
+        self.names = names
+
+
+class LoadPathCache(object):
+    """
+    Resolves feature names against $LOAD_PATH without looking for every
+    candidate file on the disk. Each directory along the load path is listed
+    once and its listing is kept with the directory's modification time. A
+    lookup only stats the directories it walks through and lists again the
+    ones whose time changed, so a file created in an earlier directory
+    still takes precedence over one found before.
+    """
+
+    def __init__(self, space):
+        self.load_path_w = []
+        self.load_path = []
+        self.listings = {}
+
+    def _sync(self, space):
+        load_path_w = space.listview(space.w_load_path)
+        if len(load_path_w) == len(self.load_path_w):
+            for i in xrange(len(load_path_w)):
+                w_base = load_path_w[i]
+                if w_base is not self.load_path_w[i]:
+                    break
+                if (isinstance(w_base, W_StringObject) and
+                        space.str_w(w_base) != self.load_path[i]):
+                    break
+            else:
+                return
+        self.load_path_w = load_path_w[:]
+        self.load_path = [Coerce.path(space, w_base) for w_base in load_path_w]
+
+    def _listing(self, dirname):
+        try:
+            mtime = os.stat(dirname).st_mtime
+        except OSError:
+            return None
+        listing = self.listings.get(dirname, None)
+        if listing is None or listing.mtime != mtime:
+            names = {}
+            try:
+                for name in os.listdir(dirname):
+                    names[name] = None
+            except OSError:
+                pass
+            listing = DirectoryListing(mtime, names)
+            self.listings[dirname] = listing
+        return listing.names
+
+    def find(self, space, path):
+        self._sync(space)
+        dirname, name = os.path.split(path)
+        for base in self.load_path:
+            names = self._listing(os.path.join(base, dirname))
+            if names is not None and name in names:
+                full = os.path.join(base, path)
+                if os.path.isfile(full):
+                    return full
+        return None
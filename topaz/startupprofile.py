@@ -0,0 +1,135 @@
+import time
+
+from rpython.rlib.listsort import make_timsort_class
+
+from topaz.utils.reporting import format_ms, json_str, ljust, rjust
+
+
+class StartupPhase(object):
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.seconds = 0.0
+        self.allocations = 0
+
+
+def _phase_gt(a, b):
+    return a.seconds > b.seconds
+
+# Most seconds first, equal phases keep their order.
+PhaseSorter = make_timsort_class(lt=_phase_gt)
+
+
+class StartupProfile(object):
+    """
+    Records the wall time and the number of objects allocated by each phase
+    of the startup (setup, the kernel, parsing the command line) and of
+    every file loaded (read, lex, parse, compile, run). It's enabled by
+    --startup-profile, disabled it costs a check of a quasi-immutable flag.
+    Phases nest, the time of a file's run includes the files it requires.
+    """
+
+    _immutable_fields_ = ["enabled?", "hooks"]
+
+    def __init__(self, space):
+        from topaz.allocationtracer import AllocationHooks
+
+        self.enabled = False
+        self.hooks = space.fromcache(AllocationHooks)
+        self.start_time = 0.0
+        self.allocations = 0
+        self.phases = []
+        self.phases_by_key = {}
+
+    def enable(self):
+        self.enabled = True
+        self.hooks.counting = True
+        self.hooks.update()
+        self.start_time = time.time()
+
+    def measure(self, name, path=""):
+        if not self.enabled:
+            return NULL_MEASUREMENT
+        return _Measurement(self, name, path)
+
+    def add(self, name, path, seconds, allocations):
+        key = name + "\0" + path
+        phase = self.phases_by_key.get(key, None)
+        if phase is None:
+            phase = self.phases_by_key[key] = StartupPhase(name, path)
+            self.phases.append(phase)
+        phase.seconds += seconds
+        phase.allocations += allocations
+
+    def sorted_phases(self):
+        phases = self.phases[:]
+        PhaseSorter(phases).sort()
+        return phases
+
+    def report(self):
+        lines = [
+            "startup profile: %s ms, %d allocations\n" % (
+                format_ms(time.time() - self.start_time), self.allocations
+            ),
+            "%s %s  %s %s\n" % (
+                rjust("ms", 10), rjust("allocations", 12), ljust("phase", 10), "file"
+            ),
+        ]
+        for phase in self.sorted_phases():
+            lines.append("%s %s  %s %s\n" % (
+                rjust(format_ms(phase.seconds), 10), rjust(str(phase.allocations), 12),
+                ljust(phase.name, 10), phase.path
+            ))
+        return "".join(lines)
+
+    def report_json(self):
+        phases = []
+        for phase in self.sorted_phases():
+            phases.append('{"phase": %s, "file": %s, "ms": %s, "allocations": %d}' % (
+                json_str(phase.name), json_str(phase.path),
+                format_ms(phase.seconds), phase.allocations
+            ))
+        return '{"ms": %s, "allocations": %d, "phases": [\n%s\n]}\n' % (
+            format_ms(time.time() - self.start_time), self.allocations,
+            ",\n".join(phases)
+        )
+
+
+class _Measurement(object):
+    def __init__(self, profile, name, path):
+        self.profile = profile
+        self.name = name
+        self.path = path
+        self.excluded = 0.0
+
+    def exclude(self, seconds):
+        self.excluded += seconds
+
+    def __enter__(self):
+        self.start_time = time.time()
+        self.start_allocations = self.profile.allocations
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.profile.add(
+            self.name,
+            self.path,
+            time.time() - self.start_time - self.excluded,
+            self.profile.allocations - self.start_allocations,
+        )
+
+
+class _NullMeasurement(_Measurement):
+    def __init__(self):
+        pass
+
+    def exclude(self, seconds):
+        pass
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, tb):
+        pass
+
+NULL_MEASUREMENT = _NullMeasurement()
+
@@ -0,0 +1,79 @@
+"""
+Compares two heap dumps written by ObjectSpace.dump_all and reports, for each
+class, how much its objects grew between them, the largest growth first:
+
+    python -m topaz.tools.heapdiff before.json after.json
+
+The retained columns are about the objects of the second dump which weren't
+in the first one, the ones allocated in between and still alive.
+"""
+
+import json
+import sys
+
+
+class ClassStats(object):
+    def __init__(self):
+        self.count = 0
+        self.size = 0
+
+
+def load(path):
+    objects = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                obj = json.loads(line)
+                objects[obj["address"]] = obj
+    return objects
+
+
+def aggregate(objects, addresses=None):
+    stats = {}
+    for address, obj in objects.iteritems():
+        if addresses is not None and address not in addresses:
+            continue
+        cls_stats = stats.setdefault(obj["class"], ClassStats())
+        cls_stats.count += 1
+        cls_stats.size += obj["size"]
+    return stats
+
+
+def diff(before, after):
+    """
+    Returns (class, count delta, size delta, retained count, retained size)
+    for every class of either dump, sorted by decreasing size delta.
+    """
+    stats_before = aggregate(before)
+    stats_after = aggregate(after)
+    stats_retained = aggregate(after, set(after) - set(before))
+    empty = ClassStats()
+    rows = []
+    for name in set(stats_before) | set(stats_after):
+        old = stats_before.get(name, empty)
+        new = stats_after.get(name, empty)
+        retained = stats_retained.get(name, empty)
+        rows.append((name, new.count - old.count, new.size - old.size, retained.count, retained.size))
+    rows.sort(key=lambda row: (-row[2], -row[1], row[0]))
+    return rows
+
+
+def report(rows, out, limit=None):
+    out.write("%12s %10s %12s %10s  %s\n" % ("size delta", "count", "retained", "objects", "class"))
+    changed = [row for row in rows if row[1] or row[2] or row[3]]
+    for name, count, size, retained_count, retained_size in changed[:limit]:
+        out.write("%+12d %+10d %12d %10d  %s\n" % (size, count, retained_size, retained_count, name))
+
+
+def main(argv):
+    if len(argv) not in (2, 3):
+        sys.stderr.write("usage: heapdiff.py before.json after.json [limit]\n")
+        return 1
+    limit = int(argv[2]) if len(argv) == 3 else None
+    report(diff(load(argv[0]), load(argv[1])), sys.stdout, limit)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,75 @@
+from rpython.rlib import jit
+
+
+EVENT_LINE = 1 << 0
+EVENT_CALL = 1 << 1
+EVENT_RETURN = 1 << 2
+EVENT_C_CALL = 1 << 3
+EVENT_C_RETURN = 1 << 4
+EVENT_RAISE = 1 << 5
+EVENT_CLASS = 1 << 6
+EVENT_END = 1 << 7
+
+EVENTS = {
+    "line": EVENT_LINE,
+    "call": EVENT_CALL,
+    "return": EVENT_RETURN,
+    "c_call": EVENT_C_CALL,
+    "c_return": EVENT_C_RETURN,
+    "raise": EVENT_RAISE,
+    "class": EVENT_CLASS,
+    "end": EVENT_END,
+}
+EVENT_NAMES = dict((event, name) for name, event in EVENTS.iteritems())
+ALL_EVENTS = (1 << len(EVENTS)) - 1
+
+
+class TracePointState(object):
+    """
+    The enabled TracePoints, and the union of the events they subscribe to.
+    Every place that can emit an event first checks its bit in the
+    quasi-immutable events, so an event nobody traces costs nothing once
+    jitted and a bit test otherwise. Only line events look at the line
+    numbers, and only while some TracePoint wants them.
+    """
+
+    _immutable_fields_ = ["events?"]
+
+    def __init__(self, space):
+        self.events = 0
+        self.tracepoints_w = []
+        self.in_callback = False
+
+    def enable(self, w_tracepoint):
+        if w_tracepoint not in self.tracepoints_w:
+            self.tracepoints_w.append(w_tracepoint)
+            self._update_events()
+
+    def disable(self, w_tracepoint):
+        if w_tracepoint in self.tracepoints_w:
+            self.tracepoints_w.remove(w_tracepoint)
+            self._update_events()
+
+    def _update_events(self):
+        events = 0
+        for w_tracepoint in self.tracepoints_w:
+            events |= w_tracepoint.events
+        self.events = events
+
+    @jit.dont_look_inside
+    def fire(self, space, event, frame, w_self, w_func=None, w_value=None):
+        """
+        Calls every enabled TracePoint subscribed to event. Nothing is
+        computed up front, the TracePoint reads what it's asked for from
+        the frame, the receiver and the function for as long as its block
+        runs.
+        """
+        if self.in_callback:
+            return
+        self.in_callback = True
+        try:
+            for w_tracepoint in self.tracepoints_w[:]:
+                if w_tracepoint.events & event:
+                    w_tracepoint.call(space, event, frame, w_self, w_func, w_value)
+        finally:
+            self.in_callback = False
@@ -0,0 +1,135 @@
+from rpython.rlib import rposix
+from rpython.rtyper.lltypesystem import rffi, lltype
+from rpython.translator.tool.cbuild import ExternalCompilationInfo
+
+from topaz.system import IS_WINDOWS
+
+
+MAX_FDS = 16
+
+
+# Passing file descriptors needs unix sockets, there's nothing to define on
+# Windows, where the fork server isn't available.
+if not IS_WINDOWS:
+    eci = ExternalCompilationInfo(
+        includes=["sys/types.h", "sys/socket.h"],
+        post_include_bits=[
+            "RPY_EXTERN long topaz_send_fds(int, char *, long, int *, int);",
+            "RPY_EXTERN long topaz_recv_fds(int, char *, long, int *, int *);",
+        ],
+        separate_module_sources=["""
+#include <string.h>
+#include <sys/types.h>
+#include <sys/socket.h>
+#include <sys/uio.h>
+
+#define TOPAZ_MAX_FDS %(max_fds)d
+
+union topaz_cmsg_buf {
+    struct cmsghdr align;
+    char buf[CMSG_SPACE(sizeof(int) * TOPAZ_MAX_FDS)];
+};
+
+RPY_EXTERN long topaz_send_fds(int sock, char *data, long len, int *fds, int nfds) {
+    struct msghdr msg;
+    struct iovec iov;
+    union topaz_cmsg_buf control;
+    struct cmsghdr *cmsg;
+
+    memset(&msg, 0, sizeof(msg));
+    memset(&control, 0, sizeof(control));
+    iov.iov_base = data;
+    iov.iov_len = len;
+    msg.msg_iov = &iov;
+    msg.msg_iovlen = 1;
+    if (nfds > 0) {
+        msg.msg_control = control.buf;
+        msg.msg_controllen = CMSG_SPACE(sizeof(int) * nfds);
+        cmsg = CMSG_FIRSTHDR(&msg);
+        cmsg->cmsg_level = SOL_SOCKET;
+        cmsg->cmsg_type = SCM_RIGHTS;
+        cmsg->cmsg_len = CMSG_LEN(sizeof(int) * nfds);
+        memcpy(CMSG_DATA(cmsg), fds, sizeof(int) * nfds);
+    }
+    return sendmsg(sock, &msg, 0);
+}
+
+RPY_EXTERN long topaz_recv_fds(int sock, char *data, long len, int *fds, int *nfds) {
+    struct msghdr msg;
+    struct iovec iov;
+    union topaz_cmsg_buf control;
+    struct cmsghdr *cmsg;
+    long res;
+
+    memset(&msg, 0, sizeof(msg));
+    iov.iov_base = data;
+    iov.iov_len = len;
+    msg.msg_iov = &iov;
+    msg.msg_iovlen = 1;
+    msg.msg_control = control.buf;
+    msg.msg_controllen = sizeof(control.buf);
+    *nfds = 0;
+    res = recvmsg(sock, &msg, 0);
+    if (res < 0) {
+        return res;
+    }
+    for (cmsg = CMSG_FIRSTHDR(&msg); cmsg != NULL; cmsg = CMSG_NXTHDR(&msg, cmsg)) {
+        if (cmsg->cmsg_level == SOL_SOCKET && cmsg->cmsg_type == SCM_RIGHTS) {
+            *nfds = (cmsg->cmsg_len - CMSG_LEN(0)) / sizeof(int);
+            memcpy(fds, CMSG_DATA(cmsg), sizeof(int) * *nfds);
+            break;
+        }
+    }
+    return res;
+}
+""" % {"max_fds": MAX_FDS}],
+    )
+
+    c_send_fds = rffi.llexternal("topaz_send_fds",
+        [rffi.INT, rffi.CCHARP, rffi.LONG, rffi.INTP, rffi.INT], rffi.LONG,
+        compilation_info=eci,
+        save_err=rffi.RFFI_SAVE_ERRNO,
+    )
+    c_recv_fds = rffi.llexternal("topaz_recv_fds",
+        [rffi.INT, rffi.CCHARP, rffi.LONG, rffi.INTP, rffi.INTP], rffi.LONG,
+        compilation_info=eci,
+        save_err=rffi.RFFI_SAVE_ERRNO,
+    )
+
+    def send_fds(sockfd, data, fds):
+        """
+        Sends data over the unix socket sockfd, along with duplicates of the
+        file descriptors fds. Returns the number of bytes sent.
+        """
+        assert len(fds) <= MAX_FDS
+        fds_p = lltype.malloc(rffi.INTP.TO, MAX_FDS, flavor="raw")
+        try:
+            for i, fd in enumerate(fds):
+                fds_p[i] = rffi.cast(rffi.INT, fd)
+            with rffi.scoped_str2charp(data) as data_p:
+                res = c_send_fds(sockfd, data_p, len(data), fds_p, len(fds))
+        finally:
+            lltype.free(fds_p, flavor="raw")
+        res = rffi.cast(lltype.Signed, res)
+        if res < 0:
+            raise OSError(rposix.get_saved_errno(), "error in sendmsg")
+        return res
+
+    def recv_fds(sockfd, bufsize):
+        """
+        Receives at most bufsize bytes from the unix socket sockfd, returns
+        the data and the list of file descriptors that were sent along.
+        """
+        fds_p = lltype.malloc(rffi.INTP.TO, MAX_FDS, flavor="raw")
+        nfds_p = lltype.malloc(rffi.INTP.TO, 1, flavor="raw")
+        try:
+            with rffi.scoped_alloc_buffer(bufsize) as buf:
+                res = rffi.cast(lltype.Signed, c_recv_fds(sockfd, buf.raw, bufsize, fds_p, nfds_p))
+                if res < 0:
+                    raise OSError(rposix.get_saved_errno(), "error in recvmsg")
+                data = buf.str(res)
+            fds = [rffi.cast(lltype.Signed, fds_p[i]) for i in range(rffi.cast(lltype.Signed, nfds_p[0]))]
+        finally:
+            lltype.free(nfds_p, flavor="raw")
+            lltype.free(fds_p, flavor="raw")
+        return data, fds
@@ -0,0 +1,35 @@
+from rpython.rlib.listsort import make_timsort_class
+
+
+def format_ms(seconds):
+    ms = int(seconds * 1000000) / 1000.0
+    return str(ms)
+
+
+def rjust(s, width, fill=" "):
+    return fill * (width - len(s)) + s
+
+
+def ljust(s, width):
+    return s + " " * (width - len(s))
+
+
+def json_str(s):
+    result = ['"']
+    for ch in s:
+        if ch == '"' or ch == "\\":
+            result.append("\\" + ch)
+        elif ord(ch) < 0x20:
+            result.append("\\u" + rjust("%x" % ord(ch), 4, "0"))
+        else:
+            result.append(ch)
+    result.append('"')
+    return "".join(result)
+
+
+def _count_gt(a, b):
+    return a[0] > b[0]
+
+# Sorts (count, index) pairs, largest count first; equal counts keep their
+# order.
+CountSorter = make_timsort_class(lt=_count_gt)